@@ -0,0 +1,150 @@
+# answer_cache.py
+# 按导师缓存回答：精确键（导师 + 检索段落 + 归一化问题）与问题向量相似度两级命中
+# 持久化到本地 SQLite，重启后仍有效；LRU + TTL 淘汰，条数有上限
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+import numpy as np
+
+def normalize_question(question):
+    """全半角统一、小写，去掉空白与标点，"什么是仁？" 与 "什么是仁" 视为同一问题。"""
+    text = unicodedata.normalize("NFKC", question).lower()
+    return "".join(ch for ch in text if not ch.isspace() and not unicodedata.category(ch).startswith("P"))
+
+def chunk_key(text, meta):
+    """检索段落的标识：优先使用段落 id，旧数据没有 id 时退回内容哈希。"""
+    return meta.get("id") or hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+class AnswerCache:
+    def __init__(self, path="answer_cache.sqlite3", similarity_threshold=0.95,
+                 ttl=7 * 24 * 3600, max_entries=5000):
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._vectors = {}  # persona -> (keys, matrix)，相似度查找用的内存副本
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                persona TEXT NOT NULL,
+                question TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_persona ON answers (persona)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_last_access ON answers (last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(persona, question, chunk_ids):
+        raw = "\x1f".join([persona, normalize_question(question), *sorted(chunk_ids)])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _persona_vectors(self, persona, now):
+        cached = self._vectors.get(persona)
+        if cached is None:
+            rows = self._conn.execute(
+                "SELECT key, embedding FROM answers WHERE persona = ? AND created_at > ?",
+                (persona, now - self.ttl)
+            ).fetchall()
+            keys = [key for key, _ in rows]
+            matrix = (np.frombuffer(b"".join(blob for _, blob in rows), dtype="float32").reshape(len(rows), -1)
+                      if rows else np.empty((0, 0), dtype="float32"))
+            cached = self._vectors[persona] = (keys, matrix)
+        return cached
+
+    def _touch(self, key, now):
+        row = self._conn.execute(
+            "SELECT answer, created_at FROM answers WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] <= now - self.ttl:
+            return None
+        self._conn.execute("UPDATE answers SET last_access = ? WHERE key = ?", (now, key))
+        self._conn.commit()
+        return row[0]
+
+    def lookup(self, persona, question, chunk_ids, embedding):
+        """先按精确键查，再在同一导师的历史问题中找相似度不低于阈值的；未命中返回 None。"""
+        now = time.time()
+        with self._lock:
+            answer = self._touch(self.make_key(persona, question, chunk_ids), now)
+            if answer is not None:
+                self.stats["exact_hits"] += 1
+                return answer
+
+            keys, matrix = self._persona_vectors(persona, now)
+            if keys and matrix.shape[1] == len(embedding):
+                scores = matrix @ np.asarray(embedding, dtype="float32")
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    answer = self._touch(keys[best], now)
+                    if answer is not None:
+                        self.stats["semantic_hits"] += 1
+                        return answer
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, persona, question, chunk_ids, embedding, answer):
+        now = time.time()
+        key = self.make_key(persona, question, chunk_ids)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, persona, question, np.asarray(embedding, dtype="float32").tobytes(), answer, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+            self._vectors.pop(persona, None)
+
+    def _evict(self, now):
+        expired = self._conn.execute("DELETE FROM answers WHERE created_at <= ?", (now - self.ttl,)).rowcount
+        overflow = self._conn.execute(
+            "DELETE FROM answers WHERE key IN ("
+            " SELECT key FROM answers ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        ).rowcount
+        if expired or overflow:
+            self.stats["evictions"] += expired + overflow
+            self._vectors.clear()
+
+    def metrics(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+        total = hits + self.stats["misses"]
+        return {**self.stats, "entries": entries, "hit_rate": hits / total if total else 0.0}
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+            self._vectors.clear()
+
+# ===== 进程级共享缓存 =====
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_answer_cache():
+    """ANSWER_CACHE_PATH 指定数据库位置；ANSWER_CACHE=0 时关闭缓存，返回 None。"""
+    global _cache
+    if os.getenv("ANSWER_CACHE", "1") == "0":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnswerCache(
+                    path=os.getenv("ANSWER_CACHE_PATH", "answer_cache.sqlite3"),
+                    similarity_threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+                )
+    return _cache
@@ -1,8 +1,20 @@
 import os
+import re
 import json
-import base64
+import time
 import streamlit as st
+# 图片每个进程只读取编码一次，见 assets.py
+from assets import get_avatar_data_uri, get_user_avatar_data_uri, image_data_uri, static_image_url
 from rag_agent import RAGAgent
+# 模型、索引等在后台线程预热，页面先渲染
+from warmup import start_warmup, warmup_status, wait_until_ready
+# 请求级耗时追踪（TRACE_EXPORTERS 未设置且未打开调试面板时为空操作），见 tracing.py
+from tracing import enable_tracing, record, span, trace
+
+_script_started = time.perf_counter()
+
+# RAGAgent 默认的 session_id 为 uuid4().hex；地址栏里的值只接受这种格式
+SESSION_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
 
 # ===== 页面配置 =====
 st.set_page_config(
@@ -12,41 +24,24 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# ===== 加载 base64 图片 =====
-def image_to_base64(image_path):
-    try:
-        with open(image_path, "rb") as f:
-            return base64.b64encode(f.read()).decode()
-    except FileNotFoundError:
-        return None
-
-def get_avatar_base64(name: str):
-    path = os.path.join("persona_protrait", f"{name}.png")
-    if os.path.exists(path):
-        with open(path, "rb") as f:
-            return "data:image/png;base64," + base64.b64encode(f.read()).decode()
-    fallback = os.path.join("persona_protrait", "bot_icon.png")
-    if os.path.exists(fallback):
-        with open(fallback, "rb") as f:
-            return "data:image/png;base64," + base64.b64encode(f.read()).decode()
-    return None
-
-def get_user_avatar():
-    path = os.path.join("persona_protrait", "user_icon.png")
-    if os.path.exists(path):
-        with open(path, "rb") as f:
-            return "data:image/png;base64," + base64.b64encode(f.read()).decode()
-    return None
+# 进程内只启动一次；首个访问者触发后，后续会话直接复用已加载的模型与索引
+start_warmup()
+
+# 调试面板：侧边栏显示最近一次回答的分阶段耗时与 token 数。
+# DEBUG_PANEL=1 为整个进程打开追踪；地址栏加 ?debug=1 只对当前会话的回答收集 trace，不改进程级 tracer
+if os.getenv("DEBUG_PANEL") == "1":
+    enable_tracing()
+DEBUG_PANEL = os.getenv("DEBUG_PANEL") == "1" or st.query_params.get("debug") == "1"
 
 # ===== 设置背景（优化可读性） =====
 def set_background(image_path):
-    bg_base64 = image_to_base64(image_path)
-    if bg_base64:
+    bg_url = static_image_url(image_path)
+    if bg_url:
         st.markdown(
             f"""
             <style>
             .stApp {{
-                background-image: url("data:image/png;base64,{bg_base64}");
+                background-image: url("{bg_url}");
                 background-size: cover;
                 background-position: center;
                 background-repeat: no-repeat;
@@ -61,12 +56,12 @@ def set_background(image_path):
         )
 
 def set_sidebar_background(image_path):
-    bg_base64 = image_to_base64(image_path)
-    if bg_base64:
+    bg_url = static_image_url(image_path)
+    if bg_url:
         st.markdown(f"""
         <style>
         [data-testid="stSidebar"] {{
-            background-image: url("data:image/png;base64,{bg_base64}");
+            background-image: url("{bg_url}");
             background-size: cover; background-position: center top; background-repeat: no-repeat;
             backdrop-filter: blur(8px); border-right: 1px solid rgba(0,0,0,0.1);
             font-family: 'Inter', sans-serif;
@@ -250,11 +245,11 @@ set_background("水墨背景.png")
 set_sidebar_background("装饰云彩.png")
 
 # ===== 顶部 LOGO 和 Slogan（舒适布局） =====
-dao_icon_base64 = image_to_base64("道icon.png")
-if dao_icon_base64:
+dao_icon_uri = image_data_uri("道icon.png", 200)  # 显示 100px
+if dao_icon_uri:
     st.markdown(f"""
     <div style="text-align:center; margin-bottom:4rem; display: flex; flex-direction: column; align-items: center; padding-top: 2rem;">
-        <img src="data:image/png;base64,{dao_icon_base64}" alt="道"
+        <img src="{dao_icon_uri}" alt="道"
              style="width:100px; height:100px; border-radius:50%; 
                     box-shadow: 0px 6px 20px rgba(0, 0, 0, 0.1); 
                     margin-bottom: 2rem; transition: transform 0.3s ease;
@@ -298,12 +293,14 @@ with st.sidebar:
     
     # 初始化选中的导师
     if "selected_mentor" not in st.session_state:
-        st.session_state.selected_mentor = mentor_names[0]
+        # 刷新页面或服务重启后从地址栏恢复上次的导师（与下方的会话 id 一起保存）
+        restored = st.query_params.get("mentor")
+        st.session_state.selected_mentor = restored if restored in personas else mentor_names[0]
     
     # 为每个导师创建可点击的按钮和装饰卡片
     for mentor in mentor_names:
         is_selected = mentor == st.session_state.selected_mentor
-        mentor_avatar = get_avatar_base64(mentor)
+        mentor_avatar = get_avatar_data_uri(mentor)
         
         # 创建两列：头像列和按钮列
         col1, col2 = st.columns([1, 2.5])
@@ -331,8 +328,11 @@ with st.sidebar:
             ):
                 if mentor != st.session_state.selected_mentor:
                     st.session_state.selected_mentor = mentor
+                    # 换导师即开始新对话，旧会话的记录从存储中删除
+                    st.session_state.agent.clear_history()
+                    # 新会话视图：模型、索引与人物设定取自按人物共享的池，构造只需毫秒级
                     st.session_state.agent = RAGAgent(persona=mentor)
-                    st.session_state.chat_history = []
+                    st.query_params.update(mentor=mentor, session=st.session_state.agent.session_id)
                     st.rerun()
         
         # 添加分隔线
@@ -375,13 +375,18 @@ with st.sidebar:
     """, unsafe_allow_html=True)
 
 # ===== 初始化 Agent =====
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+# 会话状态里只保留 agent 句柄（含 session_id），对话记录在 conversation_store 中。
+# session_id 写入地址栏，刷新或服务重启后据此重新接上已持久化的对话
 if "agent" not in st.session_state:
-    st.session_state.agent = RAGAgent(persona=st.session_state.selected_mentor)
+    restored = st.query_params.get("session", "")
+    st.session_state.agent = RAGAgent(
+        persona=st.session_state.selected_mentor,
+        session_id=restored if SESSION_ID_PATTERN.fullmatch(restored) else None,
+    )
+    st.query_params.update(mentor=st.session_state.selected_mentor, session=st.session_state.agent.session_id)
 
 # ===== 获取导师头像（聊天气泡头像） =====
-portrait_base64 = get_avatar_base64(st.session_state.selected_mentor)
+portrait_base64 = get_avatar_data_uri(st.session_state.selected_mentor)
 
 # ===== 显示当前对话导师提示（细微优化版本） =====
 st.markdown(f"""
@@ -394,37 +399,47 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
+# ===== 预热状态（加载中每秒刷新，完成后不再显示） =====
+@st.fragment(run_every=1.0 if warmup_status()["status"] == "loading" else None)
+def show_readiness():
+    status = warmup_status()
+    if status["status"] == "loading":
+        done = ", ".join(status["steps"]) or "—"
+        st.info(f"⏳ Preparing the library… (loading {status['step']}, done: {done})")
+    elif status["status"] == "failed":
+        st.warning(f"⚠️ Some components failed to load: {', '.join(status['errors'])}")
+
+show_readiness()
+
 # ===== 显示聊天历史 =====
-for msg in st.session_state.chat_history:
-    with st.chat_message("user", avatar=get_user_avatar()):
-        st.markdown(msg["question"])
+user_avatar = get_user_avatar_data_uri()
+for question, answer in st.session_state.agent.history:
+    with st.chat_message("user", avatar=user_avatar):
+        st.markdown(question)
     with st.chat_message("assistant", avatar=portrait_base64):
-        st.markdown(msg["answer"])
+        st.markdown(answer)
 
 # ===== 输入问题（细微优化） =====
-user_question = st.chat_input("Share your thoughts and seek wisdom...")
-if user_question:
-    st.session_state.chat_history.append({"question": user_question, "answer": ""})
-    st.rerun()
+question = st.chat_input("Share your thoughts and seek wisdom...")
+if question:
+    # 直接渲染新问题，无需额外 rerun
+    with st.chat_message("user", avatar=user_avatar):
+        st.markdown(question)
 
 # ===== 生成答案 =====
-if (
-    "chat_history" in st.session_state and
-    isinstance(st.session_state.chat_history, list) and
-    len(st.session_state.chat_history) > 0 and
-    isinstance(st.session_state.chat_history[-1], dict) and
-    "answer" in st.session_state.chat_history[-1] and
-    st.session_state.chat_history[-1]["answer"] == ""
-):
-    with st.spinner("Consulting ancient wisdom..."):
+if question:
+    with st.chat_message("assistant", avatar=portrait_base64):
         try:
-            question = st.session_state.chat_history[-1]["question"]
-            answer = st.session_state.agent.ask(question)
-            st.session_state.chat_history[-1]["answer"] = answer
-            st.rerun()
+            with trace("app.answer", force=DEBUG_PANEL, persona=st.session_state.selected_mentor) as t:
+                if warmup_status()["status"] == "loading":
+                    with span("warmup_wait"), st.spinner("Preparing the library…"):
+                        wait_until_ready()
+                # 逐 token 渲染，首字出现即可见；回答结束时 ask_stream 写入对话存储
+                st.write_stream(st.session_state.agent.ask_stream(question))
+            st.session_state.last_trace = t.trace
         except Exception as e:
             st.error(f"❌ Error in RAGAgent.ask: {str(e)}")
-            st.session_state.chat_history[-1]["answer"] = f"I apologize, but I encountered an error while seeking wisdom: {e}"
+            st.session_state.agent.remember(question, f"I apologize, but I encountered an error while seeking wisdom: {e}")
             st.rerun()
 
 # ===== 页脚（细微优化） =====
@@ -437,3 +452,25 @@ st.markdown("""
     </p>
 </div>
 """, unsafe_allow_html=True)
+
+# ===== 调试面板 =====
+if DEBUG_PANEL:
+    with st.sidebar.expander("🔍 Debug · last answer"):
+        last = st.session_state.get("last_trace")
+        if last is None:
+            st.caption("No traced answer yet.")
+        else:
+            info = last.to_dict()
+            llm = next((s for s in info["spans"] if s["name"] == "llm"), {"attrs": {}})
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Total", f"{info['duration'] * 1000:.0f} ms")
+            c2.metric("Prompt tokens", llm["attrs"].get("prompt_tokens", "—"))
+            c3.metric("Completion", llm["attrs"].get("completion_tokens", "—"))
+            st.dataframe(
+                [{"stage": "· " * s["depth"] + s["name"], "ms": round(s["duration"] * 1000, 1),
+                  "attrs": json.dumps(s["attrs"], ensure_ascii=False)} for s in info["spans"]],
+                hide_index=True, use_container_width=True,
+            )
+
+# 整页脚本一次运行的耗时（含渲染历史与回答），单独作为一条 trace 导出
+record("app.script_run", _script_started, answered=bool(question))
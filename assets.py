@@ -0,0 +1,69 @@
+# assets.py
+# 图片资源层：每个进程只读取、缩放、编码一次，通过 st.cache_resource 在所有会话和 rerun 间共享
+# 头像与图标生成 WebP 缩略图后内联为 data URI；大背景图写入 static/ 由 Streamlit 静态服务提供
+import io
+import os
+import base64
+import hashlib
+import streamlit as st
+
+try:
+    from PIL import Image
+except ImportError:  # 未安装 Pillow 时退回原图
+    Image = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")  # 需在 .streamlit/config.toml 开启 enableStaticServing
+AVATAR_SIZE = 128  # 聊天气泡与侧边栏头像显示 50px，按 2x 屏幕留余量
+BACKGROUND_WIDTH = 1920
+
+def _resolve(path):
+    return path if os.path.isabs(path) else os.path.join(BASE_DIR, path)
+
+def _encode_image(path, max_size=None, quality=80):
+    """返回 (bytes, mime)；有 Pillow 且指定 max_size 时缩放并转为 WebP。"""
+    if Image is None or max_size is None:
+        with open(path, "rb") as f:
+            return f.read(), "image/png"
+    with Image.open(path) as img:
+        img.thumbnail((max_size, max_size))
+        buffer = io.BytesIO()
+        img.save(buffer, format="WEBP", quality=quality, method=4)
+    return buffer.getvalue(), "image/webp"
+
+@st.cache_resource(show_spinner=False)
+def image_data_uri(path, max_size=None):
+    """图片的 data URI，文件不存在时返回 None。"""
+    path = _resolve(path)
+    if not os.path.exists(path):
+        return None
+    data, mime = _encode_image(path, max_size)
+    return f"data:{mime};base64," + base64.b64encode(data).decode()
+
+@st.cache_resource(show_spinner=False)
+def static_image_url(path, max_width=BACKGROUND_WIDTH):
+    """把大图缩放后写入 static/，返回可在 CSS 中引用的 URL；浏览器可缓存，不再随页面内联传输。"""
+    path = _resolve(path)
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    digest = hashlib.sha1(f"{path}|{stat.st_mtime_ns}|{stat.st_size}|{max_width}".encode("utf-8")).hexdigest()[:16]
+    ext = ".webp" if Image is not None else os.path.splitext(path)[1]
+    name = digest + ext
+    target = os.path.join(STATIC_DIR, name)
+    if not os.path.exists(target):
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        data, _ = _encode_image(path, max_width)
+        tmp_path = target + ".part"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, target)  # 多进程同时生成时避免读到半个文件
+    return f"app/static/{name}"
+
+def get_avatar_data_uri(name):
+    """导师头像缩略图，缺失时退回 bot_icon.png。"""
+    return (image_data_uri(os.path.join("persona_protrait", f"{name}.png"), AVATAR_SIZE)
+            or image_data_uri(os.path.join("persona_protrait", "bot_icon.png"), AVATAR_SIZE))
+
+def get_user_avatar_data_uri():
+    return image_data_uri(os.path.join("persona_protrait", "user_icon.png"), AVATAR_SIZE)
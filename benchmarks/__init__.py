@@ -0,0 +1,2 @@
+# 性能基准脚本，在仓库根目录以 `python -m benchmarks.<name>` 运行
+# 汇总运行：python -m benchmarks.suite（结果 JSON 用 python -m benchmarks.compare 跨提交对比）
@@ -0,0 +1,68 @@
+# benchmarks/bench_ann.py
+# 各 FAISS 索引模式相对精确 flat 索引的 recall@k、查询延迟 p50/p99 与索引体积
+import os
+import time
+import argparse
+import numpy as np
+import faiss
+from build_faiss import INDEX_MODES, METRICS, create_index, set_search_params
+
+def load_corpus_vectors(mmap_dir, json_dir):
+    """优先复用 mmap_store 中已算好的向量，否则现场对 book_split 编码。"""
+    if os.path.exists(os.path.join(mmap_dir, "manifest.json")):
+        from mmap_store import MmapVectorStore
+        return np.array(MmapVectorStore(mmap_dir).vectors)
+    from build_chroma import load_chunks
+    from embedding_model import get_embedding_model
+    texts = [c["content"].strip() for c in load_chunks(json_dir) if c["content"].strip()]
+    return get_embedding_model().embed_batch(texts)
+
+def make_queries(vectors, n, noise=0.05, seed=0):
+    """从语料中抽样并加噪声作为查询，模拟与库中段落相近但不完全相同的问题。"""
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), size=min(n, len(vectors)), replace=False)]
+    queries = queries + rng.normal(scale=noise, size=queries.shape).astype("float32")
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype("float32")
+
+def timed_search(index, queries, k):
+    latencies, results = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        _, ids = index.search(q.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - t0)
+        results.append(ids[0])
+    return np.array(results), np.array(latencies) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="近似最近邻索引模式：召回率 / 延迟 / 体积")
+    parser.add_argument("--mmap-dir", default="mmap_store")
+    parser.add_argument("--json-dir", default="book_split")
+    parser.add_argument("--modes", default=",".join(INDEX_MODES))
+    parser.add_argument("--metric", choices=list(METRICS), default="ip")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    args = parser.parse_args()
+
+    vectors = np.ascontiguousarray(load_corpus_vectors(args.mmap_dir, args.json_dir), dtype="float32")
+    queries = make_queries(vectors, args.queries)
+    print(f"📚 语料 {len(vectors)} 条 × {vectors.shape[1]} 维，查询 {len(queries)} 条，k={args.k}，metric={args.metric}")
+
+    truth, _ = timed_search(create_index(vectors, "flat", args.metric), queries, args.k)
+
+    print("模式      构建      体积       recall@k   p50        p99")
+    for mode in args.modes.split(","):
+        t0 = time.perf_counter()
+        index = create_index(vectors, mode, args.metric)
+        build_s = time.perf_counter() - t0
+        set_search_params(index, nprobe=args.nprobe, ef_search=args.ef_search)
+
+        found, latencies = timed_search(index, queries, args.k)
+        recall = np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)])
+        size_mb = faiss.serialize_index(index).nbytes / 1024 / 1024
+        print(f"{mode:<8} {build_s:6.2f}s {size_mb:8.2f}MB {recall:9.3f} "
+              f"{np.percentile(latencies, 50):8.3f}ms {np.percentile(latencies, 99):8.3f}ms")
+
+if __name__ == "__main__":
+    main()
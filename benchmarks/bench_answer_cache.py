@@ -0,0 +1,59 @@
+# benchmarks/bench_answer_cache.py
+# 回答缓存命中率与节省的延迟：同一批问题及其改写连续提问，LLM 由本地 stub 代替
+import os
+import time
+import tempfile
+import argparse
+import numpy as np
+from benchmarks.mock_llm_server import start_mock_server
+from benchmarks.bench_stream import SEED_DOCS
+
+QUESTIONS = [
+    "什么是仁？", "什么是仁", "什么 是 仁？", "仁是什么？",
+    "what is the Dao?", "What is the Dao", "道是什么？", "何为道？",
+    "如何修身？", "如何修身", "怎样修身养性？", "学而时习之是什么意思？",
+]
+
+def main():
+    parser = argparse.ArgumentParser(description="回答缓存命中率与延迟")
+    parser.add_argument("--rounds", type=int, default=3, help="问题列表重复轮数")
+    parser.add_argument("--threshold", type=float, default=0.95, help="相似度命中阈值")
+    args = parser.parse_args()
+
+    server, api_base = start_mock_server(first_token_delay=0.3, token_delay=0.0)
+    os.environ["OPENAI_API_BASE"] = api_base
+    os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+    from answer_cache import AnswerCache
+    from rag_agent import RAGAgent
+    from retriever import InMemoryRetriever
+    from conversation_store import ConversationStore
+    from embedding_model import get_embedding_model
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = AnswerCache(os.path.join(tmp, "cache.sqlite3"), similarity_threshold=args.threshold)
+        store = ConversationStore(os.path.join(tmp, "conversations.sqlite3"))  # 不写调用目录下的默认对话库
+        agent = RAGAgent(retriever=InMemoryRetriever(get_embedding_model().dim), cache=cache, store=store)
+        agent.add_documents(SEED_DOCS)
+
+        hit_ms, miss_ms = [], []
+        for _ in range(args.rounds):
+            for question in QUESTIONS:
+                agent.clear_history()  # 缓存只对无上下文的提问生效
+                before = cache.metrics()["misses"]
+                t0 = time.perf_counter()
+                agent.ask(question)
+                elapsed = (time.perf_counter() - t0) * 1000
+                (miss_ms if cache.metrics()["misses"] > before else hit_ms).append(elapsed)
+        server.shutdown()
+        store.flush()
+
+        m = cache.metrics()
+        print(f"精确命中 {m['exact_hits']}，相似命中 {m['semantic_hits']}，未命中 {m['misses']}，"
+              f"命中率 {m['hit_rate']:.1%}，缓存条数 {m['entries']}")
+        if hit_ms:
+            print(f"命中延迟 p50 {np.percentile(hit_ms, 50):.1f}ms")
+        if miss_ms:
+            print(f"未命中延迟 p50 {np.percentile(miss_ms, 50):.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# benchmarks/bench_assets.py
+# 每次 rerun 的图片处理耗时与内联到页面的字节数：旧做法（每次读文件 + base64）vs assets.py 缓存
+import os
+import json
+import time
+import base64
+import argparse
+import numpy as np
+import assets
+
+def old_data_uri(path):
+    with open(path, "rb") as f:
+        return "data:image/png;base64," + base64.b64encode(f.read()).decode()
+
+def old_rerun(mentors, messages):
+    """复现改动前 app.py 一次 rerun 的图片开销，返回内联字节数。"""
+    inline = [old_data_uri("水墨背景.png"), old_data_uri("装饰云彩.png"), old_data_uri("道icon.png")]
+    inline += [old_data_uri(os.path.join("persona_protrait", f"{m}.png")) for m in mentors]
+    inline.append(old_data_uri(os.path.join("persona_protrait", f"{mentors[0]}.png")))
+    inline += [old_data_uri(os.path.join("persona_protrait", "user_icon.png")) for _ in range(messages)]
+    return sum(map(len, inline))
+
+def new_rerun(mentors, messages):
+    assets.static_image_url("水墨背景.png")
+    assets.static_image_url("装饰云彩.png")
+    inline = [assets.image_data_uri("道icon.png", 200)]
+    inline += [assets.get_avatar_data_uri(m) for m in mentors]
+    inline.append(assets.get_avatar_data_uri(mentors[0]))
+    user_avatar = assets.get_user_avatar_data_uri()
+    inline += [user_avatar] * messages
+    return sum(len(x) for x in inline if x)
+
+def bench(name, fn, mentors, messages, reruns):
+    times, size = [], 0
+    for _ in range(reruns):
+        t0 = time.perf_counter()
+        size = fn(mentors, messages)
+        times.append(time.perf_counter() - t0)
+    times = np.array(times) * 1000
+    print(f"{name:<8} 首次 {times[0]:8.1f}ms | 之后 p50 {np.percentile(times[1:], 50):8.2f}ms | "
+          f"每次 rerun 内联 {size / 1024 / 1024:6.2f}MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="图片资源每次 rerun 的开销")
+    parser.add_argument("--messages", type=int, default=10, help="聊天历史条数")
+    parser.add_argument("--reruns", type=int, default=20)
+    args = parser.parse_args()
+
+    with open("personas.json", "r", encoding="utf-8") as f:
+        mentors = list(json.load(f).keys())
+    bench("改动前", old_rerun, mentors, args.messages, args.reruns)
+    bench("改动后", new_rerun, mentors, args.messages, args.reruns)
+
+if __name__ == "__main__":
+    main()
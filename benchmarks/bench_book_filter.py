@@ -0,0 +1,65 @@
+# benchmarks/bench_book_filter.py
+# 按人物偏好书目过滤检索 vs 全库检索：查询延迟、结果落在偏好书目内的比例、标注名句命中率
+# 另校验过滤检索与"全库检索后再过滤"的结果一致（mmap / BM25 为精确检索，应完全相同）
+import time
+import argparse
+import numpy as np
+from bm25_index import BM25Index
+from embedding_model import get_embedding_model
+from mmap_store import book_name
+from rag_agent import load_personas
+from retriever import get_retriever
+from benchmarks.bench_hybrid import LABELS, first_hit
+from benchmarks.bench_retrieval import QUERIES
+
+def bench(search, queries, books, top_k, repeat):
+    """返回 (p50 ms, 结果落在 books 内的比例)。"""
+    latencies, in_books, total = [], 0, 0
+    for query in queries:
+        results = search(query, books)
+        in_books += sum(book_name(meta.get("title", "")) in books for _, meta in results)
+        total += len(results)
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            search(query, books)
+            latencies.append(time.perf_counter() - t0)
+    return float(np.percentile(latencies, 50)) * 1000, in_books / total if total else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description="按书过滤检索的延迟与相关性")
+    parser.add_argument("--backend", default="mmap", help="向量检索后端")
+    parser.add_argument("--bm25-dir", default="bm25_store")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    embedder = get_embedding_model()
+    dense = get_retriever(args.backend)
+    lexical = BM25Index(args.bm25_dir)
+    vectors = {q: embedder.embed_text(q) for q in QUERIES + [q for q, _, _ in LABELS]}
+    searchers = {
+        args.backend: lambda q, books, k=args.top_k: dense.search(vectors[q], k, books=books),
+        "bm25": lambda q, books, k=args.top_k: lexical.search(q, k, books=books),
+    }
+
+    personas = {name: p["books"] for name, p in load_personas().items() if p.get("books")}
+    for persona, books in personas.items():
+        labels = [(q, t, quote) for q, t, quote in LABELS if t in books]
+        print(f"\n🧙 {persona}：{'、'.join(books)}（标注名句 {len(labels)} 条）")
+        for name, search in searchers.items():
+            full_ms, full_ratio = bench(lambda q, _: search(q, None), QUERIES, books, args.top_k, args.repeat)
+            filt_ms, filt_ratio = bench(search, QUERIES, books, args.top_k, args.repeat)
+            full_hits = sum(first_hit(search(q, None), t, quote) is not None for q, t, quote in labels)
+            filt_hits = sum(first_hit(search(q, books), t, quote) is not None for q, t, quote in labels)
+            # 全库多取一些再过滤，作为过滤检索的参照结果
+            mismatch = 0
+            for q in QUERIES:
+                post = [doc for doc in search(q, None, args.top_k * 50)
+                        if book_name(doc[1].get("title", "")) in books][:args.top_k]
+                mismatch += [d[0] for d in post] != [d[0] for d in search(q, books)]
+            print(f"   {name:<7} 全库 p50 {full_ms:6.2f}ms 偏好书目占比 {full_ratio:6.1%} 命中 {full_hits}/{len(labels)} | "
+                  f"过滤 p50 {filt_ms:6.2f}ms 偏好书目占比 {filt_ratio:6.1%} 命中 {filt_hits}/{len(labels)} | "
+                  f"与后过滤不一致 {mismatch}/{len(QUERIES)}")
+
+if __name__ == "__main__":
+    main()
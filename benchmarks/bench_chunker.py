@@ -0,0 +1,51 @@
+# benchmarks/bench_chunker.py
+# 对比整本读入 + JSON 数组输出的旧切分流程与流式 JSON Lines 切分：耗时与峰值内存
+import os
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+from split_markdown import split_by_structure, semantic_fallback_split, iter_chunks, write_jsonl
+
+def run_in_memory(md_path, output_path):
+    with open(md_path, "r", encoding="utf-8") as f:
+        full_text = f.read()
+    sections = split_by_structure(full_text) or [{"chapter_title": None, "content": full_text}]
+    chunks = [
+        {"title": os.path.basename(md_path), "chapter_title": s["chapter_title"], "content": sub}
+        for s in sections for sub in semantic_fallback_split(s["content"])
+    ]
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(chunks, f, ensure_ascii=False, indent=2)
+    return len(chunks)
+
+def run_streaming(md_path, output_path):
+    return len(write_jsonl(iter_chunks(md_path), output_path))
+
+def measure(fn, md_path, output_path):
+    # tracemalloc 本身有开销，耗时与峰值内存分两次测
+    start = time.perf_counter()
+    count = fn(md_path, output_path)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn(md_path, output_path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak / 1024 / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description="Markdown 切分流程：耗时与峰值内存")
+    parser.add_argument("md_path", nargs="?", default=os.path.join("book_markdown", "黄帝内经.md"))
+    args = parser.parse_args()
+
+    size_mb = os.path.getsize(args.md_path) / 1024 / 1024
+    print(f"📖 {args.md_path}（{size_mb:.2f}MB）")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, fn, suffix in [("整本读入 + JSON", run_in_memory, ".json"),
+                                 ("流式 + JSONL", run_streaming, ".jsonl")]:
+            count, elapsed, peak_mb = measure(fn, args.md_path, os.path.join(tmp, "out" + suffix))
+            print(f"{name:<14} {count:6d} 段  {elapsed * 1000:8.1f}ms  峰值内存 {peak_mb:7.2f}MB")
+
+if __name__ == "__main__":
+    main()
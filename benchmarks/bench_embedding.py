@@ -0,0 +1,42 @@
+# benchmarks/bench_embedding.py
+# 对比逐条 embed_text 与批量 embed_batch 的吞吐，并校验两者向量一致
+import time
+import random
+import argparse
+import numpy as np
+from build_chroma import load_chunks
+from embedding_model import get_embedding_model
+
+def sample_texts(json_dir="book_split", n=256, seed=0):
+    texts = [c["content"].strip() for c in load_chunks(json_dir) if c["content"].strip()]
+    random.Random(seed).shuffle(texts)
+    return texts[:n]
+
+def main():
+    parser = argparse.ArgumentParser(description="embedding 吞吐基准")
+    parser.add_argument("--json-dir", default="book_split")
+    parser.add_argument("-n", type=int, default=256, help="抽样段落数")
+    parser.add_argument("--batch-sizes", default="8,16,32,64")
+    args = parser.parse_args()
+
+    embedder = get_embedding_model()
+    texts = sample_texts(args.json_dir, args.n)
+    print(f"📚 样本：{len(texts)} 段，平均 {sum(map(len, texts)) / len(texts):.0f} 字")
+
+    embedder.embed_batch(texts[:8])  # 预热
+
+    start = time.perf_counter()
+    single = np.stack([embedder.embed_text(t) for t in texts])
+    elapsed = time.perf_counter() - start
+    print(f"逐条 embed_text        : {len(texts) / elapsed:8.1f} 段/秒  ({elapsed:.2f}s)")
+
+    for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+        start = time.perf_counter()
+        batched = embedder.embed_batch(texts, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        max_diff = float(np.abs(batched - single).max())
+        print(f"embed_batch(bs={batch_size:<3})    : {len(texts) / elapsed:8.1f} 段/秒  "
+              f"({elapsed:.2f}s, 与逐条最大差 {max_diff:.2e})")
+
+if __name__ == "__main__":
+    main()
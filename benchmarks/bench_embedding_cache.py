@@ -0,0 +1,47 @@
+# benchmarks/bench_embedding_cache.py
+# 查询向量缓存：按 Zipf 分布重复提问，统计命中率、节省时间，用于确定缓存条数
+import time
+import argparse
+import numpy as np
+from embedding_cache import CachedEmbeddingModel
+from embedding_model import get_embedding_model
+from benchmarks.bench_retrieval import QUERIES
+
+def main():
+    parser = argparse.ArgumentParser(description="查询向量缓存命中率与节省时间")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--distinct", type=int, default=200, help="不同问题的数量")
+    parser.add_argument("--sizes", default="16,64,256", help="要比较的缓存条数")
+    parser.add_argument("--zipf", type=float, default=1.2, help="Zipf 分布参数，越大重复越集中")
+    args = parser.parse_args()
+
+    model = get_embedding_model()
+    vocabulary = [f"{QUERIES[i % len(QUERIES)]}（{i}）" for i in range(args.distinct)]
+    rng = np.random.default_rng(0)
+    workload = [vocabulary[(r - 1) % args.distinct] for r in rng.zipf(args.zipf, args.requests)]
+
+    start = time.perf_counter()
+    for text in workload:
+        model.embed_text(text)
+    baseline = time.perf_counter() - start
+    print(f"无缓存：{args.requests} 次查询 {baseline:.2f}s")
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        cached = CachedEmbeddingModel(model, max_entries=size)
+        start = time.perf_counter()
+        for text in workload:
+            cached.embed_text(text)
+        elapsed = time.perf_counter() - start
+        m = cached.metrics()
+        print(f"缓存 {size:>5} 条：{elapsed:.2f}s，命中率 {m['hit_rate']:.1%}，估算节省 {m['saved_s']:.2f}s")
+
+    # 批量接口：一半已缓存时只计算另一半
+    cached = CachedEmbeddingModel(model, max_entries=args.distinct)
+    cached.get_many(vocabulary[: args.distinct // 2])
+    start = time.perf_counter()
+    cached.get_many(vocabulary)
+    print(f"get_many({args.distinct}) 其中一半已缓存：{(time.perf_counter() - start) * 1000:.1f}ms，"
+          f"模型只计算 {cached.metrics()['misses'] - args.distinct // 2} 条")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/bench_hybrid.py
+# 纯向量 / 纯 BM25 / RRF 混合检索在经典名句标注集上的命中率与查询延迟
+# 命中：前 top_k 条中有来自标注书目、且去空白后包含该名句的段落
+import re
+import time
+import argparse
+import numpy as np
+from bm25_index import BM25Index
+from embedding_model import get_embedding_model
+from rag_agent import RAGAgent
+from retriever import get_retriever, reciprocal_rank_fusion
+
+# (查询, 书名, 段落中应出现的原文)；原文按语料用字（繁 / 简）标注
+LABELS = [
+    ("上善若水是什么意思", "道德经", "上善若水"),
+    ("道可道，非常道", "道德经", "道可道"),
+    ("知人者智，自知者明", "道德经", "知人者智"),
+    ("天地不仁，以万物为刍狗", "道德经", "天地不仁"),
+    ("道生一，一生二", "道德经", "道生一"),
+    ("信言不美，美言不信", "道德经", "信言不美"),
+    ("北冥有魚，其名為鯤", "庄子", "北冥有魚"),
+    ("庖丁解牛的故事", "庄子", "庖丁"),
+    ("相濡以沫，不如相忘於江湖", "庄子", "相濡以沫"),
+    ("子非魚，安知魚之樂", "庄子", "子非魚"),
+    ("吾日三省吾身", "论语", "吾日三省"),
+    ("君子和而不同", "论语", "君子和而不同"),
+    ("天命之謂性，率性之謂道", "中庸", "天命之謂性"),
+    ("莫見乎隱，莫顯乎微", "中庸", "莫見乎隱"),
+    ("大學之道，在明明德", "大学", "大學之道"),
+    ("知止而后有定", "大学", "知止而后有定"),
+    ("人之初，性本善", "三字经", "人之初"),
+    ("玉不琢，不成器", "三字经", "玉不琢"),
+    ("命由我作，福自己求", "了凡四训", "命由我作"),
+    ("積善之家，必有餘慶", "了凡四训", "積善之家"),
+    ("上工治未病", "黄帝内经", "上工治未病"),
+    ("天時不如地利", "增廣賢文", "天時不如地利"),
+]
+
+def first_hit(results, title, quote):
+    """返回第一条命中段落的名次（从 1 开始），未命中返回 None。"""
+    for rank, (text, meta) in enumerate(results, start=1):
+        if meta.get("title", "").startswith(title) and quote in re.sub(r"\s+", "", text):
+            return rank
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="混合检索命中率与延迟")
+    parser.add_argument("--backend", default=None, help="向量检索后端，缺省读取 RETRIEVER_BACKEND")
+    parser.add_argument("--bm25-dir", default="bm25_store")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--fetch-k", type=int, default=RAGAgent.fusion_fetch_k, help="RRF 融合前每路取的条数")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    embedder = get_embedding_model()
+    dense = get_retriever(args.backend)
+    lexical = BM25Index(args.bm25_dir)
+    fetch_k = max(args.top_k, args.fetch_k)
+    modes = {
+        "dense": lambda q: dense.search(embedder.embed_text(q), args.top_k),
+        "bm25": lambda q: lexical.search(q, args.top_k),
+        "hybrid": lambda q: reciprocal_rank_fusion(
+            [dense.search(embedder.embed_text(q), fetch_k), lexical.search(q, fetch_k)], args.top_k
+        ),
+    }
+
+    print(f"📚 标注集 {len(LABELS)} 条，top_k={args.top_k}，RRF 每路 {fetch_k} 条")
+    for name, search in modes.items():
+        search(LABELS[0][0])  # 预热
+        ranks, latencies, misses = [], [], []
+        for query, title, quote in LABELS:
+            rank = first_hit(search(query), title, quote)
+            ranks.append(rank)
+            if rank is None:
+                misses.append(query)
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                search(query)
+                latencies.append(time.perf_counter() - t0)
+        hits = sum(r is not None for r in ranks)
+        mrr = sum(1 / r for r in ranks if r) / len(ranks)
+        latencies = np.array(latencies) * 1000
+        print(f"{name:<7} 命中@{args.top_k} {hits:2d}/{len(LABELS)} ({hits / len(LABELS):6.1%}) | MRR {mrr:.3f} | "
+              f"p50 {np.percentile(latencies, 50):7.2f}ms p95 {np.percentile(latencies, 95):7.2f}ms")
+        if misses:
+            print(f"        未命中：{'；'.join(misses)}")
+
+if __name__ == "__main__":
+    main()
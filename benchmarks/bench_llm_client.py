@@ -0,0 +1,56 @@
+# benchmarks/bench_llm_client.py
+# LLMClient 并发压测：异步连接池对本地 mock 服务发起请求，统计延迟分位、QPS 与重试
+import time
+import asyncio
+import argparse
+import numpy as np
+from benchmarks.mock_llm_server import start_mock_server
+from llm_client import LLMClient, LLMError
+
+MESSAGES = [{"role": "user", "content": "什么是道？"}]
+
+async def run_load(client, requests, concurrency):
+    latencies, errors = [], 0
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with gate:
+            t0 = time.perf_counter()
+            try:
+                await client.achat(MESSAGES)
+                latencies.append(time.perf_counter() - t0)
+            except LLMError:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    await client.aclose()
+    return np.array(latencies) * 1000, errors, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="LLMClient 并发压测（本地 mock 服务）")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32, help="同时在途的请求数")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="LLMClient 并发上限")
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--first-token-delay", type=float, default=0.1)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, api_base = start_mock_server(first_token_delay=args.first_token_delay,
+                                         token_delay=args.token_delay, error_rate=args.error_rate)
+    client = LLMClient("sk-mock", base_url=api_base, max_concurrency=args.max_concurrency,
+                       timeout=10, backoff_base=0.05)
+    latencies, errors, elapsed = asyncio.run(run_load(client, args.requests, args.concurrency))
+    server.shutdown()
+
+    print(f"请求 {args.requests}，成功 {len(latencies)}，失败 {errors}，"
+          f"重试 {client.stats['retries']}，QPS {len(latencies) / elapsed:.1f}")
+    if len(latencies):
+        print(f"延迟 p50 {np.percentile(latencies, 50):.1f}ms  p95 {np.percentile(latencies, 95):.1f}ms  "
+              f"p99 {np.percentile(latencies, 99):.1f}ms")
+
+if __name__ == "__main__":
+    main()
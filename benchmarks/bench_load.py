@@ -0,0 +1,104 @@
+# benchmarks/bench_load.py
+# RAGAgent.ask 并发负载：多个线程各自持有一个会话（与 Streamlit 每个会话一个脚本线程一致），
+# 共享进程内的模型、索引与 LLM 连接池，对本地 mock 服务压测，统计 p50/p95/p99 与 QPS
+import os
+import json
+import time
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from benchmarks.mock_llm_server import start_mock_server
+from benchmarks.bench_hybrid import LABELS
+from benchmarks.bench_retrieval import QUERIES
+
+QUESTIONS = QUERIES + [q for q, _, _ in LABELS]
+
+def summarize_load(latencies, errors, elapsed):
+    ms = np.array(latencies) * 1000
+    stats = {"requests": len(latencies) + errors, "errors": errors, "qps": len(latencies) / elapsed if elapsed else 0.0}
+    for q in (50, 95, 99):
+        stats[f"p{q}_ms"] = float(np.percentile(ms, q)) if len(ms) else None
+    return stats
+
+def format_ms(value):
+    """全部请求失败时延迟为 None。"""
+    return f"{value:7.1f}ms" if value is not None else f"{'—':>9}"
+
+def run_load(make_agent, questions, requests, concurrency):
+    """以 concurrency 个线程发出 requests 次 ask；每个线程一个 agent（独立会话），每次提问前清空历史。"""
+    local = threading.local()
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def one(i):
+        agent = getattr(local, "agent", None)
+        if agent is None:
+            agent = local.agent = make_agent()
+        agent.clear_history()  # 每次都按首轮提问计，避免历史越积越长
+        t0 = time.perf_counter()
+        try:
+            agent.ask(questions[i % len(questions)])
+        except Exception as e:
+            with lock:
+                errors.append(repr(e))
+            return
+        with lock:
+            latencies.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load") as pool:
+        list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+    if errors:
+        print(f"⚠️ {len(errors)} 次失败，例如：{errors[0]}")
+    return summarize_load(latencies, len(errors), elapsed)
+
+def start_mock_llm(first_token_delay, token_delay):
+    """启动 mock 服务并让 get_llm_client 指向它；需在首次创建 LLM 客户端之前调用。"""
+    server, api_base = start_mock_server(first_token_delay=first_token_delay, token_delay=token_delay)
+    os.environ["OPENAI_API_BASE"] = api_base
+    os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="RAGAgent.ask 并发负载（本地 mock LLM）")
+    parser.add_argument("--concurrency", default="1,4,16", help="逗号分隔的并发档位")
+    parser.add_argument("--requests", type=int, default=200, help="每个档位的请求数")
+    parser.add_argument("--persona", default="孔子")
+    parser.add_argument("--first-token-delay", type=float, default=0.1)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--cache", action="store_true", help="启用回答缓存（默认关闭，每次都走完整流程）")
+    parser.add_argument("--json", default=None, help="把结果写入该 JSON 文件")
+    args = parser.parse_args()
+
+    server = start_mock_llm(args.first_token_delay, args.token_delay)
+    import rag_agent
+    from rag_agent import RAGAgent
+    rag_agent.LOG_PROMPTS = False  # 压测时不逐条打印 prompt 统计
+    from conversation_store import ConversationStore
+
+    # 压测产生的对话写入临时库，结束后连同目录一起删除
+    with tempfile.TemporaryDirectory(prefix="sage-load-", ignore_cleanup_errors=True) as tmp:
+        store = ConversationStore(os.path.join(tmp, "conversations.sqlite3"))
+        make_agent = lambda: RAGAgent(args.persona, cache=None if args.cache else False, store=store)
+        try:
+            run_load(make_agent, QUESTIONS, 8, 1)  # 预热模型、索引与连接
+
+            results = {}
+            print(f"🚦 mock LLM 首字 {args.first_token_delay * 1000:.0f}ms；每档 {args.requests} 次请求")
+            for level in map(int, args.concurrency.split(",")):
+                stats = results[str(level)] = run_load(make_agent, QUESTIONS, args.requests, level)
+                print(f"并发 {level:>3} | QPS {stats['qps']:7.1f} | p50 {format_ms(stats['p50_ms'])} "
+                      f"p95 {format_ms(stats['p95_ms'])} p99 {format_ms(stats['p99_ms'])} | 失败 {stats['errors']}")
+        finally:
+            server.shutdown()
+            store.flush()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/bench_mmap_store.py
+# 对比内存加载（faiss_store）与内存映射（mmap_store）：冷启动耗时、单进程 RSS、查询延迟
+# 每个后端在独立子进程中测量，避免互相影响 RSS；查询向量随机生成，不加载模型
+import sys
+import json
+import time
+import argparse
+import subprocess
+import numpy as np
+
+def read_rss_kb():
+    """读取 /proc/self/status：RssAnon 为进程私有内存，RssFile 为可跨进程共享的文件页。"""
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                fields[key] = int(value.split()[0])
+    return fields
+
+def run_child(backend, queries, top_k):
+    from retriever import RETRIEVER_BACKENDS
+    before = read_rss_kb()
+    start = time.perf_counter()
+    retriever = RETRIEVER_BACKENDS[backend]()
+    open_s = time.perf_counter() - start
+
+    dim = retriever.dim if hasattr(retriever, "dim") else retriever.index.d
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((queries, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    latencies = []
+    for vec in vectors:
+        t0 = time.perf_counter()
+        retriever.search(vec, top_k)
+        latencies.append(time.perf_counter() - t0)
+    after = read_rss_kb()
+    print(json.dumps({
+        "backend": backend,
+        "open_s": open_s,
+        "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "p95_ms": float(np.percentile(latencies, 95)) * 1000,
+        "rss_mb": (after["VmRSS"] - before["VmRSS"]) / 1024,
+        "anon_mb": (after["RssAnon"] - before["RssAnon"]) / 1024,
+        "file_mb": (after["RssFile"] - before["RssFile"]) / 1024,
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description="内存映射向量库 vs 内存加载索引")
+    parser.add_argument("--backends", default="faiss,mmap")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.queries, args.top_k)
+        return
+
+    print("后端     冷启动      RSS增量   私有(Anon)  共享(File)   查询p50    查询p95")
+    for backend in args.backends.split(","):
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_mmap_store", "--child", backend,
+             "--queries", str(args.queries), "--top-k", str(args.top_k)],
+            capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f"{backend:<8} ⚠️ 失败：{proc.stderr.strip().splitlines()[-1] if proc.stderr else proc.returncode}")
+            continue
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{r['backend']:<8} {r['open_s'] * 1000:8.1f}ms {r['rss_mb']:8.1f}MB {r['anon_mb']:9.1f}MB "
+              f"{r['file_mb']:9.1f}MB {r['p50_ms']:8.2f}ms {r['p95_ms']:8.2f}ms")
+    print("💡 mmap 的文件页（File）由系统页缓存提供，多个 worker 进程共享同一份物理内存")
+
+if __name__ == "__main__":
+    main()
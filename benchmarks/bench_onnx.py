@@ -0,0 +1,53 @@
+# benchmarks/bench_onnx.py
+# 嵌入后端对比：ONNX / int8 量化与 PyTorch 的一致性（余弦相似度）及 CPU 延迟、吞吐
+# 一致性低于阈值时以非零状态退出，可作为换后端前的校验
+import sys
+import time
+import argparse
+import numpy as np
+from embedding_model import EMBEDDING_BACKENDS, create_embedding_model
+from benchmarks.bench_embedding import sample_texts
+from benchmarks.bench_retrieval import QUERIES
+
+def main():
+    parser = argparse.ArgumentParser(description="嵌入后端一致性与性能")
+    parser.add_argument("--model", default="BAAI/bge-small-zh")
+    parser.add_argument("--backends", default=",".join(EMBEDDING_BACKENDS))
+    parser.add_argument("--threads", type=int, default=None, help="ONNX 推理线程数")
+    parser.add_argument("-n", type=int, default=128, help="批量吞吐测试的段落数")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="与 torch 输出的最低余弦相似度")
+    args = parser.parse_args()
+
+    texts = sample_texts(n=args.n)
+    reference = None
+    failed = False
+    print("后端        单条 p50     单条 p95     批量吞吐       与 torch 最低余弦")
+    for backend in ["torch"] + [b for b in args.backends.split(",") if b != "torch"]:
+        model = create_embedding_model(args.model, backend, num_threads=args.threads)
+        model.embed_batch(texts[:4])  # 预热
+
+        latencies = []
+        for query in QUERIES * 3:
+            t0 = time.perf_counter()
+            model.embed_text(query)
+            latencies.append(time.perf_counter() - t0)
+        latencies = np.array(latencies) * 1000
+
+        t0 = time.perf_counter()
+        vectors = model.embed_batch(texts, batch_size=args.batch_size)
+        throughput = len(texts) / (time.perf_counter() - t0)
+
+        if reference is None:
+            reference = vectors
+            parity = "—"
+        else:
+            min_cos = float((vectors * reference).sum(axis=1).min())
+            failed |= min_cos < args.min_cosine
+            parity = f"{min_cos:.5f}{'' if min_cos >= args.min_cosine else '  ❌ 低于阈值'}"
+        print(f"{backend:<10} {np.percentile(latencies, 50):8.2f}ms {np.percentile(latencies, 95):8.2f}ms "
+              f"{throughput:9.1f} 段/秒   {parity}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
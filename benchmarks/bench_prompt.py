@@ -0,0 +1,63 @@
+# benchmarks/bench_prompt.py
+# 多轮对话中每轮 prompt 的 token 数：旧做法（引用全文 + 最近 5 轮原文）vs PromptBuilder 预算组装
+import time
+import argparse
+import numpy as np
+from llm_client import count_message_tokens
+from rag_agent import RAGAgent, load_personas
+from benchmarks.bench_retrieval import QUERIES
+
+def legacy_messages(system_prompt, question, context_pairs, history):
+    """复现改动前 RAGAgent.build_messages 的组装方式。"""
+    quote_blocks = ""
+    for text, meta in context_pairs:
+        book = meta.get("title", "未知书籍").replace(".md", "").replace(".pdf", "")
+        chapter = meta.get("chapter_title", "未知章节")
+        quote_blocks += f"> {text.strip()}\n> ——《{book}》·{chapter}\n\n"
+    user_prompt = f"""
+【引用资料】：
+{quote_blocks}
+
+【用户问题】：{question}
+请以你的风格回答，引用资料内容，不得编造。
+"""
+    messages = [{"role": "system", "content": system_prompt}]
+    for q, a in history[-5:]:
+        messages.append({"role": "user", "content": q})
+        messages.append({"role": "assistant", "content": a})
+    messages.append({"role": "user", "content": user_prompt})
+    return messages
+
+def main():
+    parser = argparse.ArgumentParser(description="prompt token 预算基准")
+    parser.add_argument("--persona", default="庄子")
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--answer-chars", type=int, default=800, help="模拟 GPT-4 回答的长度（字）")
+    args = parser.parse_args()
+
+    agent = RAGAgent(args.persona, cache=False, reranker=False)
+    system_prompt = load_personas()[args.persona]["system_prompt"]
+    old_tokens, new_tokens, build_ms = [], [], []
+    print("轮次  旧 prompt  新 prompt   节省   段落(用/召回/去重/截断)  保留轮次  摘要 tokens")
+    for turn in range(args.turns):
+        question = QUERIES[turn % len(QUERIES)]
+        context = agent.retrieve(question, args.top_k)
+        old = count_message_tokens(legacy_messages(system_prompt, question, context, agent.history))
+        t0 = time.perf_counter()
+        new = count_message_tokens(agent.build_messages(question, context))
+        build_ms.append((time.perf_counter() - t0) * 1000)
+        p = agent.last_prompt
+        print(f"{turn + 1:>4} {old:>10} {new:>10} {1 - new / old:6.1%}   "
+              f"{p['used_chunks']}/{p['chunks']}/{p['deduped']}/{p['trimmed']:<14} {p['history_turns']:>6} {p['summary_tokens']:>10}")
+        old_tokens.append(old)
+        new_tokens.append(new)
+        # 用检索到的原文拼出一段冗长回答，模拟多轮后历史膨胀
+        answer = "".join(text for text, _ in context)[:args.answer_chars]
+        agent.remember(question, answer)
+
+    print(f"\n📝 合计：旧 {sum(old_tokens)} tokens，新 {sum(new_tokens)} tokens，"
+          f"节省 {1 - sum(new_tokens) / sum(old_tokens):.1%}；组装耗时 p50 {np.percentile(build_ms, 50):.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# benchmarks/bench_rerank.py
+# cross-encoder 重排的收益与代价：最终 prompt 的 token 数、名句命中、重排增加的延迟与超预算回退次数
+import argparse
+import numpy as np
+from llm_client import count_message_tokens
+from rag_agent import RAGAgent
+from reranker import CrossEncoderReranker
+from benchmarks.bench_hybrid import LABELS, first_hit
+from benchmarks.bench_retrieval import QUERIES
+
+def main():
+    parser = argparse.ArgumentParser(description="重排 token 节省与延迟")
+    parser.add_argument("--model", default="BAAI/bge-reranker-base")
+    # 默认用未配置偏好书目的人物，名句标注覆盖全库
+    parser.add_argument("--persona", default="曾国藩")
+    parser.add_argument("--top-k", type=int, default=5, help="不重排时进 prompt 的段落数")
+    parser.add_argument("--rerank-top-k", type=int, default=RAGAgent.rerank_top_k)
+    parser.add_argument("--fetch-k", type=int, default=RAGAgent.rerank_fetch_k)
+    parser.add_argument("--budget-ms", type=float, default=RAGAgent.rerank_budget_s * 1000)
+    parser.add_argument("--min-score", type=float, default=None)
+    args = parser.parse_args()
+
+    reranker = CrossEncoderReranker(args.model)
+    baseline = RAGAgent(args.persona, cache=False, reranker=False)
+    reranked = RAGAgent(args.persona, cache=False, reranker=reranker)
+    reranked.rerank_top_k = args.rerank_top_k
+    reranked.rerank_fetch_k = args.fetch_k
+    reranked.rerank_budget_s = args.budget_ms / 1000
+    reranked.rerank_min_score = args.min_score
+
+    print(f"🔁 召回 {args.fetch_k} 条 → 重排取 {args.rerank_top_k} 条，对比直接取 {args.top_k} 条；"
+          f"预算 {args.budget_ms:.0f}ms")
+    base_tokens, rerank_tokens, added, base_hits, rerank_hits = [], [], [], 0, 0
+    for query in QUERIES + [q for q, _, _ in LABELS]:
+        base_ctx = baseline.retrieve(query, args.top_k)
+        rerank_ctx = reranked.retrieve(query, args.top_k)
+        base_tokens.append(count_message_tokens(baseline.build_messages(query, base_ctx)))
+        rerank_tokens.append(count_message_tokens(reranked.build_messages(query, rerank_ctx)))
+        added.append(reranked.last_rerank["elapsed"])
+    for query, title, quote in LABELS:
+        base_hits += first_hit(baseline.retrieve(query, args.top_k), title, quote) is not None
+        rerank_hits += first_hit(reranked.retrieve(query, args.top_k), title, quote) is not None
+
+    base_tokens, rerank_tokens = np.array(base_tokens), np.array(rerank_tokens)
+    added = np.array(added) * 1000
+    saved = 1 - rerank_tokens.sum() / base_tokens.sum()
+    print(f"📝 prompt tokens：不重排平均 {base_tokens.mean():.0f}，重排后平均 {rerank_tokens.mean():.0f}（节省 {saved:.1%}）")
+    print(f"🎯 名句命中：不重排 {base_hits}/{len(LABELS)}（前 {args.top_k} 条），"
+          f"重排 {rerank_hits}/{len(LABELS)}（前 {args.rerank_top_k} 条）")
+    print(f"⏱️ 重排增加延迟 p50 {np.percentile(added, 50):.1f}ms p95 {np.percentile(added, 95):.1f}ms "
+          f"max {added.max():.1f}ms；超预算回退 {reranker.stats['fallbacks']}/{reranker.stats['queries']} 次")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# benchmarks/bench_retrieval.py
+# 各检索后端在完整 13 本书语料上的启动耗时与单次查询延迟
+import time
+import argparse
+import numpy as np
+from embedding_model import get_embedding_model
+from retriever import RETRIEVER_BACKENDS
+
+QUERIES = [
+    "什么是仁？", "己所不欲，勿施于人", "道可道，非常道", "上善若水",
+    "如何修身齐家治国平天下", "君子慎其独", "逍遥游讲的是什么", "心无挂碍",
+    "人生的意义是什么", "如何面对失败", "学而时习之", "知足者富",
+    "中庸之道", "阴阳五行与养生", "如何教育孩子", "积善之家必有余庆",
+]
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q)) * 1000
+
+def bench_backend(name, query_vectors, top_k, repeat):
+    start = time.perf_counter()
+    retriever = RETRIEVER_BACKENDS[name]()
+    startup = time.perf_counter() - start
+
+    retriever.search(query_vectors[0], top_k)  # 预热
+    latencies = []
+    for _ in range(repeat):
+        for vec in query_vectors:
+            t0 = time.perf_counter()
+            retriever.search(vec, top_k)
+            latencies.append(time.perf_counter() - t0)
+    print(f"{name:<8} 启动 {startup:7.2f}s | 查询 p50 {percentile_ms(latencies, 50):7.2f}ms "
+          f"p95 {percentile_ms(latencies, 95):7.2f}ms ({len(latencies)} 次)")
+
+def main():
+    parser = argparse.ArgumentParser(description="检索后端启动与查询延迟基准")
+    parser.add_argument("--backends", default=",".join(RETRIEVER_BACKENDS))
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    embedder = get_embedding_model()
+    t0 = time.perf_counter()
+    query_vectors = [embedder.embed_text(q) for q in QUERIES]
+    embed_ms = (time.perf_counter() - t0) / len(QUERIES) * 1000
+    print(f"🔤 查询向量化平均 {embed_ms:.2f}ms/条（各后端共用，不计入下方查询延迟）")
+
+    for name in args.backends.split(","):
+        try:
+            bench_backend(name, query_vectors, args.top_k, args.repeat)
+        except Exception as e:
+            print(f"{name:<8} ⚠️ 跳过：{e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/bench_sessions.py
+# 空闲会话的常驻内存：旧做法（session_state.chat_history + RAGAgent.history 两份完整对话）
+# vs 对话存入 conversation_store、会话里只留 agent 句柄；另测批量写入吞吐与读取历史的延迟
+import os
+import time
+import random
+import tempfile
+import argparse
+import tracemalloc
+import numpy as np
+from conversation_store import ConversationStore
+from rag_agent import RAGAgent
+from benchmarks.bench_retrieval import QUERIES
+
+class LegacyAgent:
+    """改动前 RAGAgent 的每会话状态：共享模型与索引之外，只有不断增长的 history 列表。"""
+
+    def __init__(self, persona):
+        self.persona = persona
+        self.history = []
+
+def make_turns(turns, answer_chars, seed):
+    rng = random.Random(seed)
+    filler = "道可道，非常道。名可名，非常名。无名天地之始，有名万物之母。"
+    return [(rng.choice(QUERIES), (filler * (answer_chars // len(filler) + 1))[:answer_chars] + str(i))
+            for i in range(turns)]
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return sessions, after - before
+
+def main():
+    parser = argparse.ArgumentParser(description="空闲会话内存与对话存储吞吐")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=20, help="每个会话的历史轮数")
+    parser.add_argument("--answer-chars", type=int, default=800)
+    args = parser.parse_args()
+
+    conversations = [make_turns(args.turns, args.answer_chars, seed=i) for i in range(args.sessions)]
+
+    def legacy():
+        sessions = []
+        for turns in conversations:
+            agent = LegacyAgent("孔子")
+            state = {"chat_history": [], "agent": agent}
+            for q, a in turns:
+                # 与旧 app.py 一致：两处各存一份（字符串复制模拟各自从模型响应构造的对象）
+                state["chat_history"].append({"question": q, "answer": "".join(a)})
+                agent.history.append((q, "".join(a)))
+            sessions.append(state)
+        return sessions
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ConversationStore(os.path.join(tmp, "conversations.sqlite3"))
+
+        t0 = time.perf_counter()
+        for i, turns in enumerate(conversations):
+            for q, a in turns:
+                store.append(f"bench-{i}", q, a)
+        store.flush()
+        write_s = time.perf_counter() - t0
+
+        def handles():
+            return [{"agent": RAGAgent("孔子", session_id=f"bench-{i}", store=store)} for i in range(args.sessions)]
+
+        _, legacy_bytes = measure(legacy)
+        sessions, handle_bytes = measure(handles)
+
+        latencies = []
+        for state in random.Random(0).sample(sessions, min(50, len(sessions))):
+            t0 = time.perf_counter()
+            state["agent"].history
+            latencies.append(time.perf_counter() - t0)
+        db_bytes = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp))
+
+    total_turns = args.sessions * args.turns
+    print(f"💬 {args.sessions} 个会话 × {args.turns} 轮，回答约 {args.answer_chars} 字")
+    print(f"旧做法   常驻 {legacy_bytes / 1024 / 1024:8.2f} MB，每会话 {legacy_bytes / args.sessions / 1024:8.1f} KB")
+    print(f"对话存储 常驻 {handle_bytes / 1024 / 1024:8.2f} MB，每会话 {handle_bytes / args.sessions / 1024:8.1f} KB；"
+          f"磁盘 {db_bytes / 1024 / 1024:.2f} MB")
+    print(f"✍️ 写入 {total_turns} 轮 {write_s:.2f}s（{total_turns / write_s:.0f} 轮/秒，{store.stats['flushes']} 次提交）；"
+          f"读取一个会话的历史 p50 {np.percentile(latencies, 50) * 1000:.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/bench_startup.py
+# 冷启动基准：各模块的 import 耗时（-X importtime 明细）、RAGAgent 构造耗时、后台预热到就绪的耗时
+# 每项都在全新的子进程中测量，避免同一进程内的模块缓存掩盖冷启动开销
+import sys
+import json
+import argparse
+import subprocess
+
+def run_python(code, importtime=False):
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    return subprocess.run(cmd, capture_output=True, text=True, check=True)
+
+def parse_importtime(stderr, module):
+    """解析 -X importtime 输出，只保留 module 这棵导入树（排除解释器启动时的 site 等），
+    返回 [(模块, 自身 us, 累计 us)]，最后一项是 module 本身。"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        top_level = len(name) - len(name.lstrip()) == 1
+        if top_level and name.strip() != module:
+            rows = []  # 输出按后序排列：上一个顶层导入及其依赖与本模块无关
+            continue
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+        if top_level:
+            return rows
+    raise ValueError(f"importtime 输出中没有 {module}")
+
+def profile_import(module, top, repeats):
+    best = None
+    for _ in range(repeats):
+        rows = parse_importtime(run_python(f"import {module}", importtime=True).stderr, module)
+        total = rows[-1][2]
+        if best is None or total < best[0]:
+            best = (total, rows)
+    total, rows = best
+    print(f"\n📦 import {module}：{total / 1000:.1f}ms（{len(rows)} 个模块，取 {repeats} 次最小）")
+    for name, self_us, cum_us in sorted(rows[:-1], key=lambda r: r[2], reverse=True)[:top]:
+        print(f"   {cum_us / 1000:8.1f}ms 累计 {self_us / 1000:7.1f}ms 自身  {name}")
+    return total
+
+READY_SCRIPT = """
+import json, time
+t0 = time.perf_counter()
+from rag_agent import RAGAgent
+import warmup
+t_import = time.perf_counter() - t0
+t1 = time.perf_counter()
+agent = RAGAgent()
+t_agent = time.perf_counter() - t1
+warmup.start_warmup()
+warmup.wait_until_ready()
+status = warmup.warmup_status()
+t2 = time.perf_counter()
+agent.retrieve("学而时习之")
+print(json.dumps({"import": t_import, "agent": t_agent, "ready": time.perf_counter() - t0,
+                  "first_query": time.perf_counter() - t2, "steps": status["steps"], "errors": status["errors"]}))
+"""
+
+def profile_ready():
+    result = json.loads(run_python(READY_SCRIPT).stdout.strip().splitlines()[-1])
+    print("\n🔥 冷启动到就绪（全新进程）")
+    print(f"   import rag_agent + warmup  {result['import'] * 1000:8.1f}ms")
+    print(f"   RAGAgent() 构造            {result['agent'] * 1000:8.3f}ms")
+    for name, seconds in result["steps"].items():
+        print(f"   预热 {name:<20}  {seconds * 1000:8.1f}ms")
+    print(f"   进程启动 → 就绪            {result['ready'] * 1000:8.1f}ms")
+    print(f"   就绪后首次检索             {result['first_query'] * 1000:8.1f}ms")
+    for name, error in result["errors"].items():
+        print(f"   ❌ {name}: {error}")
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动 import 与预热耗时")
+    parser.add_argument("--modules", default="rag_agent,warmup,llm_client,embedding_model,retriever")
+    parser.add_argument("--top", type=int, default=8, help="每个模块列出累计耗时最高的依赖数")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--skip-ready", action="store_true", help="只测 import，不加载模型与索引")
+    args = parser.parse_args()
+
+    for module in args.modules.split(","):
+        profile_import(module, args.top, args.repeats)
+    if not args.skip_ready:
+        profile_ready()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# benchmarks/bench_stream.py
+# 对比 RAGAgent.ask 与 ask_stream 的首字延迟（TTFB）与总延迟，LLM 由本地 stub 代替
+import os
+import argparse
+import tempfile
+import numpy as np
+from benchmarks.mock_llm_server import start_mock_server
+
+SEED_DOCS = [
+    ("道可道，非常道；名可名，非常名。", {"title": "道德经", "chapter_title": "第一章"}),
+    ("学而时习之，不亦说乎？", {"title": "论语", "chapter_title": "学而篇"}),
+]
+
+def summarize(name, timings):
+    ttfb = np.array([t["ttfb"] for t in timings]) * 1000
+    total = np.array([t["total"] for t in timings]) * 1000
+    print(f"{name:<11} TTFB p50 {np.percentile(ttfb, 50):7.1f}ms p95 {np.percentile(ttfb, 95):7.1f}ms | "
+          f"总耗时 p50 {np.percentile(total, 50):7.1f}ms p95 {np.percentile(total, 95):7.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="流式与非流式回答延迟对比（本地 stub LLM）")
+    parser.add_argument("-n", type=int, default=10, help="每种方式的请求次数")
+    parser.add_argument("--first-token-delay", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    args = parser.parse_args()
+
+    server, api_base = start_mock_server(first_token_delay=args.first_token_delay, token_delay=args.token_delay)
+    os.environ["OPENAI_API_BASE"] = api_base
+    os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+
+    from rag_agent import RAGAgent
+    from retriever import InMemoryRetriever
+    from conversation_store import ConversationStore
+    from embedding_model import get_embedding_model
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 关闭回答缓存，否则重复提问会直接命中缓存；对话写入临时库，不碰调用目录下的默认对话库
+        store = ConversationStore(os.path.join(tmp, "conversations.sqlite3"))
+        agent = RAGAgent(retriever=InMemoryRetriever(get_embedding_model().dim), cache=False, store=store)
+        agent.add_documents(SEED_DOCS)
+
+        blocking, streaming = [], []
+        for _ in range(args.n):
+            agent.clear_history()
+            agent.ask("什么是道？")
+            blocking.append(agent.last_timings)
+            agent.clear_history()
+            for _ in agent.ask_stream("什么是道？"):
+                pass
+            streaming.append(agent.last_timings)
+        server.shutdown()
+        store.flush()
+
+    summarize("ask", blocking)
+    summarize("ask_stream", streaming)
+
+if __name__ == "__main__":
+    main()
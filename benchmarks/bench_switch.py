@@ -0,0 +1,88 @@
+# benchmarks/bench_switch.py
+# 切换人物的延迟：用 Streamlit AppTest 无头运行 app.py，依次点击侧边栏各人物按钮，
+# 统计一次点击（按钮回调 + st.rerun 后整页重跑）的耗时；另单独测 agent 构造：
+# 池中取用 vs 绕开全部进程级注册表、重新加载模型 / 索引 / 对话库（即池化之前每次切换的代价）
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+from streamlit.testing.v1 import AppTest
+from rag_agent import RAGAgent, load_personas
+from warmup import wait_until_ready
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+def percentiles(samples):
+    ms = np.array(samples) * 1000
+    return f"p50 {np.percentile(ms, 50):7.2f}ms p95 {np.percentile(ms, 95):7.2f}ms max {ms.max():7.2f}ms"
+
+def rebuild_agent(persona, store_dir):
+    """不经 get_embedding_model / get_retriever / get_lexical_index / get_conversation_store，
+    每次新建嵌入模型、向量索引、BM25 索引与对话库，并解析全部依赖。"""
+    from embedding_model import create_embedding_model
+    from retriever import RETRIEVER_BACKENDS
+    from conversation_store import ConversationStore
+    threads = os.getenv("EMBEDDING_THREADS")
+    embedder = create_embedding_model(backend=os.getenv("EMBEDDING_BACKEND", "torch"),
+                                      num_threads=int(threads) if threads else None)
+    retriever = RETRIEVER_BACKENDS[os.getenv("RETRIEVER_BACKEND", "chroma")]()
+    lexical_dir = os.getenv("BM25_INDEX_DIR", "bm25_store")
+    lexical = False
+    if os.getenv("HYBRID_RETRIEVAL", "1") != "0" and os.path.exists(os.path.join(lexical_dir, "manifest.json")):
+        from bm25_index import BM25Index
+        lexical = BM25Index(lexical_dir)
+    store = ConversationStore(os.path.join(store_dir, f"{persona}-{time.perf_counter_ns()}.sqlite3"))
+    agent = RAGAgent(persona, embedder=embedder, retriever=retriever, lexical=lexical, store=store)
+    agent.runtime.resolve()
+    agent.history  # 读一次本会话记录，与页面重跑一致
+    return agent
+
+def main():
+    parser = argparse.ArgumentParser(description="人物切换延迟（AppTest）")
+    parser.add_argument("--rounds", type=int, default=5, help="依次点击全部人物按钮的轮数")
+    parser.add_argument("--fresh-rounds", type=int, default=1, help="完全重建依赖的轮数（每次都重新加载模型，较慢）")
+    parser.add_argument("--timeout", type=float, default=600, help="单次页面运行与预热的超时（秒）")
+    args = parser.parse_args()
+
+    personas = list(load_personas())
+    at = AppTest.from_file(APP_PATH, default_timeout=args.timeout)
+    t0 = time.perf_counter()
+    at.run()
+    first_run = time.perf_counter() - t0
+    # 首次运行启动后台预热；切换延迟在预热完成后测量
+    wait_until_ready(args.timeout)
+    assert not at.exception, at.exception
+
+    samples = []
+    for _ in range(args.rounds):
+        # 从下一个人物开始轮转，保证每次点击都是一次真正的切换
+        current = at.session_state["selected_mentor"]
+        order = personas[personas.index(current) + 1:] + personas[:personas.index(current) + 1]
+        for persona in order:
+            t0 = time.perf_counter()
+            at.button(key=f"sage_btn_{persona}").click().run()
+            samples.append(time.perf_counter() - t0)
+            assert at.session_state["selected_mentor"] == persona
+            assert at.session_state["agent"].persona == persona
+
+    pooled = []
+    for persona in personas * args.rounds:
+        t0 = time.perf_counter()
+        RAGAgent(persona)
+        pooled.append(time.perf_counter() - t0)
+    fresh = []
+    with tempfile.TemporaryDirectory() as store_dir:
+        for persona in personas * args.fresh_rounds:
+            t0 = time.perf_counter()
+            agent = rebuild_agent(persona, store_dir)
+            fresh.append(time.perf_counter() - t0)
+            agent.store.flush()
+
+    print(f"🖥️ 首次页面运行 {first_run:.2f}s；{len(personas)} 个人物 × {args.rounds} 轮切换")
+    print(f"切换一次（点击 + 重跑）  {percentiles(samples)}")
+    print(f"RAGAgent() 池中取用      {percentiles(pooled)}")
+    print(f"重建模型 / 索引 / 对话库 {percentiles(fresh)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/bench_tracing.py
+# 追踪的开销：关闭时 span() 的单次调用成本、关闭 / 开启（jsonl + prometheus）时 ask 的端到端延迟，
+# 并按开启时收集到的 trace 汇总各阶段平均耗时；LLM 由本地 stub 代替（无人为延迟，放大相对开销）
+import os
+import time
+import argparse
+import shutil
+import tempfile
+import numpy as np
+from benchmarks.mock_llm_server import start_mock_server
+from benchmarks.bench_stream import SEED_DOCS
+import tracing
+
+def per_call_ns(func, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        func()
+    return (time.perf_counter() - t0) / n * 1e9
+
+def main():
+    parser = argparse.ArgumentParser(description="追踪开销与阶段耗时")
+    parser.add_argument("-n", type=int, default=200, help="每种配置的 ask 次数")
+    parser.add_argument("--calls", type=int, default=1_000_000, help="span() 微基准调用次数")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    server, api_base = start_mock_server(first_token_delay=0, token_delay=0)
+    os.environ["OPENAI_API_BASE"] = api_base
+    os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+    os.environ["PROMPT_LOG"] = "0"
+
+    from rag_agent import RAGAgent
+    from retriever import InMemoryRetriever
+    from conversation_store import ConversationStore
+    from embedding_model import get_embedding_model
+
+    tracer = tracing.get_tracer()
+    tracer.enabled, tracer.exporters = False, []
+
+    def noop_span():
+        with tracing.span("x"):
+            pass
+    disabled_ns = per_call_ns(noop_span, args.calls)
+    with tracing.Trace(tracing.Tracer(), "bench", {}):
+        enabled_ns = per_call_ns(noop_span, min(args.calls, 100_000))  # 开启时 span 会累积在 trace 中
+
+    store = ConversationStore(os.path.join(tmp, "conversations.sqlite3"))
+    agent = RAGAgent(retriever=InMemoryRetriever(get_embedding_model().dim), cache=False, store=store)
+    agent.add_documents(SEED_DOCS)
+
+    def run(n):
+        latencies = []
+        for _ in range(n):
+            agent.clear_history()
+            t0 = time.perf_counter()
+            agent.ask("什么是道？")
+            latencies.append(time.perf_counter() - t0)
+        return np.array(latencies) * 1000
+
+    run(10)  # 预热模型与连接
+    disabled = run(args.n)
+    prometheus = tracing.PrometheusExporter()
+    tracer.exporters = [tracing.JsonlExporter(os.path.join(tmp, "traces.jsonl")), prometheus]
+    tracer.enabled = True
+    stages = {}
+    enabled = []
+    for _ in range(args.n):
+        enabled.append(run(1)[0])
+        for s in agent.last_trace.to_dict()["spans"]:
+            stages.setdefault(("· " * s["depth"]) + s["name"], []).append(s["duration"] * 1000)
+    enabled = np.array(enabled)
+    tracer.enabled, tracer.exporters = False, []
+    server.shutdown()
+    store.flush()
+    shutil.rmtree(tmp, ignore_errors=True)  # 临时对话库与 traces.jsonl
+
+    print(f"🔬 span() 单次调用：关闭 {disabled_ns:.0f}ns，开启 {enabled_ns:.0f}ns")
+    for name, ms in (("关闭追踪", disabled), ("开启追踪", enabled)):
+        print(f"{name} ask p50 {np.percentile(ms, 50):7.3f}ms p95 {np.percentile(ms, 95):7.3f}ms")
+    print(f"开启相对关闭的 p50 差值 {np.percentile(enabled, 50) - np.percentile(disabled, 50):+.3f}ms")
+    print("⏱️ 各阶段平均耗时（开启时）：")
+    for name, ms in stages.items():
+        print(f"   {name:<24} {np.mean(ms):8.3f}ms")
+    print(f"📈 Prometheus 样例：\n" + "\n".join(prometheus.render().splitlines()[:6]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# benchmarks/compare.py
+# 对比两次 benchmarks.suite 的结果：逐项列出变化，按各指标的 better 方向标记回退；
+# 有回退时退出码为 1，可直接用于 CI
+#
+#   python -m benchmarks.compare benchmarks/results/<旧>.json benchmarks/results/<新>.json --threshold 0.1
+import sys
+import json
+import argparse
+
+def load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# 耗时类指标的绝对变化低于 min_ms 毫秒时视为噪声（亚毫秒的检索延迟相对抖动很大）
+TIME_UNITS = {"ms": 1.0, "s": 1000.0}
+
+def compare(old, new, threshold, min_ms=0.5):
+    """返回 [(名称, 旧值, 新值, 相对变化, 状态)]；状态为 regressed / improved / ok / added / removed。"""
+    rows = []
+    old_metrics, new_metrics = old["metrics"], new["metrics"]
+    for name in sorted(set(old_metrics) | set(new_metrics)):
+        if name not in new_metrics:
+            rows.append((name, old_metrics[name]["value"], None, None, "removed"))
+            continue
+        if name not in old_metrics:
+            rows.append((name, None, new_metrics[name]["value"], None, "added"))
+            continue
+        a, b = old_metrics[name]["value"], new_metrics[name]["value"]
+        change = (b - a) / abs(a) if a else (0.0 if b == a else float("inf"))
+        # 统一成"越大越差"再与阈值比较
+        worse = change if new_metrics[name].get("better", "lower") == "lower" else -change
+        status = "regressed" if worse > threshold else "improved" if worse < -threshold else "ok"
+        scale = TIME_UNITS.get(new_metrics[name]["unit"])
+        if scale is not None and abs(b - a) * scale < min_ms:
+            status = "ok"
+        rows.append((name, a, b, change, status))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="对比两次基准结果")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.1, help="相对变化超过该比例才算回退 / 改进")
+    parser.add_argument("--min-ms", type=float, default=0.5, help="耗时类指标绝对变化低于该毫秒数时忽略")
+    parser.add_argument("--only-changes", action="store_true", help="只显示回退与改进")
+    args = parser.parse_args()
+
+    old, new = load(args.old), load(args.new)
+    for label, result in (("旧", old), ("新", new)):
+        meta = result["meta"]
+        print(f"{label}：{meta['commit']}{' (dirty)' if meta.get('dirty') else ''} {meta.get('subject', '')} "
+              f"@ {meta['timestamp']}")
+    if (old["meta"].get("platform"), old["meta"].get("model")) != (new["meta"].get("platform"), new["meta"].get("model")):
+        print("⚠️ 两次运行的平台或模型不同，数值不可直接比较")
+
+    marks = {"regressed": "❌", "improved": "✅", "ok": "  ", "added": "➕", "removed": "➖"}
+    rows = compare(old, new, args.threshold, args.min_ms)
+    for name, a, b, change, status in rows:
+        if args.only_changes and status not in ("regressed", "improved"):
+            continue
+        fmt = lambda v: f"{v:12.3f}" if v is not None else f"{'—':>12}"
+        delta = f"{change:+8.1%}" if change is not None else f"{'':>8}"
+        print(f"{marks[status]} {name:<40} {fmt(a)} → {fmt(b)} {delta}")
+
+    regressed = [r for r in rows if r[4] == "regressed"]
+    print(f"共 {len(rows)} 项，回退 {len(regressed)} 项（阈值 {args.threshold:.0%}）")
+    sys.exit(1 if regressed else 0)
+
+if __name__ == "__main__":
+    main()
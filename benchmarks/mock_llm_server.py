@@ -0,0 +1,114 @@
+# benchmarks/mock_llm_server.py
+# 本地 OpenAI Chat Completions 兼容 stub：离线测试与压测用，不访问真实 API
+#
+# 独立运行：python -m benchmarks.mock_llm_server --port 8900
+# 然后设置 OPENAI_API_BASE=http://127.0.0.1:8900/v1 OPENAI_API_KEY=sk-mock
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_ANSWER = "学而时习之，不亦说乎？有朋自远方来，不亦乐乎？人不知而不愠，不亦君子乎？"
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # keep-alive 下响应头与正文分两次小包写出，Nagle 与对端延迟 ACK 叠加会让每个非流式响应多等约 40ms
+    disable_nagle_algorithm = True
+    # 由 start_mock_server 设置
+    answer = DEFAULT_ANSWER
+    first_token_delay = 0.3  # 模拟排队 + prefill 的首字延迟（秒）
+    token_delay = 0.02  # 每个 token 的生成间隔（秒）
+    error_rate = 0.0  # 以该概率返回 503，用于验证重试
+
+    def log_message(self, format, *args):
+        pass  # 压测时不刷屏
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.error_rate and random.random() < self.error_rate:
+            self.send_error(503, "mock overloaded")
+            return
+        tokens = list(self.answer)  # 按字切分近似 token
+        created = int(time.time())
+        prompt_chars = sum(len(m.get("content", "")) for m in body.get("messages", []))
+        time.sleep(self.first_token_delay)
+
+        if not body.get("stream"):
+            time.sleep(self.token_delay * len(tokens))
+            self._send_json({
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": created,
+                "model": body.get("model", "mock"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": self.answer}}],
+                "usage": {"prompt_tokens": prompt_chars, "completion_tokens": len(tokens),
+                          "total_tokens": prompt_chars + len(tokens)},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self.token_delay)
+            self._send_event({
+                "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created,
+                "model": body.get("model", "mock"),
+                "choices": [{"index": 0, "finish_reason": None,
+                             "delta": {"role": "assistant", "content": token} if i == 0 else {"content": token}}],
+            })
+        self._send_event({
+            "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created,
+            "model": body.get("model", "mock"),
+            "choices": [{"index": 0, "finish_reason": "stop", "delta": {}}],
+        })
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _send_json(self, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_event(self, payload):
+        self.wfile.write(b"data: " + json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n\n")
+        self.wfile.flush()
+
+def start_mock_server(port=0, answer=DEFAULT_ANSWER, first_token_delay=0.3, token_delay=0.02, error_rate=0.0):
+    """在后台线程启动 stub 服务，返回 (server, api_base)；用完调用 server.shutdown()。"""
+    handler = type("ConfiguredMockLLMHandler", (MockLLMHandler,), {
+        "answer": answer,
+        "first_token_delay": first_token_delay,
+        "token_delay": token_delay,
+        "error_rate": error_rate,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容 stub 服务")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--first-token-delay", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server, api_base = start_mock_server(args.port, first_token_delay=args.first_token_delay,
+                                         token_delay=args.token_delay, error_rate=args.error_rate)
+    print(f"🧪 mock LLM 已启动：OPENAI_API_BASE={api_base}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,271 @@
+# benchmarks/suite.py
+# 端到端基准汇总：embedding 吞吐、索引构建、检索延迟与召回、RAGAgent.ask 延迟（本地 mock LLM）与并发负载，
+# 结果写成带提交号的 JSON，用 python -m benchmarks.compare 对比两次运行找回退
+#
+#   python -m benchmarks.suite                       # 完整运行，结果写入 benchmarks/results/
+#   python -m benchmarks.suite --quick               # 抽样语料、少量请求，几十秒内跑完
+#   python -m benchmarks.compare old.json new.json
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+from benchmarks.bench_hybrid import LABELS, first_hit
+from benchmarks.bench_load import QUESTIONS, run_load, start_mock_llm
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+STAGES = ("embedding", "index_build", "retrieval", "ask", "load")
+
+def metric(value, unit, better="lower"):
+    """better 为 lower / higher，compare 据此判断变化方向。"""
+    return {"value": float(value), "unit": unit, "better": better}
+
+def latency_metrics(prefix, seconds, quantiles=(50, 95, 99)):
+    ms = np.array(seconds) * 1000
+    return {f"{prefix}_p{q}_ms": metric(np.percentile(ms, q), "ms") for q in quantiles}
+
+def git_info():
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, timeout=30).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+    return {
+        "commit": git("rev-parse", "--short", "HEAD") or "unknown",
+        "subject": git("log", "-1", "--format=%s"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+    }
+
+# ===== 各阶段 =====
+def bench_embedding(embedder, texts, batch_size):
+    embedder.embed_batch(texts[:8])  # 预热
+    t0 = time.perf_counter()
+    for text in texts:
+        embedder.embed_text(text)
+    single_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    embedder.embed_batch(texts, batch_size=batch_size)
+    batch_s = time.perf_counter() - t0
+    return {
+        "single_texts_per_s": metric(len(texts) / single_s, "texts/s", "higher"),
+        "batch_texts_per_s": metric(len(texts) / batch_s, "texts/s", "higher"),
+    }
+
+def bench_index_build(embedder, documents, work_dir, batch_size):
+    from bm25_index import build_bm25_index
+    from mmap_store import write_mmap_store
+
+    t0 = time.perf_counter()
+    vectors = embedder.embed_batch([text for text, _ in documents], batch_size=batch_size)
+    embed_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    write_mmap_store(os.path.join(work_dir, "mmap"), documents, vectors, getattr(embedder, "model_id", ""))
+    mmap_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    build_bm25_index(os.path.join(work_dir, "bm25"), documents)
+    bm25_s = time.perf_counter() - t0
+    metrics = {
+        "embed_s": metric(embed_s, "s"),
+        "embed_chunks_per_s": metric(len(documents) / embed_s, "chunks/s", "higher"),
+        "mmap_write_s": metric(mmap_s, "s"),
+        "bm25_s": metric(bm25_s, "s"),
+    }
+    try:
+        from build_faiss import create_index
+    except ImportError:
+        print("⚠️ 未安装 faiss，跳过 HNSW 构建")
+        return metrics, vectors, None
+    t0 = time.perf_counter()
+    hnsw = create_index(vectors, "hnsw", "ip")
+    metrics["faiss_hnsw_s"] = metric(time.perf_counter() - t0, "s")
+    return metrics, vectors, hnsw
+
+def bench_retrieval(embedder, work_dir, hnsw, top_k, repeat):
+    from bm25_index import BM25Index
+    from mmap_store import MmapVectorStore
+    from retriever import reciprocal_rank_fusion
+
+    store = MmapVectorStore(os.path.join(work_dir, "mmap"))
+    bm25 = BM25Index(os.path.join(work_dir, "bm25"))
+    t0 = time.perf_counter()
+    query_vectors = [embedder.embed_text(q) for q in QUESTIONS]
+    metrics = {"query_embed_ms": metric((time.perf_counter() - t0) / len(QUESTIONS) * 1000, "ms")}
+
+    def timed(search, queries):
+        samples = []
+        for _ in range(repeat):
+            for q in queries:
+                t0 = time.perf_counter()
+                search(q)
+                samples.append(time.perf_counter() - t0)
+        return samples
+
+    metrics.update(latency_metrics("exact", timed(lambda v: store.search_ids(v, top_k), query_vectors)))
+    metrics.update(latency_metrics("bm25", timed(lambda q: bm25.search_ids(q, top_k), QUESTIONS)))
+    if hnsw is not None:
+        from build_faiss import set_search_params
+        set_search_params(hnsw, ef_search=64)
+        batch = np.stack(query_vectors).astype("float32")
+        metrics.update(latency_metrics("hnsw", timed(lambda v: hnsw.search(v.reshape(1, -1), top_k), query_vectors)))
+        _, found = hnsw.search(batch, top_k)
+        recall = np.mean([
+            len(set(f) & set(store.search_ids(v, top_k)[0].tolist())) / top_k for f, v in zip(found.tolist(), query_vectors)
+        ])
+        metrics[f"hnsw_recall_at_{top_k}"] = metric(recall, "ratio", "higher")
+
+    # 名句标注集命中率：纯向量 vs RRF 混合（与线上 agent 相同的融合方式）
+    dense_hits = hybrid_hits = 0
+    for query, title, quote in LABELS:
+        vector = embedder.embed_text(query)
+        dense = store.search(vector, 20)
+        fused = reciprocal_rank_fusion([dense, bm25.search(query, 20)], top_k)
+        dense_hits += first_hit(dense[:top_k], title, quote) is not None
+        hybrid_hits += first_hit(fused, title, quote) is not None
+    metrics[f"dense_hit_at_{top_k}"] = metric(dense_hits / len(LABELS), "ratio", "higher")
+    metrics[f"hybrid_hit_at_{top_k}"] = metric(hybrid_hits / len(LABELS), "ratio", "higher")
+    return metrics
+
+def agent_factory(work_dir, persona):
+    from bm25_index import BM25Index
+    from conversation_store import ConversationStore
+    from mmap_store import MmapVectorStore
+    from rag_agent import RAGAgent
+
+    # 显式传入本次构建的索引，不依赖仓库中已有的 chroma_store / bm25_store
+    retriever = MmapVectorStore(os.path.join(work_dir, "mmap"))
+    lexical = BM25Index(os.path.join(work_dir, "bm25"))
+    store = ConversationStore(os.path.join(work_dir, "conversations.sqlite3"))
+    return lambda: RAGAgent(persona, retriever=retriever, lexical=lexical, cache=False, reranker=False, store=store)
+
+def bench_ask(make_agent, n):
+    agent = make_agent()
+    for question in QUESTIONS[:3]:  # 预热连接
+        agent.clear_history()
+        agent.ask(question)
+    totals, retrieves = [], []
+    for i in range(n):
+        agent.clear_history()
+        agent.ask(QUESTIONS[i % len(QUESTIONS)])
+        totals.append(agent.last_timings["total"])
+        retrieves.append(agent.last_timings["retrieve"])
+    metrics = latency_metrics("total", totals)
+    metrics.update(latency_metrics("retrieve", retrieves, (50, 95)))
+    return metrics
+
+def bench_load(make_agent, levels, requests):
+    metrics = {}
+    for level in levels:
+        stats = run_load(make_agent, QUESTIONS, requests, level)
+        metrics[f"c{level}_qps"] = metric(stats["qps"], "req/s", "higher")
+        for q in (50, 95, 99):
+            # 全部失败时没有延迟样本，只记录 errors；compare 会把缺失的延迟项标为 removed
+            if stats[f"p{q}_ms"] is not None:
+                metrics[f"c{level}_p{q}_ms"] = metric(stats[f"p{q}_ms"], "ms")
+        metrics[f"c{level}_errors"] = metric(stats["errors"], "count")
+    return metrics
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端基准汇总，输出可跨提交对比的 JSON")
+    parser.add_argument("--json-dir", default="book_split")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"逗号分隔，可选 {', '.join(STAGES)}")
+    parser.add_argument("--corpus-limit", type=int, default=0, help="只用前 N 段构建索引（0 为全部）")
+    parser.add_argument("--embed-sample", type=int, default=256, help="embedding 吞吐的抽样段落数")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5, help="检索延迟的重复轮数")
+    parser.add_argument("--persona", default="曾国藩", help="ask / load 使用的人物（默认不限定书目）")
+    parser.add_argument("--asks", type=int, default=50, help="顺序 ask 次数")
+    parser.add_argument("--concurrency", default="1,4,16", help="负载档位")
+    parser.add_argument("--requests", type=int, default=200, help="每个负载档位的请求数")
+    parser.add_argument("--first-token-delay", type=float, default=0.05, help="mock LLM 首字延迟（秒）")
+    parser.add_argument("--quick", action="store_true", help="抽样 300 段、64 条 embedding、20 次 ask、每档 50 次请求")
+    parser.add_argument("--output", default=None, help="结果 JSON 路径，缺省写入 benchmarks/results/")
+    args = parser.parse_args()
+    if args.quick:
+        args.corpus_limit, args.embed_sample, args.asks, args.requests, args.repeat = 300, 64, 20, 50, 2
+    stages = args.stages.split(",")
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"未知阶段：{', '.join(sorted(unknown))}")
+
+    # mock 服务需在创建 LLM 客户端之前启动；关闭每次组装 prompt 的日志
+    server = start_mock_llm(args.first_token_delay, 0.0)
+    import rag_agent
+    rag_agent.LOG_PROMPTS = False
+    from build_chroma import chunk_metadata, load_chunks
+    from embedding_model import get_embedding_model
+
+    documents = [(c["content"].strip(), chunk_metadata(c)) for c in load_chunks(args.json_dir) if c["content"].strip()]
+    if args.corpus_limit:
+        # 均匀抽样而不是取前 N 段，保证每本书都有段落
+        documents = [documents[i] for i in sorted(random.Random(0).sample(range(len(documents)),
+                                                                         min(args.corpus_limit, len(documents))))]
+    t0 = time.perf_counter()
+    embedder = get_embedding_model()
+    load_s = time.perf_counter() - t0
+    print(f"📚 语料 {len(documents)} 段；模型 {getattr(embedder, 'model_id', '?')} 加载 {load_s:.2f}s")
+
+    results = {
+        "meta": {
+            **git_info(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "model": getattr(embedder, "model_id", ""),
+            "corpus_chunks": len(documents),
+            "argv": sys.argv[1:],
+        },
+        "metrics": {},
+    }
+
+    def record(stage, metrics):
+        for name, m in metrics.items():
+            results["metrics"][f"{stage}.{name}"] = m
+            print(f"   {stage}.{name:<28} {m['value']:12.3f} {m['unit']}")
+
+    work_dir = tempfile.mkdtemp(prefix="sage-bench-")
+    hnsw = None
+    try:
+        if "embedding" in stages:
+            texts = [text for text, _ in random.Random(1).sample(documents, min(args.embed_sample, len(documents)))]
+            print("🔤 embedding")
+            record("embedding", bench_embedding(embedder, texts, args.batch_size))
+        # 其余阶段都依赖本次构建的索引
+        if set(stages) - {"embedding"}:
+            print("🏗️ index_build")
+            metrics, _, hnsw = bench_index_build(embedder, documents, work_dir, args.batch_size)
+            if "index_build" in stages:
+                record("index_build", metrics)
+        if "retrieval" in stages:
+            print("🔍 retrieval")
+            record("retrieval", bench_retrieval(embedder, work_dir, hnsw, args.top_k, args.repeat))
+        if "ask" in stages or "load" in stages:
+            make_agent = agent_factory(work_dir, args.persona)
+            if "ask" in stages:
+                print("💬 ask")
+                record("ask", bench_ask(make_agent, args.asks))
+            if "load" in stages:
+                print("🚦 load")
+                record("load", bench_load(make_agent, [int(c) for c in args.concurrency.split(",")], args.requests))
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)  # 本次构建的索引与对话库只供本次运行使用
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{results['meta']['commit']}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"✅ 结果已写入 {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# bm25_index.py
+# 字符二元组（bigram）倒排索引 + BM25 打分，补足稠密检索对"己所不欲""上善若水"这类原文短语的漏召回
+#
+# 目录结构（与向量库并列，默认 bm25_store/）：
+#   manifest.json  文档数、词项数、平均长度、k1 / b 等元信息
+#   terms.txt      词项表，每行一个 bigram，行号即词项 id
+#   offsets.u32    uint32 (terms + 1)，词项 t 的倒排表为 postings[offsets[t]:offsets[t+1]]
+#   postings.u32   uint32 文档 id，各倒排表内按文档 id 升序
+#   tfs.u16        uint16 与 postings 一一对应的词频
+#   doc_len.u32    uint32 每篇文档的 bigram 数
+#   docs.bin / docs.idx  文档原文与元数据，格式同 mmap_store
+import os
+import re
+import json
+import math
+import argparse
+import unicodedata
+from array import array
+import numpy as np
+from mmap_store import MappedDocuments, book_ranges, select_ranges, write_documents
+
+FORMAT_VERSION = 1
+
+# 标点、空白等切断连续文本，bigram 不跨越句读
+_SPLIT_REGEX = re.compile(r"[^\w]+|_+")
+
+def char_bigrams(text):
+    """NFKC 归一化后按非文字字符切段，段内取相邻两字；单字段保留单字。"""
+    terms = []
+    for run in _SPLIT_REGEX.split(unicodedata.normalize("NFKC", text).lower()):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+def build_bm25_index(index_dir, documents, k1=1.2, b=0.75):
+    """documents 为 [(text, metadata)]，文档 id 即其下标。"""
+    os.makedirs(index_dir, exist_ok=True)
+    vocab = {}
+    term_ids, doc_ids, tfs = array("I"), array("I"), array("H")
+    doc_len = np.zeros(len(documents), dtype="uint32")
+
+    for doc_id, (text, _) in enumerate(documents):
+        counts = {}
+        for term in char_bigrams(text):
+            counts[term] = counts.get(term, 0) + 1
+        for term, tf in counts.items():
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+            doc_ids.append(doc_id)
+            tfs.append(min(tf, 0xFFFF))
+        doc_len[doc_id] = sum(counts.values())
+
+    # 文档按 id 顺序追加，稳定排序后各倒排表内文档 id 自然升序
+    term_ids = np.frombuffer(term_ids, dtype="uint32")
+    order = np.argsort(term_ids, kind="stable")
+    offsets = np.zeros(len(vocab) + 1, dtype="uint32")
+    np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=offsets[1:])
+
+    offsets.tofile(os.path.join(index_dir, "offsets.u32"))
+    np.frombuffer(doc_ids, dtype="uint32")[order].tofile(os.path.join(index_dir, "postings.u32"))
+    np.frombuffer(tfs, dtype="uint16")[order].tofile(os.path.join(index_dir, "tfs.u16"))
+    doc_len.tofile(os.path.join(index_dir, "doc_len.u32"))
+    with open(os.path.join(index_dir, "terms.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(vocab))
+    write_documents(index_dir, documents)
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "documents": len(documents),
+        "terms": len(vocab),
+        "postings": int(offsets[-1]),
+        "avgdl": float(doc_len.mean()) if len(documents) else 0.0,
+        "k1": k1,
+        "b": b,
+        "books": book_ranges(meta.get("title", "") for _, meta in documents),
+    }
+    # manifest 最后写入，读到它即代表其余文件已完整
+    with open(os.path.join(index_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+class BM25Index:
+    """只读打开 build_bm25_index 的产物；倒排表与文档均内存映射。"""
+    read_only = True
+
+    def __init__(self, index_dir="bm25_store"):
+        manifest_path = os.path.join(index_dir, "manifest.json")
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"无法找到 BM25 索引：{manifest_path}，请先运行 bm25_index.py")
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"不支持的 BM25 索引格式：{self.manifest.get('format')}")
+
+        self.count = self.manifest["documents"]
+        self.k1 = self.manifest["k1"]
+        self.b = self.manifest["b"]
+        with open(os.path.join(index_dir, "terms.txt"), "r", encoding="utf-8") as f:
+            terms = f.read().split("\n") if self.manifest["terms"] else []
+        self.vocab = {term: i for i, term in enumerate(terms)}
+
+        def load(name, dtype, count):
+            return np.memmap(os.path.join(index_dir, name), dtype=dtype, mode="r", shape=(count,)) \
+                if count else np.empty(0, dtype=dtype)
+
+        self.offsets = load("offsets.u32", "uint32", len(terms) + 1)
+        self.postings = load("postings.u32", "uint32", self.manifest["postings"])
+        self.tfs = load("tfs.u16", "uint16", self.manifest["postings"])
+        # 长度归一化项 k1 * (1 - b + b * dl / avgdl) 只与文档有关，加载时算好
+        doc_len = load("doc_len.u32", "uint32", self.count).astype("float32")
+        avgdl = self.manifest["avgdl"] or 1.0
+        self._norm = self.k1 * (1 - self.b + self.b * doc_len / avgdl)
+        self.documents = MappedDocuments(index_dir, self.count)
+        self.books = self.manifest.get("books") or book_ranges(
+            self.documents[i][1].get("title", "") for i in range(self.count)
+        )
+
+    def __len__(self):
+        return self.count
+
+    def idf(self, df):
+        return math.log(1 + (self.count - df + 0.5) / (df + 0.5))
+
+    def search_ids(self, query, top_k=5, books=None):
+        """返回 (ids, scores) 按 BM25 分数降序；只返回至少命中一个词项的文档。
+
+        books 为书名列表时，在各倒排表内二分定位这些书的文档 id 区间，只累加区间内的记录；
+        idf 仍按全库统计，过滤前后同一文档的分数一致。
+        """
+        rows = select_ranges(self.books, books)
+        rows = None if rows is None else np.array(rows, dtype="uint32").reshape(-1, 2)
+        scores = np.zeros(self.count, dtype="float32")
+        for term in set(char_bigrams(query)):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            start, end = int(self.offsets[t]), int(self.offsets[t + 1])
+            idf = self.idf(end - start)
+            if rows is None:
+                spans = [(start, end)]
+            else:
+                # 一次二分出所有区间端点在倒排表中的位置
+                bounds = start + np.searchsorted(self.postings[start:end], rows.ravel())
+                spans = bounds.reshape(-1, 2).tolist()
+            for lo, hi in spans:
+                ids = self.postings[lo:hi]
+                tf = self.tfs[lo:hi].astype("float32")
+                # 同一倒排表内文档 id 不重复，可直接按下标累加
+                scores[ids] += idf * tf * (self.k1 + 1) / (tf + self._norm[ids])
+
+        hits = np.flatnonzero(scores)
+        if len(hits) == 0:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="float32")
+        top_k = min(top_k, len(hits))
+        ids = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        ids = ids[np.lexsort((ids, -scores[ids]))]  # 同分按文档 id，过滤与否顺序一致
+        return ids, scores[ids]
+
+    def search(self, query, top_k=5, books=None):
+        ids, _ = self.search_ids(query, top_k, books)
+        return [self.documents[i] for i in ids]
+
+def build_bm25_from_chunks(json_dir, index_dir="bm25_store"):
+    from build_chroma import load_chunks, chunk_metadata
+
+    documents = [
+        (chunk["content"].strip(), chunk_metadata(chunk))
+        for chunk in load_chunks(json_dir) if chunk["content"].strip()
+    ]
+    manifest = build_bm25_index(index_dir, documents)
+    print(f"✅ BM25 索引构建完成！{manifest['documents']} 条文档，{manifest['terms']} 个词项，"
+          f"{manifest['postings']} 条倒排记录，数据保存在：{index_dir}/")
+    return manifest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="构建字符 bigram BM25 倒排索引")
+    parser.add_argument("--json-dir", default="book_split")
+    parser.add_argument("--index-dir", default="bm25_store")
+    args = parser.parse_args()
+    build_bm25_from_chunks(args.json_dir, args.index_dir)
@@ -1,47 +1,227 @@
 # build_chroma.py
 import os
 import json
-import chromadb
-from tqdm import tqdm
-from embedding_model import LocalEmbeddingModel
+import hashlib
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from embedding_model import get_embedding_model
+from split_markdown import CORPUS_MANIFEST_NAME
+
+MANIFEST_NAME = "build_manifest.json"
+
+def list_chunk_files(json_dir):
+    """列出段落文件；同名书同时存在 .json 与 .jsonl 时以 split_markdown 新产出的 .jsonl 为准。
+    split_markdown 写在同一目录下的语料 manifest 不是段落文件，跳过。"""
+    files = {}
+    for file in sorted(os.listdir(json_dir)):
+        if file == CORPUS_MANIFEST_NAME:
+            continue
+        stem, ext = os.path.splitext(file)
+        if ext == ".jsonl" or (ext == ".json" and stem not in files):
+            files[stem] = file
+    return sorted(files.values())
+
+def load_book_chunks(path):
+    if path.endswith(".jsonl"):
+        return iter_jsonl(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def iter_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
 
 def load_chunks(json_dir):
     all_chunks = []
-    for file in os.listdir(json_dir):
-        if file.endswith(".json"):
-            with open(os.path.join(json_dir, file), "r", encoding="utf-8") as f:
-                data = json.load(f)
-                all_chunks.extend(data)
+    for file in list_chunk_files(json_dir):
+        all_chunks.extend(load_book_chunks(os.path.join(json_dir, file)))
     return all_chunks
 
-def build_chroma_db(json_dir, persist_dir="chroma_store"):
+def chunk_metadata(chunk):
+    return {
+        "id": str(chunk.get("id", "")),
+        "title": str(chunk.get("title", "")),
+        "chapter_title": str(chunk.get("chapter_title", ""))
+    }
+
+def chunk_uid(chunk):
+    """由书名、章节与正文内容派生的稳定 id，同一段落每次构建得到相同 id。"""
+    key = "\x1f".join([
+        str(chunk.get("title", "")),
+        str(chunk.get("chapter_title", "")),
+        chunk["content"].strip()
+    ])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def load_manifest(persist_dir):
+    path = os.path.join(persist_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {"books": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(persist_dir, manifest, embedder):
+    # 记录向量由哪个模型、哪个后端生成（model_id，如 BAAI/bge-small-zh#onnx-int8），换模型或后端时据此触发全量重建
+    manifest.update({
+        "model": embedder.model_id,
+        "dim": embedder.dim,
+        "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds")
+    })
+    path = os.path.join(persist_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)  # 原子替换，中途失败不会留下半个 manifest
+
+class BuildStats:
+    """累计 embedding 与写库耗时，用于判断构建时间花在哪里。"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.chunks = 0
+        self.embed_s = 0.0
+        self.write_s = 0.0
+
+    def progress(self, label, done, total):
+        elapsed = time.perf_counter() - self.start
+        print(f"  {label} {done}/{total} | {self.chunks / elapsed:6.1f} 段/秒 | "
+              f"embed {self.embed_s:6.1f}s | 写入 {self.write_s:6.1f}s", end="\r", flush=True)
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start
+        print(f"⏱️ 共写入 {self.chunks} 段，用时 {elapsed:.1f}s（{self.chunks / max(elapsed, 1e-9):.1f} 段/秒）")
+        print(f"   embed {self.embed_s:.1f}s，写入 {self.write_s:.1f}s（写入与下一批 embed 并行，两者之和可大于总用时）")
+
+def write_batch(collection, stats, ids, chunks, vectors):
+    start = time.perf_counter()
+    collection.add(
+        documents=[chunk["content"].strip() for chunk in chunks],
+        embeddings=vectors,
+        metadatas=[chunk_metadata(chunk) for chunk in chunks],
+        ids=ids
+    )
+    stats.write_s += time.perf_counter() - start
+    stats.chunks += len(ids)
+
+def embed_and_write(collection, embedder, executor, stats, label, ids, chunks, batch_size, write_batch_size):
+    """按 write_batch_size 分批：第 N 批在后台线程写库时，主线程计算第 N+1 批的向量。"""
+    pending = None
+    for start in range(0, len(ids), write_batch_size):
+        batch_ids = ids[start:start + write_batch_size]
+        batch_chunks = [chunks[uid] for uid in batch_ids]
+
+        t0 = time.perf_counter()
+        vectors = embedder.embed_batch([c["content"].strip() for c in batch_chunks], batch_size=batch_size)
+        stats.embed_s += time.perf_counter() - t0
+
+        if pending is not None:
+            pending.result()  # 同一时间只有一批在写，限制内存占用
+        pending = executor.submit(write_batch, collection, stats, batch_ids, batch_chunks, vectors)
+        stats.progress(label, start + len(batch_ids), len(ids))
+    if pending is not None:
+        pending.result()
+
+def build_chroma_db(json_dir, persist_dir="chroma_store", batch_size=32, incremental=True, write_batch_size=512):
     print("初始化嵌入模型...")
-    embedder = LocalEmbeddingModel()
+    embedder = get_embedding_model()
 
+    import chromadb  # 延迟导入，build_faiss 复用 load_chunks 时无需安装 chromadb
     client = chromadb.PersistentClient(path=persist_dir)
+    manifest = load_manifest(persist_dir)
+
+    # 模型或后端变了向量就不可比，只能全量重建
+    if manifest.get("model") not in (None, embedder.model_id):
+        print(f"⚠️ 嵌入模型由 {manifest['model']} 变为 {embedder.model_id}，执行全量重建")
+        incremental = False
+    # 旧版脚本构建的集合（uuid4 id、没有 manifest）无法与 chunk_uid 对应，增量构建会把每段再插入一遍
+    if incremental and not os.path.exists(os.path.join(persist_dir, MANIFEST_NAME)):
+        try:
+            legacy_count = client.get_collection("dao_knowledge").count()
+        except Exception:
+            legacy_count = 0  # 集合不存在
+        if legacy_count:
+            print(f"⚠️ 已有 {legacy_count} 段向量但缺少 {MANIFEST_NAME}（旧版脚本构建），执行全量重建")
+            incremental = False
+    if not incremental:
+        try:
+            client.delete_collection("dao_knowledge")
+        except Exception:
+            pass  # 集合不存在
+        manifest = {"books": {}}
     collection = client.get_or_create_collection(name="dao_knowledge")
+    if hasattr(client, "get_max_batch_size"):  # Chroma 对单次写入条数有上限
+        write_batch_size = min(write_batch_size, client.get_max_batch_size())
+    stats = BuildStats()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chroma-writer")
 
-    chunks = load_chunks(json_dir)
-    print(f"开始处理 {len(chunks)} 条段落...")
-    
-    for chunk in tqdm(chunks):
-        text = chunk["content"].strip()
-        if not text:
-            continue
-        vector = embedder.embed_text(text)
-        collection.add(
-            documents=[text],
-            embeddings=[vector],
-            metadatas=[{
-                "id": str(chunk.get("id", "")),
-                "title": str(chunk.get("title", "")),
-                "chapter_title": str(chunk.get("chapter_title", ""))
-            }],
-            #ids=[chunk["id"]]
-            ids=[str(uuid.uuid4())]
-        )
-
-    print(f"✅ 构建完成！数据保存在：{persist_dir}/")
+    book_files = list_chunk_files(json_dir)
+    removed_books = set(manifest["books"]) - set(book_files)
+
+    for book in book_files:
+        path = os.path.join(json_dir, book)
+        digest = file_sha256(path)
+        entry = manifest["books"].get(book)
+        if entry and entry["sha256"] == digest:
+            continue  # 文件未变，跳过
+
+        # 同一本书内重复的段落只保留一份
+        chunks = {}
+        for chunk in load_book_chunks(path):
+            if chunk["content"].strip():
+                chunks.setdefault(chunk_uid(chunk), chunk)
+
+        stale_ids = set(entry["ids"]) - set(chunks) if entry else set()
+        if stale_ids:
+            collection.delete(ids=list(stale_ids))
+
+        existing = set(collection.get(ids=list(chunks), include=[])["ids"]) if chunks else set()
+        new_ids = [uid for uid in chunks if uid not in existing]
+        print(f"📖 {book}：共 {len(chunks)} 段，新增 {len(new_ids)}，删除 {len(stale_ids)}")
+
+        embed_and_write(collection, embedder, executor, stats, book, new_ids, chunks,
+                        batch_size, write_batch_size)
+        if new_ids:
+            print()
+
+        manifest["books"][book] = {"sha256": digest, "chunks": len(chunks), "ids": list(chunks)}
+        # 每本书完成后即落盘，中断后重跑可从断点继续
+        save_manifest(persist_dir, manifest, embedder)
+
+    # 已删除的书（或 .json 换成了 .jsonl）：清掉不再被任何书引用的向量
+    live_ids = {uid for book in book_files for uid in manifest["books"][book]["ids"]}
+    for book in removed_books:
+        dead_ids = [uid for uid in manifest["books"].pop(book)["ids"] if uid not in live_ids]
+        if dead_ids:
+            collection.delete(ids=dead_ids)
+        print(f"🗑️ 已移除：{book}")
+
+    save_manifest(persist_dir, manifest, embedder)
+    executor.shutdown()
+    stats.report()
+    print(f"✅ 构建完成！共 {collection.count()} 条向量，数据保存在：{persist_dir}/")
 
 if __name__ == "__main__":
-    build_chroma_db("book_split")
+    parser = argparse.ArgumentParser(description="构建 / 增量更新 Chroma 向量库")
+    parser.add_argument("--json-dir", default="book_split")
+    parser.add_argument("--persist-dir", default="chroma_store")
+    parser.add_argument("--full", action="store_true", help="忽略 manifest，清空后全量重建")
+    parser.add_argument("--batch-size", type=int, default=32, help="embedding 前向批大小")
+    parser.add_argument("--write-batch-size", type=int, default=512, help="每次写入 Chroma 的条数")
+    parser.add_argument("--bm25-dir", default="bm25_store", help="同时重建的 BM25 索引目录，传空字符串跳过")
+    args = parser.parse_args()
+    build_chroma_db(args.json_dir, args.persist_dir, batch_size=args.batch_size,
+                    incremental=not args.full, write_batch_size=args.write_batch_size)
+    if args.bm25_dir:
+        from bm25_index import build_bm25_from_chunks
+        build_bm25_from_chunks(args.json_dir, args.bm25_dir)  # 不需要嵌入，全量重建只需数秒
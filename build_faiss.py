@@ -0,0 +1,82 @@
+# build_faiss.py
+import os
+import json
+import math
+import argparse
+import faiss
+from build_chroma import load_chunks, chunk_metadata
+from embedding_model import get_embedding_model
+
+# 索引模式：flat 为精确检索；其余为近似检索，语料增大后查询不再线性变慢
+INDEX_MODES = ("flat", "ivf", "hnsw", "ivfpq")
+METRICS = {"l2": faiss.METRIC_L2, "ip": faiss.METRIC_INNER_PRODUCT}
+
+def index_factory_string(mode, n, dim, nlist=None, hnsw_m=32, pq_m=None):
+    if mode == "flat":
+        return "Flat"
+    if mode == "hnsw":
+        return f"HNSW{hnsw_m}"
+    # IVF 每个聚类中心至少需要约 39 个训练样本
+    nlist = nlist or int(4 * math.sqrt(n))
+    nlist = max(1, min(nlist, n // 39))
+    if mode == "ivf":
+        return f"IVF{nlist},Flat"
+    if mode == "ivfpq":
+        pq_m = pq_m or dim // 8  # 每 8 维压缩为 1 字节
+        return f"IVF{nlist},PQ{pq_m}"
+    raise ValueError(f"未知的索引模式：{mode}，可选：{', '.join(INDEX_MODES)}")
+
+def create_index(vectors, mode="flat", metric="l2", **params):
+    """从归一化向量构建索引；向量已归一化时 ip 即余弦相似度，与 l2 排序一致。"""
+    n, dim = vectors.shape
+    index = faiss.index_factory(dim, index_factory_string(mode, n, dim, **params), METRICS[metric])
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """查询期参数：IVF 的 nprobe、HNSW 的 efSearch，越大召回越高、越慢。"""
+    params = faiss.ParameterSpace()
+    if nprobe is not None and "IVF" in type(faiss.downcast_index(index)).__name__:
+        params.set_index_parameter(index, "nprobe", nprobe)
+    if ef_search is not None and "HNSW" in type(faiss.downcast_index(index)).__name__:
+        params.set_index_parameter(index, "efSearch", ef_search)
+
+def build_faiss_index(json_dir, index_dir="faiss_store", batch_size=32, mode="flat", metric="l2"):
+    print("初始化嵌入模型...")
+    embedder = get_embedding_model()
+
+    chunks = [c for c in load_chunks(json_dir) if c["content"].strip()]
+    print(f"开始处理 {len(chunks)} 条段落...")
+
+    vectors = embedder.embed_batch([c["content"].strip() for c in chunks], batch_size=batch_size)
+    print(f"构建索引（mode={mode}, metric={metric}）...")
+    index = create_index(vectors, mode=mode, metric=metric)
+
+    documents = [
+        (chunk["content"].strip(), chunk_metadata(chunk))
+        for chunk in chunks
+    ]
+
+    os.makedirs(index_dir, exist_ok=True)
+    faiss.write_index(index, os.path.join(index_dir, "index.faiss"))
+    with open(os.path.join(index_dir, "documents.json"), "w", encoding="utf-8") as f:
+        json.dump(documents, f, ensure_ascii=False)
+    with open(os.path.join(index_dir, "index_meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"mode": mode, "metric": metric, "model": embedder.model_id}, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ 构建完成！共 {index.ntotal} 条向量，数据保存在：{index_dir}/")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="离线构建 FAISS 索引")
+    parser.add_argument("--json-dir", default="book_split")
+    parser.add_argument("--index-dir", default="faiss_store")
+    parser.add_argument("--mode", choices=INDEX_MODES, default="flat")
+    parser.add_argument("--metric", choices=list(METRICS), default="l2")
+    parser.add_argument("--bm25-dir", default="bm25_store", help="同时重建的 BM25 索引目录，传空字符串跳过")
+    args = parser.parse_args()
+    build_faiss_index(args.json_dir, args.index_dir, mode=args.mode, metric=args.metric)
+    if args.bm25_dir:
+        from bm25_index import build_bm25_from_chunks
+        build_bm25_from_chunks(args.json_dir, args.bm25_dir)  # 不需要嵌入，全量重建只需数秒
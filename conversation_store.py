@@ -0,0 +1,187 @@
+# conversation_store.py
+# 对话历史持久化到本地 SQLite（WAL），进程内不再为每个会话保留完整历史：
+#   - 写入先进入内存队列，由后台线程按批提交，回答结束时不等待磁盘
+#   - 每个会话最多保留 max_turns 轮，超出删除最早的；长期无活动的会话在启动时及之后每隔 prune_interval 清理
+#   - 读取合并已落盘与尚在队列中的数据，写入后立即可读
+import os
+import time
+import atexit
+import sqlite3
+import threading
+
+class ConversationStore:
+    def __init__(self, path="conversations.sqlite3", max_turns=200, ttl=30 * 24 * 3600,
+                 flush_interval=0.5, flush_batch=64, prune_interval=3600):
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.stats = {"appends": 0, "flushes": 0, "flushed_rows": 0}
+        self._lock = threading.Lock()
+        self._pending_turns = []     # [(session, question, answer, created)]
+        self._pending_summaries = {}  # session -> (summary, summarized_seq)
+        self._wakeup = threading.Event()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # WAL 下仅在检查点 fsync，崩溃最多丢最后一批
+        # 紧凑表结构：(session, seq) 作聚簇主键，同一会话的轮次在 B 树上相邻
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS turns (
+                session TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (session, seq)
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                summarized_seq INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+        self.prune()
+        self._last_prune = time.monotonic()
+
+        self._writer = threading.Thread(target=self._write_loop, name="conversation-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    # ===== 写入 =====
+    def append(self, session, question, answer):
+        with self._lock:
+            self._pending_turns.append((session, question, answer, time.time()))
+            self.stats["appends"] += 1
+            full = len(self._pending_turns) >= self.flush_batch
+        if full:
+            self._wakeup.set()
+
+    def set_summary(self, session, summary, summarized_seq):
+        with self._lock:
+            self._pending_summaries[session] = (summary, summarized_seq)
+
+    def _write_loop(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                # 长期运行的进程也要清理过期会话，不只在启动时
+                if time.monotonic() - self._last_prune >= self.prune_interval:
+                    self._last_prune = time.monotonic()
+                    self.prune()
+            except sqlite3.Error as e:
+                print(f"❌ 对话写入失败：{e!r}")
+
+    def flush(self):
+        """把队列中的写入在一个事务内提交，并裁剪涉及会话的超量轮次。"""
+        with self._lock:
+            if not self._pending_turns and not self._pending_summaries:
+                return
+            turns, self._pending_turns = self._pending_turns, []
+            summaries, self._pending_summaries = self._pending_summaries, {}
+            # seq 取会话内当前最大值 + 1，进程内不需要记录每个会话的计数
+            self._conn.executemany(
+                "INSERT INTO turns (session, seq, question, answer, created_at) "
+                "SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ? FROM turns WHERE session = ?",
+                [(s, q, a, t, s) for s, q, a, t in turns]
+            )
+            sessions = {s for s, _, _, _ in turns}
+            self._conn.executemany(
+                "DELETE FROM turns WHERE session = ? AND seq <= "
+                "(SELECT MAX(seq) FROM turns WHERE session = ?) - ?",
+                [(s, s, self.max_turns) for s in sessions]
+            )
+            now = time.time()
+            self._conn.executemany(
+                "INSERT INTO sessions (session, summary, summarized_seq, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (session) DO UPDATE SET summary = excluded.summary, "
+                "summarized_seq = excluded.summarized_seq, updated_at = excluded.updated_at",
+                [(s, summary, seq, now) for s, (summary, seq) in summaries.items()]
+            )
+            self._conn.commit()
+            self.stats["flushes"] += 1
+            self.stats["flushed_rows"] += len(turns) + len(summaries)
+
+    # ===== 读取 =====
+    def turns(self, session, after_seq=0, limit=None):
+        """会话中 seq > after_seq 的轮次 [(seq, question, answer)]，按时间顺序；limit 只取最近若干轮。"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, question, answer FROM turns WHERE session = ? AND seq > ? ORDER BY seq",
+                (session, after_seq)
+            ).fetchall()
+            last = rows[-1][0] if rows else self._max_seq(session)
+            for s, q, a, _ in self._pending_turns:
+                if s == session:
+                    last += 1
+                    rows.append((last, q, a))
+        return rows[-limit:] if limit else rows
+
+    def _max_seq(self, session):
+        row = self._conn.execute("SELECT MAX(seq) FROM turns WHERE session = ?", (session,)).fetchone()
+        return row[0] or 0
+
+    def history(self, session, limit=None):
+        return [(q, a) for _, q, a in self.turns(session, limit=limit)]
+
+    def summary(self, session):
+        """返回 (摘要, 已摘要到的 seq)。"""
+        with self._lock:
+            pending = self._pending_summaries.get(session)
+            if pending is not None:
+                return pending
+            row = self._conn.execute(
+                "SELECT summary, summarized_seq FROM sessions WHERE session = ?", (session,)
+            ).fetchone()
+        return tuple(row) if row else ("", 0)
+
+    def has_history(self, session):
+        with self._lock:
+            if any(s == session for s, _, _, _ in self._pending_turns):
+                return True
+            return self._conn.execute("SELECT 1 FROM turns WHERE session = ? LIMIT 1", (session,)).fetchone() is not None
+
+    # ===== 清理 =====
+    def clear(self, session):
+        with self._lock:
+            self._pending_turns = [t for t in self._pending_turns if t[0] != session]
+            self._pending_summaries.pop(session, None)
+            self._conn.execute("DELETE FROM turns WHERE session = ?", (session,))
+            self._conn.execute("DELETE FROM sessions WHERE session = ?", (session,))
+            self._conn.commit()
+
+    def prune(self):
+        """删除超过 ttl 没有新对话的会话。"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            self._conn.execute("""
+                DELETE FROM turns WHERE session IN (
+                    SELECT session FROM turns GROUP BY session HAVING MAX(created_at) < ?
+                )
+            """, (cutoff,))
+            self._conn.execute("DELETE FROM sessions WHERE updated_at < ? AND session NOT IN "
+                               "(SELECT DISTINCT session FROM turns)", (cutoff,))
+            self._conn.commit()
+
+# ===== 进程级共享存储 =====
+_store = None
+_store_lock = threading.Lock()
+
+def get_conversation_store():
+    """CONVERSATION_DB 指定数据库位置，CONVERSATION_MAX_TURNS 为每个会话保留的轮数上限。"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ConversationStore(
+                    path=os.getenv("CONVERSATION_DB", "conversations.sqlite3"),
+                    max_turns=int(os.getenv("CONVERSATION_MAX_TURNS", "200")),
+                )
+    return _store
@@ -0,0 +1,140 @@
+# embedding_cache.py
+# LocalEmbeddingModel 前的查询向量缓存：内存 LRU + 可选 SQLite 磁盘层
+# 与模型接口一致（dim / model_name / embed_text / embed_batch），可直接替换
+import os
+import time
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+
+def normalize_text(text):
+    """全半角统一并压缩空白；不去标点，标点会影响向量。"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+class CachedEmbeddingModel:
+    def __init__(self, model, max_entries=4096, disk_path=None):
+        self.model = model
+        self.model_name = model.model_name
+        self.model_id = getattr(model, "model_id", model.model_name)
+        self.dim = model.dim
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "compute_s": 0.0}
+        self._lru = OrderedDict()  # key -> 只读 float32 向量
+        self._lock = threading.Lock()
+
+        self._disk = None
+        if disk_path:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._disk.commit()
+
+    def _key(self, text):
+        return f"{self.model_id}\x1f{normalize_text(text)}"
+
+    def _remember(self, key, vector):
+        vector.setflags(write=False)  # 多会话共享同一数组，禁止原地修改
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def get_many(self, texts, batch_size=32):
+        """批量取向量：先查内存、再查磁盘，只对剩余未命中的文本调用模型。"""
+        texts = list(texts)
+        keys = [self._key(t) for t in texts]
+        result = np.empty((len(texts), self.dim), dtype="float32")
+        missing = {}  # key -> 首次出现的文本
+        found = {}  # 本次从磁盘读到或新计算的 key -> 向量
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    result[i] = vector
+                    self.stats["hits"] += 1
+                else:
+                    missing.setdefault(key, texts[i])
+
+            if missing and self._disk is not None:
+                for key in list(missing):
+                    row = self._disk.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                    if row is not None and len(row[0]) == self.dim * 4:
+                        found[key] = np.frombuffer(row[0], dtype="float32").copy()
+                        self._remember(key, found[key])
+                        del missing[key]
+                        self.stats["disk_hits"] += 1
+
+        if missing:
+            # 模型计算不持锁，其他会话的命中查询不必等待
+            start = time.perf_counter()
+            vectors = self.model.embed_batch(list(missing.values()), batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stats["misses"] += len(missing)
+                self.stats["compute_s"] += elapsed
+                for key, vector in zip(missing, vectors):
+                    found[key] = vector.copy()
+                    self._remember(key, found[key])
+                if self._disk is not None:
+                    self._disk.executemany(
+                        "INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                        [(key, vector.tobytes()) for key, vector in zip(missing, vectors)]
+                    )
+                    self._disk.commit()
+
+        for i, key in enumerate(keys):
+            if key in found:
+                result[i] = found[key]
+        return result
+
+    def embed_text(self, text):
+        return self.get_many([text])[0]
+
+    def embed_batch(self, texts, batch_size=32):
+        return self.get_many(texts, batch_size=batch_size)
+
+    def metrics(self):
+        """命中率与估算节省的模型时间（按未命中的平均单条耗时折算）。"""
+        with self._lock:
+            stats = dict(self.stats)
+            entries = len(self._lru)
+        hits = stats["hits"] + stats["disk_hits"]
+        total = hits + stats["misses"]
+        per_text = stats["compute_s"] / stats["misses"] if stats["misses"] else 0.0
+        return {
+            **stats,
+            "entries": entries,
+            "hit_rate": hits / total if total else 0.0,
+            "saved_s": hits * per_text,
+        }
+
+# ===== 进程级共享缓存 =====
+_cached_models = {}
+_cache_lock = threading.Lock()
+
+def get_query_embedder(model_name="BAAI/bge-small-zh", backend=None):
+    """包装进程共享模型的查询向量缓存；EMBEDDING_CACHE_SIZE 控制条数，
+    EMBEDDING_CACHE_PATH 设置后启用磁盘层。
+
+    与 get_embedding_model 一样按 (model_name, backend) 区分，backend 缺省读取 EMBEDDING_BACKEND，
+    不同后端的模型与向量不会混用。
+    """
+    from embedding_model import get_embedding_model
+    backend = backend or os.getenv("EMBEDDING_BACKEND", "torch")
+    key = (model_name, backend)
+    cached = _cached_models.get(key)
+    if cached is None:
+        with _cache_lock:
+            cached = _cached_models.get(key)
+            if cached is None:
+                cached = CachedEmbeddingModel(
+                    get_embedding_model(model_name, backend),
+                    max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "4096")),
+                    disk_path=os.getenv("EMBEDDING_CACHE_PATH") or None,
+                )
+                _cached_models[key] = cached
+    return cached
@@ -1,25 +1,183 @@
-from transformers import AutoTokenizer, AutoModel
-import torch
+import os
+import threading
 import numpy as np
+from tracing import span
+# torch / transformers 导入耗时数秒，延迟到首次加载模型时再导入
 
-class LocalEmbeddingModel:
+class BatchedEmbeddingModel:
+    """分批、排序、动态 padding 的公共逻辑；子类只需实现 _forward 返回 mean pooling 结果。"""
+
+    def embed_text(self, text: str) -> np.ndarray:
+        # 单条等价于 batch 大小为 1，无 padding，结果与逐条编码一致
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts, batch_size=32) -> np.ndarray:
+        """批量生成 embedding，返回连续的 float32 (n, dim) 数组，已归一化。
+
+        输入按长度排序后分批，每批只 padding 到本批最长，减少无效计算；
+        输出顺序与输入一致。
+        """
+        texts = list(texts)
+        embeddings = np.empty((len(texts), self.dim), dtype="float32")
+        if not texts:
+            return embeddings
+
+        # 在 trace 内时记为 model.embed span；embed_text 与查询向量缓存未命中时的编码都经过这里
+        with span("model.embed", model=self.model_id, texts=len(texts)):
+            order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+            for start in range(0, len(order), batch_size):
+                batch_idx = order[start:start + batch_size]
+                embeddings[batch_idx] = self._forward([texts[i] for i in batch_idx])
+
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)  # normalize
+        return embeddings  # ✅ 必须是 float32
+
+    def _tokenize(self, texts, return_tensors):
+        with self._tokenizer_lock:
+            return self.tokenizer(
+                texts,
+                padding=True,  # 动态 padding：只补齐到本批最长
+                truncation=True,
+                max_length=512,
+                return_tensors=return_tensors,
+            )
+
+class LocalEmbeddingModel(BatchedEmbeddingModel):
     def __init__(self, model_name="BAAI/bge-small-zh"):
+        self.model_name = model_name
+        self.model_id = model_name  # 区分不同后端产出的向量，用作缓存键
+        from transformers import AutoTokenizer, AutoModel
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
         self.model = AutoModel.from_pretrained(model_name)
         self.dim = self.model.config.hidden_size  # e.g., 384 for bge-small-zh
+        # fast tokenizer 并发调用会报 "Already borrowed"，多会话共享时需加锁
+        self._tokenizer_lock = threading.Lock()
 
-    def embed_text(self, text: str) -> np.ndarray:
-        # 使用模型生成 embedding（池化 + normalize）
-        inputs = self.tokenizer(text, return_tensors="pt", truncation=True, max_length=512)
+    def _forward(self, texts):
+        import torch
+        inputs = self._tokenize(texts, "pt")
         with torch.no_grad():
             outputs = self.model(**inputs)
-            last_hidden_state = outputs.last_hidden_state  # (1, seq_len, hidden)
-            attention_mask = inputs["attention_mask"].unsqueeze(-1)  # (1, seq_len, 1)
+            last_hidden_state = outputs.last_hidden_state  # (b, seq_len, hidden)
+            attention_mask = inputs["attention_mask"].unsqueeze(-1)  # (b, seq_len, 1)
             masked_embeddings = last_hidden_state * attention_mask
             sum_embeddings = masked_embeddings.sum(dim=1)
             sum_mask = attention_mask.sum(dim=1)
-            embedding = sum_embeddings / sum_mask  # mean pooling
+            pooled = sum_embeddings / sum_mask  # mean pooling
+        return pooled.cpu().numpy()
+
+class OnnxEmbeddingModel(BatchedEmbeddingModel):
+    """ONNX Runtime CPU 推理后端，可选动态 int8 量化；接口与 LocalEmbeddingModel 相同。
+
+    首次使用时把 PyTorch 模型导出到 onnx_dir（默认 onnx_model/），之后直接加载导出结果。
+    需要额外安装 onnxruntime 与 onnx。
+    """
+
+    def __init__(self, model_name="BAAI/bge-small-zh", onnx_dir=None, quantize=True, num_threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("ONNX 后端需要 onnxruntime：pip install onnxruntime onnx") from e
+
+        self.model_name = model_name
+        self.model_id = f"{model_name}#onnx{'-int8' if quantize else ''}"
+        from transformers import AutoTokenizer  # 已导出时推理路径无需导入 torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self._tokenizer_lock = threading.Lock()
+
+        onnx_dir = onnx_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx_model")
+        model_dir = os.path.join(onnx_dir, model_name.strip("/").replace("/", "--"))
+        fp32_path = os.path.join(model_dir, "model.onnx")
+        int8_path = os.path.join(model_dir, "model.int8.onnx")
+        if not os.path.exists(fp32_path):
+            self._export(model_name, fp32_path)
+        if quantize and not os.path.exists(int8_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            int8_path if quantize else fp32_path, options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self.dim = self.session.get_outputs()[0].shape[-1]
+
+    @staticmethod
+    def _export(model_name, path):
+        import torch
+        from transformers import AutoModel
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        model = AutoModel.from_pretrained(model_name)
+        model.eval()
+
+        class LastHiddenState(torch.nn.Module):
+            # 以关键字参数调用，避免不同 transformers 版本 forward 位置参数顺序不同
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, input_ids, attention_mask, token_type_ids):
+                return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                                  token_type_ids=token_type_ids).last_hidden_state
+
+        dummy = {
+            "input_ids": torch.ones(1, 8, dtype=torch.long),
+            "attention_mask": torch.ones(1, 8, dtype=torch.long),
+            "token_type_ids": torch.zeros(1, 8, dtype=torch.long),
+        }
+        dynamic = {0: "batch", 1: "sequence"}
+        tmp_path = path + ".part"
+        with torch.no_grad():
+            torch.onnx.export(
+                LastHiddenState(model),
+                (dummy["input_ids"], dummy["attention_mask"], dummy["token_type_ids"]),
+                tmp_path,
+                input_names=list(dummy),
+                output_names=["last_hidden_state"],
+                dynamic_axes={name: dynamic for name in [*dummy, "last_hidden_state"]},
+                opset_version=17,
+                dynamo=False,
+            )
+        os.replace(tmp_path, path)
+
+    def _forward(self, texts):
+        inputs = self._tokenize(texts, "np")
+        feeds = {name: inputs[name].astype("int64") for name in self._input_names}
+        last_hidden_state = self.session.run(["last_hidden_state"], feeds)[0]  # (b, seq_len, hidden)
+        attention_mask = inputs["attention_mask"][..., None].astype("float32")  # (b, seq_len, 1)
+        return (last_hidden_state * attention_mask).sum(axis=1) / attention_mask.sum(axis=1)  # mean pooling
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+def create_embedding_model(model_name="BAAI/bge-small-zh", backend="torch", num_threads=None):
+    if backend == "torch":
+        return LocalEmbeddingModel(model_name)
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEmbeddingModel(model_name, quantize=backend == "onnx-int8", num_threads=num_threads)
+    raise ValueError(f"未知的嵌入后端：{backend}，可选：{', '.join(EMBEDDING_BACKENDS)}")
+
+
+# ===== 进程级共享模型 =====
+# Streamlit 每个会话、每次切换导师都会新建 RAGAgent；模型权重只读，
+# 所以按 model_name 在进程内只加载一份，所有会话与线程共用。
+_model_registry = {}
+_registry_lock = threading.Lock()
 
-        embedding = embedding[0].cpu().numpy()
-        embedding = embedding / np.linalg.norm(embedding)  # normalize
-        return embedding.astype("float32")  # ✅ 必须是 float32
+def get_embedding_model(model_name="BAAI/bge-small-zh", backend=None) -> BatchedEmbeddingModel:
+    """backend 缺省读取 EMBEDDING_BACKEND（torch / onnx / onnx-int8），
+    ONNX 推理线程数由 EMBEDDING_THREADS 控制。"""
+    backend = backend or os.getenv("EMBEDDING_BACKEND", "torch")
+    key = (model_name, backend)
+    model = _model_registry.get(key)
+    if model is None:
+        with _registry_lock:
+            model = _model_registry.get(key)
+            if model is None:  # 双重检查，避免并发首次加载两份
+                threads = os.getenv("EMBEDDING_THREADS")
+                model = create_embedding_model(model_name, backend, int(threads) if threads else None)
+                _model_registry[key] = model
+    return model
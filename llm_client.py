@@ -0,0 +1,267 @@
+# llm_client.py
+# RAGAgent 的 LLM 调用层：连接池、超时、指数退避重试、全局重试预算与并发上限
+# 同步与异步接口共用一套策略；base_url 可指向本地 mock 服务用于测试与压测
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+# httpx 在首次创建客户端时才导入，import rag_agent 不承担其导入耗时
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+class LLMError(RuntimeError):
+    pass
+
+# ===== token 计数 =====
+_encodings = {}
+_CJK_REGEX = re.compile(r"[\u3000-\u303f\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+def count_tokens(text, model="gpt-4"):
+    """按模型分词器统计 token 数；未安装 tiktoken 时估算：中文字符各 1 个，其余约 4 字符 1 个。"""
+    if model not in _encodings:
+        try:
+            import tiktoken
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except (ImportError, KeyError):
+            _encodings[model] = None
+    encoding = _encodings[model]
+    if encoding is not None:
+        return len(encoding.encode(text))
+    cjk = len(_CJK_REGEX.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def count_message_tokens(messages, model="gpt-4"):
+    """chat messages 的 token 数，每条消息另计约 4 个格式 token。"""
+    return sum(count_tokens(m["content"], model) + 4 for m in messages) + 2
+
+class RetryBudget:
+    """全局重试预算（令牌桶）：每个请求存入 ratio 个令牌，每次重试取出 1 个。
+
+    上游整体故障时重试量被限制在正常流量的 ratio 倍以内，避免重试风暴。
+    """
+
+    def __init__(self, ratio=0.2, initial=10.0, capacity=100.0):
+        self.ratio = ratio
+        self.capacity = capacity
+        self._tokens = initial
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def try_withdraw(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+class LLMClient:
+    def __init__(self, api_key, base_url="https://api.openai.com/v1", model="gpt-4",
+                 timeout=60.0, connect_timeout=5.0, max_retries=3, backoff_base=0.5,
+                 backoff_max=8.0, max_concurrency=16, retry_budget=None):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
+        self.retry_budget = retry_budget or RetryBudget()
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+
+        import httpx
+        self._headers = {"Authorization": f"Bearer {api_key}"}
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        self._client = httpx.Client(headers=self._headers, timeout=self._timeout, limits=self._limits)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        # 异步客户端与信号量绑定事件循环：每个运行中的循环各有一份，首次使用时在该循环内创建。
+        # 进程共享的客户端可能先后被多个 asyncio.run 使用，不能复用上一个（已关闭）循环的连接
+        self._async = {}  # loop -> (AsyncClient, Semaphore)
+        self._async_lock = threading.Lock()
+
+    # ===== 重试策略 =====
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)  # 抖动，避免同时重试
+
+    def _should_retry(self, attempt, error=None, response=None):
+        if response is not None and response.status_code not in RETRYABLE_STATUS:
+            return False
+        if attempt >= self.max_retries or not self.retry_budget.try_withdraw():
+            return False
+        self.stats["retries"] += 1
+        return True
+
+    def _payload(self, messages, stream, params):
+        return {"model": params.pop("model", self.model), "messages": messages, "stream": stream, **params}
+
+    @staticmethod
+    def _raise_for_status(response):
+        if response.status_code >= 400:
+            raise LLMError(f"LLM 请求失败：HTTP {response.status_code} {response.text[:200]}")
+
+    @staticmethod
+    def _iter_sse_deltas(lines):
+        for line in lines:
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+
+    # ===== 同步接口 =====
+    def _send(self, messages, stream, params):
+        """发送请求，可重试的错误按退避重试；返回状态码正常的 response（流式时未读取 body）。"""
+        import httpx
+        self.stats["requests"] += 1
+        self.retry_budget.deposit()
+        url = f"{self.base_url}/chat/completions"
+        attempt = 0
+        while True:
+            response = None
+            try:
+                request = self._client.build_request("POST", url, json=self._payload(messages, stream, dict(params)))
+                response = self._client.send(request, stream=stream)
+                if response.status_code < 400:
+                    return response
+                if stream:
+                    response.read()
+            except httpx.TransportError as e:  # 连接失败、超时等
+                if not self._should_retry(attempt, error=e):
+                    self.stats["failures"] += 1
+                    raise LLMError(f"LLM 请求失败：{e!r}") from e
+            else:
+                if not self._should_retry(attempt, response=response):
+                    self.stats["failures"] += 1
+                    self._raise_for_status(response)
+            time.sleep(self._backoff(attempt, response))
+            attempt += 1
+
+    def chat(self, messages, **params):
+        with self._slots:
+            response = self._send(messages, False, params)
+        return response.json()["choices"][0]["message"]["content"].strip()
+
+    def stream_chat(self, messages, **params):
+        """逐段 yield 回答；只在收到首段之前重试，之后的错误直接抛出。"""
+        with self._slots:
+            response = self._send(messages, True, params)
+            try:
+                yield from self._iter_sse_deltas(response.iter_lines())
+            finally:
+                response.close()
+
+    # ===== 异步接口 =====
+    def _ensure_async(self):
+        """返回当前循环的 (AsyncClient, Semaphore)；顺带丢弃已关闭循环留下的实例。"""
+        loop = asyncio.get_running_loop()
+        entry = self._async.get(loop)
+        if entry is None:
+            import httpx
+            with self._async_lock:
+                # 循环关闭后无法再 await aclose，其连接随对象回收释放
+                for stale in [l for l in self._async if l.is_closed()]:
+                    del self._async[stale]
+                entry = self._async.get(loop)
+                if entry is None:
+                    entry = (
+                        httpx.AsyncClient(headers=self._headers, timeout=self._timeout, limits=self._limits),
+                        asyncio.Semaphore(self.max_concurrency),
+                    )
+                    self._async[loop] = entry
+        return entry
+
+    async def _asend(self, messages, stream, params):
+        import httpx
+        client, _ = self._ensure_async()
+        self.stats["requests"] += 1
+        self.retry_budget.deposit()
+        url = f"{self.base_url}/chat/completions"
+        attempt = 0
+        while True:
+            response = None
+            try:
+                request = client.build_request("POST", url, json=self._payload(messages, stream, dict(params)))
+                response = await client.send(request, stream=stream)
+                if response.status_code < 400:
+                    return response
+                if stream:
+                    await response.aread()
+            except httpx.TransportError as e:
+                if not self._should_retry(attempt, error=e):
+                    self.stats["failures"] += 1
+                    raise LLMError(f"LLM 请求失败：{e!r}") from e
+            else:
+                if not self._should_retry(attempt, response=response):
+                    self.stats["failures"] += 1
+                    self._raise_for_status(response)
+            await asyncio.sleep(self._backoff(attempt, response))
+            attempt += 1
+
+    async def achat(self, messages, **params):
+        _, slots = self._ensure_async()
+        async with slots:
+            response = await self._asend(messages, False, params)
+        return response.json()["choices"][0]["message"]["content"].strip()
+
+    async def astream_chat(self, messages, **params):
+        _, slots = self._ensure_async()
+        async with slots:
+            response = await self._asend(messages, True, params)
+            try:
+                async for line in response.aiter_lines():
+                    for delta in self._iter_sse_deltas([line]):
+                        yield delta
+                    if line.strip() == "data: [DONE]":
+                        break
+            finally:
+                await response.aclose()
+
+    async def aclose(self):
+        """关闭当前循环的异步客户端；在 asyncio.run 结束前调用，连接随循环一起释放。"""
+        with self._async_lock:
+            entry = self._async.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[0].aclose()
+
+    def close(self):
+        """关闭同步客户端；异步客户端需在各自的循环内用 aclose 关闭。"""
+        self._client.close()
+
+# ===== 进程级共享客户端 =====
+_client_registry = {}
+_registry_lock = threading.Lock()
+
+def _default_api_key():
+    api_key = os.getenv("OPENAI_API_KEY")
+    if api_key:
+        return api_key
+    import streamlit as st
+    return st.secrets["OPENAI_API_KEY"]  # 从 Streamlit Secrets 获取 API 密钥
+
+def get_llm_client(base_url=None, model="gpt-4"):
+    """进程内共享同一个连接池；base_url 缺省读取 OPENAI_API_BASE。"""
+    base_url = base_url or os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+    key = (base_url, model)
+    client = _client_registry.get(key)
+    if client is None:
+        with _registry_lock:
+            client = _client_registry.get(key)
+            if client is None:
+                client = LLMClient(_default_api_key(), base_url=base_url, model=model)
+                _client_registry[key] = client
+    return client
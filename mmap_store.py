@@ -0,0 +1,158 @@
+# mmap_store.py
+# 内存映射的磁盘向量库：多个 Streamlit 进程通过系统页缓存共享同一份数据
+#
+# 目录结构：
+#   manifest.json  条数、维度、模型等元信息
+#   vectors.f32    float32 向量，行优先 (count, dim)
+#   docs.bin       每条文档紧凑 JSON [text, metadata] 的 UTF-8 拼接
+#   docs.idx       uint64 偏移量 (count + 1)，第 i 条为 docs.bin[idx[i]:idx[i+1]]
+#
+# 文档按书连续存放，manifest 中的 books 记录每本书的行区间，按书过滤时只计算这些行
+import os
+import json
+import mmap
+import numpy as np
+
+FORMAT_VERSION = 1
+
+def book_name(title):
+    """元数据 title 去掉 .md / .pdf 扩展名即书名，作为按书分区的键。"""
+    return os.path.splitext(title)[0] if title.endswith((".md", ".pdf")) else title
+
+def book_ranges(titles):
+    """把连续同书的文档下标合并为半开区间：{书名: [[start, end], ...]}。
+    load_chunks 按书依次输出，通常每本书只有一个区间。"""
+    ranges = {}
+    titles = list(titles)
+    start = 0
+    for i in range(1, len(titles) + 1):
+        if i == len(titles) or titles[i] != titles[start]:
+            ranges.setdefault(book_name(titles[start]), []).append([start, i])
+            start = i
+    return ranges
+
+def select_ranges(ranges, books):
+    """books 对应的行区间，按起点排序；books 为 None 表示不过滤，返回 None。"""
+    if books is None:
+        return None
+    return sorted(r for book in books for r in ranges.get(book, []))
+
+def write_documents(store_dir, documents):
+    """写出 docs.bin / docs.idx；bm25_index 与本模块共用这一文档格式。"""
+    offsets = np.zeros(len(documents) + 1, dtype="uint64")
+    with open(os.path.join(store_dir, "docs.bin"), "wb") as f:
+        for i, (text, meta) in enumerate(documents):
+            data = json.dumps([text, meta], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            f.write(data)
+            offsets[i + 1] = offsets[i] + len(data)
+    offsets.tofile(os.path.join(store_dir, "docs.idx"))
+
+class MappedDocuments:
+    """只读映射 write_documents 的产物，按下标取 (text, metadata)。"""
+
+    def __init__(self, store_dir, count):
+        self.offsets = np.memmap(os.path.join(store_dir, "docs.idx"), dtype="uint64",
+                                 mode="r", shape=(count + 1,))
+        with open(os.path.join(store_dir, "docs.bin"), "rb") as f:
+            self._docs = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+
+    def __getitem__(self, i):
+        text, meta = json.loads(self._docs[int(self.offsets[i]):int(self.offsets[i + 1])])
+        return text, meta
+
+def write_mmap_store(store_dir, documents, vectors, model_id=""):
+    """写出 documents [(text, metadata)] 与对应的归一化向量；model_id 为生成向量的模型与后端。"""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    if len(documents) != len(vectors):
+        raise ValueError(f"文档数 {len(documents)} 与向量数 {len(vectors)} 不一致")
+    os.makedirs(store_dir, exist_ok=True)
+
+    vectors.tofile(os.path.join(store_dir, "vectors.f32"))
+    write_documents(store_dir, documents)
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "count": int(vectors.shape[0]),
+        "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+        "dtype": "float32",
+        "model": model_id,
+        "books": book_ranges(meta.get("title", "") for _, meta in documents),
+    }
+    # manifest 最后写入，读到它即代表其余文件已完整
+    with open(os.path.join(store_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+class MmapVectorStore:
+    """只读打开 write_mmap_store 的产物，向量与文档均零拷贝映射。"""
+    read_only = True
+
+    def __init__(self, store_dir="mmap_store"):
+        manifest_path = os.path.join(store_dir, "manifest.json")
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"无法找到向量库：{manifest_path}，请先运行 mmap_store.py")
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"不支持的向量库格式：{self.manifest.get('format')}")
+
+        self.count = self.manifest["count"]
+        self.dim = self.manifest["dim"]
+        self.model_id = self.manifest.get("model") or None
+        self.vectors = np.memmap(os.path.join(store_dir, "vectors.f32"), dtype="float32",
+                                 mode="r", shape=(self.count, self.dim))
+        self.documents = MappedDocuments(store_dir, self.count)
+        # 旧版 manifest 没有 books 时扫描一遍文档补算
+        self.books = self.manifest.get("books") or book_ranges(
+            self.documents[i][1].get("title", "") for i in range(self.count)
+        )
+
+    def __len__(self):
+        return self.count
+
+    def get(self, i):
+        return self.documents[i]
+
+    def search_ids(self, embedding, top_k=5, books=None):
+        """向量已归一化，内积排序与 L2 排序一致；返回 (ids, scores) 按相关度降序。
+
+        books 为书名列表时只计算这些书所在的行，不读取其余向量。
+        """
+        query = np.asarray(embedding, dtype="float32").reshape(-1)
+        rows = select_ranges(self.books, books)
+        if rows is None:
+            candidates = None
+            scores = self.vectors @ query if self.count else np.empty(0, dtype="float32")
+        else:
+            candidates = np.concatenate([np.arange(s, e) for s, e in rows] or [np.empty(0, dtype="int64")])
+            scores = np.concatenate([self.vectors[s:e] @ query for s, e in rows] or [np.empty(0, dtype="float32")])
+        if len(scores) == 0:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="float32")
+        top_k = min(top_k, len(scores))
+        order = np.argpartition(-scores, top_k - 1)[:top_k]
+        order = order[np.argsort(-scores[order])]
+        ids = order if candidates is None else candidates[order]
+        return ids, scores[order]
+
+    def search(self, embedding, top_k=5, books=None):
+        ids, _ = self.search_ids(embedding, top_k, books)
+        return [self.get(i) for i in ids]
+
+def build_mmap_store(json_dir, store_dir="mmap_store", batch_size=32):
+    from build_chroma import load_chunks, chunk_metadata
+    from embedding_model import get_embedding_model
+
+    print("初始化嵌入模型...")
+    embedder = get_embedding_model()
+
+    chunks = [c for c in load_chunks(json_dir) if c["content"].strip()]
+    print(f"开始处理 {len(chunks)} 条段落...")
+    vectors = embedder.embed_batch([c["content"].strip() for c in chunks], batch_size=batch_size)
+    documents = [
+        (chunk["content"].strip(), chunk_metadata(chunk))
+        for chunk in chunks
+    ]
+    write_mmap_store(store_dir, documents, vectors, model_id=embedder.model_id)
+    print(f"✅ 构建完成！共 {len(documents)} 条向量，数据保存在：{store_dir}/")
+
+if __name__ == "__main__":
+    build_mmap_store("book_split")
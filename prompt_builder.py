@@ -0,0 +1,142 @@
+# prompt_builder.py
+# 按 token 预算组装 RAGAgent 的 prompt：
+#   - 人物 system_prompt 始终是第一条消息且内容不变，作为可被服务端缓存的稳定前缀
+#   - 检索段落去重（内容重叠的只保留排名靠前的一段）、超长段落在句末截断，按预算依次放入
+#   - 最近几轮对话原样保留（回答过长时截断），更早的轮次滚动压缩进对话摘要，摘要只增量更新
+import re
+from bm25_index import char_bigrams
+from llm_client import count_message_tokens, count_tokens
+
+_SENTENCE_END = re.compile(r"(?<=[。！？；!?;\n])")
+ELLIPSIS = "……"
+
+def trim_to_tokens(text, max_tokens, model="gpt-4"):
+    """不超过 max_tokens 时原样返回；否则在句末截断并加省略号，一句都放不下时按字截断。"""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    max_tokens -= count_tokens(ELLIPSIS, model)
+    kept, used = [], 0
+    for sentence in _SENTENCE_END.split(text):
+        n = count_tokens(sentence, model)
+        if used + n > max_tokens:
+            break
+        kept.append(sentence)
+        used += n
+    if not kept:
+        lo, hi = 0, len(text)
+        while lo < hi:  # 二分出放得下的最长前缀
+            mid = (lo + hi + 1) // 2
+            if count_tokens(text[:mid], model) <= max_tokens:
+                lo = mid
+            else:
+                hi = mid - 1
+        return text[:lo] + ELLIPSIS
+    return "".join(kept).rstrip() + ELLIPSIS
+
+def dedupe_chunks(context_pairs, threshold=0.8):
+    """按字符 bigram 的重叠系数（交集 / 较小集合）去重：一段基本被另一段包含时视为重复，保留排名靠前的。"""
+    kept, kept_grams = [], []
+    for text, meta in context_pairs:
+        grams = set(char_bigrams(text))
+        if any(len(grams & g) >= threshold * min(len(grams), len(g)) for g in kept_grams if g and grams):
+            continue
+        kept.append((text, meta))
+        kept_grams.append(grams)
+    return kept
+
+class PromptBuilder:
+    def __init__(self, model="gpt-4", context_budget=1500, history_budget=800, summary_budget=300,
+                 max_chunk_tokens=400, recent_turns=2, max_answer_tokens=300):
+        self.model = model
+        self.context_budget = context_budget        # 引用资料总预算
+        self.history_budget = history_budget        # 原样保留的最近几轮对话总预算
+        self.summary_budget = summary_budget        # 更早轮次的摘要预算
+        self.max_chunk_tokens = max_chunk_tokens    # 单段引用上限
+        self.recent_turns = recent_turns
+        self.max_answer_tokens = max_answer_tokens  # 保留轮次中单个回答的上限
+
+    def quote_blocks(self, context_pairs):
+        """返回 (引用段文本, 统计)；段落按检索顺序放入，放不下的丢弃。"""
+        unique = dedupe_chunks(context_pairs)
+        blocks, used, trimmed = [], 0, 0
+        for text, meta in unique:
+            book = meta.get("title", "未知书籍").replace(".md", "").replace(".pdf", "")
+            chapter = meta.get("chapter_title", "未知章节")
+            quote = trim_to_tokens(text.strip(), self.max_chunk_tokens, self.model)
+            trimmed += quote != text.strip()
+            block = f"> {quote}\n> ——《{book}》·{chapter}\n\n"
+            n = count_tokens(block, self.model)
+            if used + n > self.context_budget:
+                break
+            blocks.append(block)
+            used += n
+        stats = {
+            "chunks": len(context_pairs),
+            "deduped": len(context_pairs) - len(unique),
+            "trimmed": trimmed,
+            "used_chunks": len(blocks),
+            "context_tokens": used,
+        }
+        return "".join(blocks), stats
+
+    def summarize_turn(self, question, answer):
+        """抽取式摘要：问题与回答开头各截取一小段，不额外调用模型。"""
+        return (f"问：{trim_to_tokens(question.strip(), 60, self.model)} "
+                f"答：{trim_to_tokens(answer.strip(), 80, self.model)}")
+
+    def roll_summary(self, summary, turns):
+        """把 turns 追加进滚动摘要；超出预算时丢弃最早的条目。"""
+        lines = summary.split("\n") if summary else []
+        lines += [self.summarize_turn(q, a) for q, a in turns]
+        while len(lines) > 1 and count_tokens("\n".join(lines), self.model) > self.summary_budget:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    def recent_history(self, history, summarized):
+        """保留的原样轮次：最多 recent_turns 轮、不早于已进入摘要的位置，且总量不超过预算。
+        返回 (保留轮次的起始下标, 截断后的轮次)。"""
+        start = max(summarized, len(history) - self.recent_turns)
+        turns = [(q, trim_to_tokens(a, self.max_answer_tokens, self.model)) for q, a in history[start:]]
+        while turns and sum(count_tokens(q, self.model) + count_tokens(a, self.model)
+                            for q, a in turns) > self.history_budget:
+            turns.pop(0)
+            start += 1
+        return start, turns
+
+    def build(self, system_prompt, question, context_pairs, history=(), summary_state=("", 0)):
+        """返回 (messages, 新的摘要状态, 统计)。summary_state 为 (摘要文本, 已摘要的轮数)，由调用方缓存。"""
+        history = list(history)
+        summary, summarized = summary_state
+        if summarized > len(history):  # 对话被清空或重置，摘要作废
+            summary, summarized = "", 0
+        start, turns = self.recent_history(history, summarized)
+        if start > summarized:
+            summary = self.roll_summary(summary, history[summarized:start])
+            summarized = start
+
+        quote_blocks, stats = self.quote_blocks(context_pairs)
+        user_prompt = f"""
+【引用资料】：
+{quote_blocks}
+
+【用户问题】：{question}
+请以你的风格回答，引用资料内容，不得编造。
+"""
+
+        # 稳定前缀在前，变化频率越高的内容越靠后
+        messages = [{"role": "system", "content": system_prompt}]
+        if summary:
+            messages.append({"role": "system", "content": f"【此前对话摘要】\n{summary}"})
+        for q, a in turns:
+            messages.append({"role": "user", "content": q})
+            messages.append({"role": "assistant", "content": a})
+        messages.append({"role": "user", "content": user_prompt})
+
+        stats.update({
+            "prompt_tokens": count_message_tokens(messages, self.model),
+            "system_tokens": count_tokens(system_prompt, self.model),
+            "summary_tokens": count_tokens(summary, self.model) if summary else 0,
+            "history_turns": len(turns),
+            "summarized_turns": summarized,
+        })
+        return messages, (summary, summarized), stats
@@ -1,15 +1,30 @@
 # query_chroma.py
 import chromadb
-from embedding_model import LocalEmbeddingModel
+from embedding_cache import get_query_embedder
 
 class ChromaSearcher:
-    def __init__(self, persist_dir="chroma_store"):
-        self.embedder = LocalEmbeddingModel()
+    def __init__(self, persist_dir="chroma_store", mmap_dir=None):
+        self.embedder = get_query_embedder()
+        self.store = None
+        if mmap_dir:
+            # 使用 mmap_store 构建的零拷贝向量库，返回格式与 Chroma 一致
+            from mmap_store import MmapVectorStore
+            self.store = MmapVectorStore(mmap_dir)
+            return
         self.client = chromadb.PersistentClient(path=persist_dir)  # ✅ 新写法
         self.collection = self.client.get_or_create_collection(name="dao_knowledge")
 
     def search(self, query, top_k=3):
         embedding = self.embedder.embed_text(query)
+        if self.store is not None:
+            ids, scores = self.store.search_ids(embedding, top_k)
+            docs = [self.store.get(i) for i in ids]
+            return {
+                "ids": [[meta.get("id", str(i)) for i, (_, meta) in zip(ids, docs)]],
+                "documents": [[text for text, _ in docs]],
+                "metadatas": [[meta for _, meta in docs]],
+                "distances": [[float(2 - 2 * s) for s in scores]],  # 归一化向量的 L2 平方距离
+            }
         results = self.collection.query(
             query_embeddings=[embedding],
             n_results=top_k
@@ -1,15 +1,25 @@
 import os
 import json
-import faiss
-import numpy as np
-import streamlit as st
-import openai  # 确保使用 openai 库
-from embedding_model import LocalEmbeddingModel
+import time
+import uuid
+import asyncio
+import threading
+from functools import lru_cache
+from answer_cache import chunk_key, get_answer_cache
+from conversation_store import get_conversation_store
+from embedding_cache import get_query_embedder
+from llm_client import count_tokens, get_llm_client
+from prompt_builder import PromptBuilder
+from reranker import get_reranker
+from retriever import check_index_model, get_lexical_index, get_retriever, get_seed_retriever, reciprocal_rank_fusion
+from tracing import span, trace
 
-# 使用 Streamlit Secrets 获取 OpenAI API Key
-openai.api_key = st.secrets["OPENAI_API_KEY"]  # 从 Streamlit Secrets 获取 API 密钥
+# 每次组装 prompt 时打印 token 统计（本地调试用），PROMPT_LOG=1 打开；
+# 同样的统计总会记录在 build_prompt span 上，开启追踪或调试面板即可查看
+LOG_PROMPTS = os.getenv("PROMPT_LOG", "0") == "1"
 
-# 加载人物设定
+# 加载人物设定（首次使用时读取一次，import 时不读文件）
+@lru_cache(maxsize=1)
 def load_personas():
     current_dir = os.path.dirname(os.path.abspath(__file__))
     persona_path = os.path.join(current_dir, "personas.json")
@@ -18,74 +28,340 @@ def load_personas():
     with open(persona_path, "r", encoding="utf-8") as f:
         return json.load(f)
 
-personas = load_personas()
+# ===== 人物级共享状态 =====
+class PersonaRuntime:
+    """一个人物在进程内共享的重量级状态：人物设定、偏好书目，以及检索与生成用到的模型、索引和客户端。
+
+    各会话的 RAGAgent 只是引用它的轻量视图，切换人物时不重新解析这些依赖。
+    组件仍在首次使用时才解析（多为进程级单例），构造本身不加载模型与索引。
+    """
+
+    def __init__(self, persona, retriever=None, llm=None, cache=None, lexical=None, reranker=None,
+                 prompt_builder=None, embedder=None):
+        self.persona = persona
+        self.persona_data = load_personas().get(persona)
+        # 人物设定中可选的 books（偏好书目），检索只在这些书内进行；未配置时检索全库
+        self.books = (self.persona_data or {}).get("books") or None
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        self._embedder = embedder
+        self._retriever = retriever
+        self._llm = llm
+        self._cache = cache
+        self._lexical = lexical
+        self._reranker = reranker
+
+    @property
+    def system_prompt(self):
+        if not self.persona_data:
+            raise ValueError(f"角色 {self.persona} 不存在")
+        return self.persona_data["system_prompt"]
+
+    @property
+    def embedder(self):
+        # 进程内共享的模型，外加查询向量 LRU 缓存（重复提问与 rerun 不再重复编码）
+        if self._embedder is None:
+            self._embedder = get_query_embedder()
+        return self._embedder
+
+    @property
+    def retriever(self):
+        # 预构建索引进程内只加载一次，各会话只读共享；后端见 retriever.RETRIEVER_BACKENDS
+        if self._retriever is None:
+            try:
+                retriever = get_retriever()
+            except FileNotFoundError as e:
+                # 尚未构建任何索引时退回内置示例文档，应用照常可用
+                print(f"⚠️ {e}；暂用内置示例文档检索")
+                retriever = get_seed_retriever(self.embedder)
+            check_index_model(retriever, self.embedder)
+            self._retriever = retriever
+        return self._retriever
+
+    @property
+    def lexical(self):
+        # 字符 bigram BM25 索引，与向量结果 RRF 融合；没有索引或传 False 时只用向量检索
+        if self._lexical is None:
+            self._lexical = get_lexical_index() or False
+        return self._lexical or None
+
+    @property
+    def reranker(self):
+        # 可选的 cross-encoder 第二阶段，见 reranker.py；传 False 关闭
+        if self._reranker is None:
+            self._reranker = get_reranker() or False
+        return self._reranker or None
+
+    @property
+    def llm(self):
+        # LLM 调用层（连接池 / 超时 / 重试），可替换为指向 mock 服务的客户端
+        if self._llm is None:
+            self._llm = get_llm_client()
+        return self._llm
+
+    @property
+    def cache(self):
+        # 回答缓存：缺省使用进程共享的 SQLite 缓存，传 False 关闭
+        if self._cache is None:
+            self._cache = get_answer_cache() or False
+        return self._cache or None
+
+    def resolve(self):
+        """提前解析全部依赖（预热用）。"""
+        self.embedder, self.retriever, self.lexical, self.reranker, self.llm, self.cache
+        return self
+
+# 按人物缓存的共享状态；只有使用缺省依赖的 agent 走这里，传入自定义依赖的 agent 各自持有私有实例
+_runtime_pool = {}
+_runtime_lock = threading.Lock()
+
+def get_persona_runtime(persona):
+    runtime = _runtime_pool.get(persona)
+    if runtime is None:
+        with _runtime_lock:
+            runtime = _runtime_pool.get(persona)
+            if runtime is None:
+                runtime = PersonaRuntime(persona)
+                _runtime_pool[persona] = runtime
+    return runtime
 
 # RAGAgent 类
 class RAGAgent:
-    def __init__(self, persona="孔子"):
-        self.embedder = LocalEmbeddingModel()
-        self.index = faiss.IndexFlatL2(self.embedder.dim)
-        self.documents = []  # [(text, metadata)]
+    # 混合检索时向量与 BM25 各取前 fusion_fetch_k 条参与 RRF 融合
+    fusion_fetch_k = 20
+    # 启用 reranker（RERANKER=模型名）时：先召回 rerank_fetch_k 条，重排后只取 rerank_top_k 条进 prompt；
+    # 单次重排预计超过 rerank_budget_s 秒则退回第一阶段顺序（尽力而为，见 reranker.py）
+    rerank_fetch_k = 20
+    rerank_top_k = 3
+    rerank_budget_s = float(os.getenv("RERANK_BUDGET_MS", "300")) / 1000
+    rerank_min_score = None
+
+    def __init__(self, persona="孔子", session_id=None, retriever=None, llm=None, cache=None, lexical=None,
+                 reranker=None, prompt_builder=None, store=None, embedder=None):
+        # 会话级的轻量视图：模型、索引、人物设定都在按人物共享的 PersonaRuntime 中，
+        # 构造 agent 或切换人物只是取池中的实例；对话历史与摘要存放在 conversation_store 中，按 session_id 访问
+        self._overrides = {
+            "retriever": retriever, "llm": llm, "cache": cache, "lexical": lexical,
+            "reranker": reranker, "prompt_builder": prompt_builder, "embedder": embedder,
+        }
+        self._store = store
         self.persona = persona
-        self.history = []
+        self.session_id = session_id or uuid.uuid4().hex
+        self.last_timings = {}  # 最近一次回答的耗时：retrieve / ttfb / total（秒）
+        self.last_rerank = None  # 最近一次重排的 elapsed / fallback / scored
+        self.last_prompt = {}  # 最近一次 prompt 的 token 统计，见 PromptBuilder.build
+        self.last_trace = None  # 最近一次 ask / retrieve 所在的 trace（开启追踪时），见 tracing.py
+
+    @property
+    def persona(self):
+        return self._persona
+
+    @persona.setter
+    def persona(self, persona):
+        self._persona = persona
+        if any(v is not None for v in self._overrides.values()):
+            self.runtime = PersonaRuntime(persona, **self._overrides)
+        else:
+            self.runtime = get_persona_runtime(persona)
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = get_conversation_store()
+        return self._store
+
+    @property
+    def history(self):
+        """本会话的 [(问题, 回答)]，每次从存储读取，进程内不常驻。"""
+        return self.store.history(self.session_id)
+
+    def remember(self, question, answer):
+        self.store.append(self.session_id, question, answer)
 
-        # ✅ 添加默认文档，避免空 index 报错
-        self.add_documents([
-            ("道可道，非常道；名可名，非常名。", {"title": "道德经", "chapter_title": "第一章"}),
-            ("学而时习之，不亦说乎？", {"title": "论语", "chapter_title": "学而篇"})
-        ])
+    def clear_history(self):
+        self.store.clear(self.session_id)
+
+    @property
+    def embedder(self):
+        return self.runtime.embedder
+
+    @property
+    def retriever(self):
+        return self.runtime.retriever
+
+    @property
+    def lexical(self):
+        return self.runtime.lexical
+
+    @property
+    def reranker(self):
+        return self.runtime.reranker
+
+    @property
+    def llm(self):
+        return self.runtime.llm
+
+    @property
+    def cache(self):
+        return self.runtime.cache
+
+    @property
+    def prompt_builder(self):
+        return self.runtime.prompt_builder
 
     def add_documents(self, docs):
-        embeddings = [self.embedder.embed_text(text) for text, _ in docs]
-        self.index.add(np.array(embeddings, dtype="float32"))
-        self.documents.extend(docs)
+        if self.retriever.read_only:
+            raise ValueError("共享索引为只读，请改用 InMemoryRetriever 或重新构建索引")
+        embeddings = self.embedder.embed_batch([text for text, _ in docs])
+        self.retriever.add_documents(docs, embeddings)
 
     def retrieve(self, query, top_k=5):
-        if self.index.ntotal == 0:
-            return []
-        embedding = self.embedder.embed_text(query).astype("float32").reshape(1, -1)
-        _, indices = self.index.search(embedding, top_k)
-        return [self.documents[i] for i in indices[0] if i < len(self.documents)]
+        with trace("retrieve", persona=self.persona, top_k=top_k) as t:
+            with span("embed"):
+                embedding = self.embedder.embed_text(query)
+            results = self._search(query, embedding, top_k)
+        self.last_trace = t.trace
+        return results
+
+    @property
+    def books(self):
+        return self.runtime.books
+
+    def _search(self, query, embedding, top_k):
+        books = self.books
+        fetch_k = top_k if self.reranker is None else max(top_k, self.rerank_fetch_k)
+        with span("search", books=len(books or ()), fetch_k=fetch_k) as sp:
+            results = self._search_books(query, embedding, fetch_k, books)
+            if not results and books is not None:
+                # 索引中没有偏好书目（如只收录了部分书）时退回全库检索
+                sp.set(books_fallback=True)
+                results = self._search_books(query, embedding, fetch_k, None)
+        if self.reranker is None:
+            return results
+        with span("rerank", candidates=len(results)) as sp:
+            reranked, self.last_rerank = self.reranker.rerank(
+                query, results, min(top_k, self.rerank_top_k), self.rerank_budget_s, self.rerank_min_score
+            )
+            sp.set(fallback=self.last_rerank["fallback"])
+        # 超出预算时按第一阶段顺序取原本的 top_k 条
+        return results[:top_k] if self.last_rerank["fallback"] else reranked
+
+    def _search_books(self, query, embedding, top_k, books):
+        if self.lexical is None:
+            with span("index.search"):
+                return self.retriever.search(embedding, top_k, books=books)
+        fetch_k = max(top_k, self.fusion_fetch_k)
+        with span("index.search"):
+            dense = self.retriever.search(embedding, fetch_k, books=books)
+        with span("bm25.search"):
+            lexical = self.lexical.search(query, fetch_k, books=books)
+        return reciprocal_rank_fusion([dense, lexical], top_k)
+
+    def build_messages(self, question, context_pairs=None):
+        if context_pairs is None:
+            context_pairs = self.retrieve(question)
+
+        # 按 token 预算组装：引用去重截断、早期对话滚动摘要。
+        # 摘要与已摘要到的 seq 存在 conversation_store 中，只读取尚未摘要的轮次
+        with span("build_prompt") as sp:
+            summary, summarized_seq = self.store.summary(self.session_id)
+            turns = self.store.turns(self.session_id, after_seq=summarized_seq)
+            messages, (new_summary, folded), self.last_prompt = self.prompt_builder.build(
+                self.runtime.system_prompt, question, context_pairs, [(q, a) for _, q, a in turns], (summary, 0)
+            )
+            sp.set(**self.last_prompt)
+        if folded:
+            self.store.set_summary(self.session_id, new_summary, turns[folded - 1][0])
+        if LOG_PROMPTS:
+            p = self.last_prompt
+            print(f"📝 prompt {p['prompt_tokens']} tokens（引用 {p['context_tokens']}，摘要 {p['summary_tokens']}，"
+                  f"保留 {p['history_turns']} 轮；段落 {p['used_chunks']}/{p['chunks']}，"
+                  f"去重 {p['deduped']}，截断 {p['trimmed']}）")
+        return messages
+
+    def prepare(self, question, top_k=5):
+        """检索并构造 messages，返回 (messages, 缓存的回答, 写缓存参数)。
+
+        命中回答缓存时 messages 为 None；有对话历史时回答依赖上下文，不读写缓存。
+        """
+        with span("embed"):
+            embedding = self.embedder.embed_text(question)
+        context_pairs = self._search(question, embedding, top_k)
+        cache_args = None
+        if self.cache is not None and not self.store.has_history(self.session_id):
+            cache_args = (self.persona, question, [chunk_key(t, m) for t, m in context_pairs], embedding)
+            with span("cache.lookup") as sp:
+                cached = self.cache.lookup(*cache_args)
+                sp.set(hit=cached is not None)
+            if cached is not None:
+                return None, cached, None
+        return self.build_messages(question, context_pairs), None, cache_args
 
     def ask(self, question):
-        context_pairs = self.retrieve(question)
+        with trace("ask", persona=self.persona) as t:
+            start = time.perf_counter()
+            messages, answer, cache_args = self.prepare(question)
+            retrieved = time.perf_counter()
 
-        persona_data = personas.get(self.persona)
-        if not persona_data:
-            raise ValueError(f"角色 {self.persona} 不存在")
+            if answer is None:
+                with span("llm", prompt_tokens=self.last_prompt["prompt_tokens"]) as sp:
+                    answer = self.llm.chat(messages, temperature=0.7)
+                    sp.set(completion_tokens=count_tokens(answer))
+                if cache_args:
+                    self.cache.put(*cache_args, answer)
+            self.remember(question, answer)
+            end = time.perf_counter()
+        self.last_trace = t.trace
+        self.last_timings = {"retrieve": retrieved - start, "ttfb": end - start, "total": end - start}
+        return answer
+
+    def ask_stream(self, question):
+        """流式回答：逐段 yield 模型输出，全部结束后再写入对话存储。"""
+        with trace("ask", persona=self.persona, stream=True) as t:
+            start = time.perf_counter()
+            messages, cached, cache_args = self.prepare(question)
+            retrieved = time.perf_counter()
+
+            parts = []
+            first_token = None
+            deltas = [cached] if cached is not None else self.llm.stream_chat(messages, temperature=0.7)
+            with span("llm", prompt_tokens=0 if cached is not None else self.last_prompt["prompt_tokens"]) as sp:
+                for delta in deltas:
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                        sp.set(ttfb=first_token - start)
+                    parts.append(delta)
+                    yield delta
+                answer = "".join(parts).strip()
+                sp.set(completion_tokens=count_tokens(answer), cached=cached is not None)
+
+            if cache_args:
+                self.cache.put(*cache_args, answer)
+            self.remember(question, answer)
+            end = time.perf_counter()
+        self.last_trace = t.trace
+        self.last_timings = {
+            "retrieve": retrieved - start,
+            "ttfb": (first_token or end) - start,
+            "total": end - start,
+        }
+
+    async def aask(self, question):
+        """异步版 ask：检索（CPU 计算）放到线程中，LLM 请求走异步连接池，不占用事件循环。"""
+        with trace("ask", persona=self.persona) as t:
+            start = time.perf_counter()
+            messages, answer, cache_args = await asyncio.to_thread(self.prepare, question)
+            retrieved = time.perf_counter()
 
-        system_prompt = persona_data["system_prompt"]
-
-        # 构造引用段
-        quote_blocks = ""
-        for text, meta in context_pairs:
-            book = meta.get("title", "未知书籍").replace(".md", "").replace(".pdf", "")
-            chapter = meta.get("chapter_title", "未知章节")
-            quote_blocks += f"> {text.strip()}\n> ——《{book}》·{chapter}\n\n"
-
-        user_prompt = f"""
-【引用资料】：
-{quote_blocks}
-
-【用户问题】：{question}
-请以你的风格回答，引用资料内容，不得编造。
-"""
-
-        messages = [{"role": "system", "content": system_prompt}]
-        for q, a in self.history[-5:]:
-            messages.append({"role": "user", "content": q})
-            messages.append({"role": "assistant", "content": a})
-        messages.append({"role": "user", "content": user_prompt})
-
-        # 使用 openai 接口获取回答
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=messages,
-            temperature=0.7
-        )
-
-        answer = response.choices[0].message.content.strip()
-        self.history.append((question, answer))
+            if answer is None:
+                with span("llm", prompt_tokens=self.last_prompt["prompt_tokens"]) as sp:
+                    answer = await self.llm.achat(messages, temperature=0.7)
+                    sp.set(completion_tokens=count_tokens(answer))
+                if cache_args:
+                    self.cache.put(*cache_args, answer)
+            self.remember(question, answer)
+            end = time.perf_counter()
+        self.last_trace = t.trace
+        self.last_timings = {"retrieve": retrieved - start, "ttfb": end - start, "total": end - start}
         return answer
 
 # ✅ CLI 测试入口（可选）
@@ -97,6 +373,8 @@ if __name__ == "__main__":
             break
         role_id = input("请选择角色（孔子 / 老子 / 南怀瑾）：\n> ") or "孔子"
         agent.persona = role_id
-        answer = agent.ask(question)
-        print(f"\n💡 回答（{role_id}）：\n{answer}")
+        print(f"\n💡 回答（{role_id}）：")
+        for delta in agent.ask_stream(question):
+            print(delta, end="", flush=True)
+        print()
 
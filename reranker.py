@@ -0,0 +1,99 @@
+# reranker.py
+# 检索第二阶段：本地 CPU cross-encoder（默认 bge-reranker）对过量召回的候选重新打分，
+# 只把最相关的几段放进 prompt；每次查询有时间预算，预计超出即退回第一阶段顺序。
+# 正在运行的一批无法中断，预算只能按单批耗时的保守估算尽力保证，不是硬上限
+import os
+import time
+import threading
+import numpy as np
+
+class CrossEncoderReranker:
+    """(问题, 段落) 成对打分的 cross-encoder，transformers 序列分类模型，输出越大越相关。"""
+    # 开始下一批前要求 已用时间 + budget_margin × 单批估算 不超过预算，给单批耗时抖动留出余量
+    budget_margin = 1.5
+
+    def __init__(self, model_name="BAAI/bge-reranker-base", batch_size=8, max_length=512):
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        self.model.eval()
+        # fast tokenizer 并发调用会报 "Already borrowed"，多会话共享时需加锁
+        self._tokenizer_lock = threading.Lock()
+        # 单批耗时的估算，用来判断剩余预算是否够再跑一批：变慢时立即取新值，变快时才按滑动平均缓慢下降；
+        # 首批含一次性开销不计入，用第二批作为初始估算；段落长度按常见切块长度（约 300 字）模拟
+        passages = ["预热" * 150] * batch_size
+        self._score_batch("预热", passages)
+        t0 = time.perf_counter()
+        self._score_batch("预热", passages)
+        self._batch_s = time.perf_counter() - t0
+        self.stats = {"queries": 0, "fallbacks": 0, "elapsed_s": 0.0}
+
+    def _score_batch(self, query, passages):
+        import torch
+        with self._tokenizer_lock:
+            inputs = self.tokenizer(
+                [query] * len(passages), passages,
+                padding=True, truncation="only_second", max_length=self.max_length, return_tensors="pt",
+            )
+        with torch.no_grad():
+            logits = self.model(**inputs).logits
+        return logits[:, -1].float().cpu().numpy()  # 单输出的 reranker 取唯一一列，二分类取"相关"一列
+
+    def rerank(self, query, candidates, top_k=3, budget_s=None, min_score=None):
+        """candidates 为第一阶段的 [(text, metadata)]，返回 (前 top_k 条, 信息)。
+
+        按单批耗时估算（乘以 budget_margin）：整体放不进预算时直接回退；分批打分时剩余预算不够再跑一批也停止，
+        整体退回第一阶段顺序（不使用只打了一半分的结果）。已开始的一批不能中断，
+        所以 budget_s 是尽力而为的上限，单批异常慢时实际耗时仍可能超出。
+        min_score 过滤掉低分段落，但至少保留一条。信息包括 elapsed、fallback、scored。
+        """
+        start = time.perf_counter()
+        scores = np.empty(len(candidates), dtype="float32")
+        batches = -(-len(candidates) // self.batch_size)
+        # 按估算整体放不进预算时直接回退，不做注定被丢弃的计算
+        fallback = budget_s is not None and batches * self._batch_s * self.budget_margin > budget_s
+        for i in range(0, 0 if fallback else len(candidates), self.batch_size):
+            elapsed = time.perf_counter() - start
+            if budget_s is not None and elapsed + self._batch_s * self.budget_margin > budget_s:
+                fallback = True
+                break
+            t0 = time.perf_counter()
+            batch = candidates[i:i + self.batch_size]
+            scores[i:i + len(batch)] = self._score_batch(query, [text for text, _ in batch])
+            batch_s = time.perf_counter() - t0
+            self._batch_s = max(batch_s, 0.8 * self._batch_s + 0.2 * batch_s)
+
+        if fallback:
+            results = list(candidates[:top_k])
+        else:
+            order = np.argsort(-scores, kind="stable")[:top_k]
+            if min_score is not None:
+                order = [i for i in order if scores[i] >= min_score] or order[:1]
+            results = [candidates[i] for i in order]
+
+        elapsed = time.perf_counter() - start
+        self.stats["queries"] += 1
+        self.stats["fallbacks"] += fallback
+        self.stats["elapsed_s"] += elapsed
+        return results, {"elapsed": elapsed, "fallback": fallback, "scored": len(candidates)}
+
+# ===== 进程级共享 reranker =====
+_reranker_registry = {}
+_registry_lock = threading.Lock()
+
+def get_reranker(model_name=None):
+    """RERANKER 设置为模型名（如 BAAI/bge-reranker-base）时启用，缺省关闭返回 None。"""
+    model_name = model_name or os.getenv("RERANKER", "")
+    if not model_name:
+        return None
+    reranker = _reranker_registry.get(model_name)
+    if reranker is None:
+        with _registry_lock:
+            reranker = _reranker_registry.get(model_name)
+            if reranker is None:
+                reranker = CrossEncoderReranker(model_name)
+                _reranker_registry[model_name] = reranker
+    return reranker
@@ -0,0 +1,235 @@
+# retriever.py
+# RAGAgent 的可插拔检索后端：加载一次预构建索引，进程内所有会话只读共享
+import os
+import json
+import threading
+import numpy as np
+from mmap_store import book_ranges, select_ranges
+
+def _title_values(books):
+    """书名对应的 title 取值；title 是切分时的文件名，可能带 .md / .pdf 扩展名。"""
+    return [title for book in books for title in (book, f"{book}.md", f"{book}.pdf")]
+
+def _faiss_book_subindex(index, ranges, books):
+    """books 所在的连续文档区间上的 flat 子索引，返回 (子索引, 子索引下标 → 全局 id)。
+
+    全局索引上带 IDSelector 检索仍会遍历整张 HNSW 图或整个倒排列表，只是丢弃区间外的 id；
+    子索引只含这些书的向量，检索时不触碰其余书。向量由 reconstruct 取回：
+    flat / HNSW 为原始向量，IVF 需要 direct map，PQ 为解码后的近似向量。
+    """
+    import faiss
+    rows = select_ranges(ranges, books)
+    ids = np.concatenate([np.arange(s, e) for s, e in rows] or [np.empty(0, dtype="int64")])
+    subindex = faiss.IndexFlat(index.d, index.metric_type)
+    if len(ids):
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+            ivf.make_direct_map()
+        subindex.add(np.concatenate([index.reconstruct_n(int(s), int(e - s)) for s, e in rows]))
+    return subindex, ids
+
+def _search_subindex(subindex, ids, embedding, top_k):
+    if subindex.ntotal == 0:
+        return np.empty(0, dtype="int64")
+    _, indices = subindex.search(embedding.reshape(1, -1), min(top_k, subindex.ntotal))
+    return ids[indices[0][indices[0] >= 0]]
+
+class InMemoryRetriever:
+    """进程内临时索引（原 RAGAgent 的做法），仅用于调试或少量文档。"""
+    read_only = False
+
+    def __init__(self, dim):
+        import faiss
+        self.index = faiss.IndexFlatL2(dim)
+        self.documents = []  # [(text, metadata)]
+
+    def add_documents(self, docs, embeddings):
+        self.index.add(np.asarray(embeddings, dtype="float32"))
+        self.documents.extend(docs)
+
+    def search(self, embedding, top_k=5, books=None):
+        if self.index.ntotal == 0:
+            return []
+        if books is None:
+            _, indices = self.index.search(embedding.reshape(1, -1), top_k)
+            indices = indices[0]
+        else:
+            # 文档可随时追加，子索引不缓存
+            ranges = book_ranges(meta.get("title", "") for _, meta in self.documents)
+            indices = _search_subindex(*_faiss_book_subindex(self.index, ranges, books), embedding, top_k)
+        return [self.documents[i] for i in indices if 0 <= i < len(self.documents)]
+
+class ChromaRetriever:
+    """读取 build_chroma.py 生成的 Chroma 持久化库。"""
+    read_only = True
+
+    def __init__(self, persist_dir="chroma_store", collection_name="dao_knowledge"):
+        import chromadb
+        from build_chroma import MANIFEST_NAME, load_manifest
+        # 先检查构建产物：PersistentClient 一打开就会创建 chroma.sqlite3，get_collection 缺库时抛的是 chromadb 的内部异常
+        if not os.path.exists(os.path.join(persist_dir, MANIFEST_NAME)):
+            raise FileNotFoundError(f"无法找到 Chroma 索引：{persist_dir}/{MANIFEST_NAME}，请先运行 build_chroma.py")
+        self.client = chromadb.PersistentClient(path=persist_dir)
+        if collection_name not in {getattr(c, "name", c) for c in self.client.list_collections()}:
+            raise FileNotFoundError(f"Chroma 库 {persist_dir} 中没有集合 {collection_name}，请先运行 build_chroma.py")
+        self.collection = self.client.get_collection(name=collection_name)
+        self.model_id = load_manifest(persist_dir).get("model")
+
+    def search(self, embedding, top_k=5, books=None):
+        # books 作为元数据预过滤条件交给 Chroma，在候选集内检索而不是对全局 top_k 做后过滤
+        where = None if books is None else {"title": {"$in": _title_values(books)}}
+        results = self.collection.query(
+            query_embeddings=[embedding.tolist()],
+            n_results=top_k,
+            where=where,
+            include=["documents", "metadatas"]
+        )
+        return list(zip(results["documents"][0], results["metadatas"][0]))
+
+class FaissRetriever:
+    """读取 build_faiss.py 生成的磁盘 FAISS 索引（index.faiss + documents.json），
+    支持 flat / ivf / hnsw / ivfpq 各模式。"""
+    read_only = True
+
+    def __init__(self, index_dir="faiss_store", nprobe=16, ef_search=64):
+        import faiss
+        from build_faiss import set_search_params
+        index_path = os.path.join(index_dir, "index.faiss")
+        docs_path = os.path.join(index_dir, "documents.json")
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(f"无法找到 FAISS 索引：{index_path}，请先运行 build_faiss.py")
+        self.index = faiss.read_index(index_path)
+        set_search_params(self.index, nprobe=nprobe, ef_search=ef_search)  # 仅对 IVF / HNSW 生效
+        with open(docs_path, "r", encoding="utf-8") as f:
+            self.documents = [tuple(doc) for doc in json.load(f)]
+        meta_path = os.path.join(index_dir, "index_meta.json")
+        self.model_id = None
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                self.model_id = json.load(f).get("model")
+        # 文档 id 与 documents 下标一致，按书连续存放
+        self.books = book_ranges(meta.get("title", "") for _, meta in self.documents)
+        # 按书目组合缓存的子索引（人物的偏好书目只有少数几种组合），首次使用时构建
+        self._subindexes = {}
+        self._subindex_lock = threading.Lock()
+
+    def _subindex(self, books):
+        key = tuple(sorted(books))
+        entry = self._subindexes.get(key)
+        if entry is None:
+            with self._subindex_lock:
+                entry = self._subindexes.get(key)
+                if entry is None:
+                    entry = self._subindexes[key] = _faiss_book_subindex(self.index, self.books, key)
+        return entry
+
+    def search(self, embedding, top_k=5, books=None):
+        if books is None:
+            _, indices = self.index.search(embedding.reshape(1, -1), top_k)
+            indices = indices[0]
+        else:
+            indices = _search_subindex(*self._subindex(books), embedding, top_k)
+        return [self.documents[i] for i in indices if 0 <= i < len(self.documents)]
+
+def check_index_model(retriever, embedder):
+    """索引记录的 model_id 与查询所用嵌入模型不一致时告警：不同模型或后端的向量不可比，需用同一配置重建索引。"""
+    index_model = getattr(retriever, "model_id", None)
+    if index_model and index_model != embedder.model_id:
+        if getattr(retriever, "_model_warned", False):  # 共享检索器只告警一次
+            return False
+        retriever._model_warned = True
+        print(f"⚠️ 索引向量由 {index_model} 生成，当前查询模型为 {embedder.model_id}，"
+              f"检索结果不可靠，请用相同的 EMBEDDING_BACKEND 重建索引")
+        return False
+    return True
+
+def _mmap_retriever(store_dir="mmap_store"):
+    from mmap_store import MmapVectorStore
+    return MmapVectorStore(store_dir)
+
+RETRIEVER_BACKENDS = {
+    "chroma": ChromaRetriever,
+    "faiss": FaissRetriever,
+    "mmap": _mmap_retriever,  # 零拷贝映射，多进程共享页缓存
+}
+
+# ===== 进程级共享检索器 =====
+_retriever_registry = {}
+_registry_lock = threading.Lock()
+
+def get_retriever(backend=None, **kwargs):
+    """按 (backend, 参数) 返回进程内唯一的只读检索器。
+
+    backend 缺省时读取环境变量 RETRIEVER_BACKEND，默认为 chroma。
+    """
+    backend = backend or os.getenv("RETRIEVER_BACKEND", "chroma")
+    if backend not in RETRIEVER_BACKENDS:
+        raise ValueError(f"未知的检索后端：{backend}，可选：{', '.join(RETRIEVER_BACKENDS)}")
+    key = (backend, tuple(sorted(kwargs.items())))
+    retriever = _retriever_registry.get(key)
+    if retriever is None:
+        with _registry_lock:
+            retriever = _retriever_registry.get(key)
+            if retriever is None:
+                retriever = RETRIEVER_BACKENDS[backend](**kwargs)
+                _retriever_registry[key] = retriever
+    return retriever
+
+# ===== 未构建索引时的示例检索器 =====
+# 与最初版本 RAGAgent 内置的默认文档一致，保证没有任何预构建索引时应用仍能回答
+SEED_DOCUMENTS = [
+    ("道可道，非常道；名可名，非常名。", {"title": "道德经", "chapter_title": "第一章"}),
+    ("学而时习之，不亦说乎？", {"title": "论语", "chapter_title": "学而篇"}),
+]
+_seed_retriever = None
+
+def get_seed_retriever(embedder):
+    """进程内共享的示例检索器；各会话共用，因此标记为只读。"""
+    global _seed_retriever
+    if _seed_retriever is None:
+        with _registry_lock:
+            if _seed_retriever is None:
+                retriever = InMemoryRetriever(embedder.dim)
+                retriever.add_documents(SEED_DOCUMENTS, embedder.embed_batch([text for text, _ in SEED_DOCUMENTS]))
+                retriever.read_only = True
+                _seed_retriever = retriever
+    return _seed_retriever
+
+# ===== 词法检索与混合排序 =====
+_LEXICAL_MISSING = object()
+_lexical_registry = {}
+
+def get_lexical_index(index_dir=None):
+    """进程内共享的 BM25 索引（见 bm25_index.py）；index_dir 缺省读取 BM25_INDEX_DIR，
+    默认 bm25_store。索引不存在或 HYBRID_RETRIEVAL=0 时返回 None，检索退回纯向量。"""
+    if os.getenv("HYBRID_RETRIEVAL", "1") == "0":
+        return None
+    index_dir = index_dir or os.getenv("BM25_INDEX_DIR", "bm25_store")
+    index = _lexical_registry.get(index_dir)
+    if index is None:
+        with _registry_lock:
+            index = _lexical_registry.get(index_dir)
+            if index is None:
+                if os.path.exists(os.path.join(index_dir, "manifest.json")):
+                    from bm25_index import BM25Index
+                    index = BM25Index(index_dir)
+                else:
+                    print(f"⚠️ 未找到 BM25 索引 {index_dir}/，仅使用向量检索")
+                    index = _LEXICAL_MISSING
+                _lexical_registry[index_dir] = index
+    return None if index is _LEXICAL_MISSING else index
+
+def reciprocal_rank_fusion(result_lists, top_k=5, k=60):
+    """RRF 融合多路检索结果：score = Σ 1 / (k + rank)。
+
+    只依赖名次，无需对齐 BM25 分数与向量相似度的量纲；同分时先出现的列表优先。
+    """
+    from answer_cache import chunk_key
+    scores, documents = {}, {}
+    for results in result_lists:
+        for rank, (text, meta) in enumerate(results, start=1):
+            key = chunk_key(text, meta)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(key, (text, meta))
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [documents[key] for key in ranked[:top_k]]
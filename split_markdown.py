@@ -2,10 +2,24 @@ import os
 import re
 import uuid
 import json
-from typing import List, Dict
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from typing import Dict, Iterable, Iterator, List
 
 CHINESE_NUM = "〇一二三四五六七八九十百千萬零壹貳參肆伍陸柒捌玖拾"
 STRUCTURED_TITLE_REGEX = re.compile(r"(第[" + CHINESE_NUM + r"\d]{1,10}[章节讲回篇])")
+# 段落 id 的命名空间；同一书、同一位置、同一内容每次生成相同的 id
+CHUNK_ID_NAMESPACE = uuid.UUID("5a0e0d1c-3f5b-4b8e-9a57-6c1d2a0b7e41")
+CORPUS_MANIFEST_NAME = "corpus_manifest.json"
+
+def chunk_id(file_name: str, section: int, chapter_title, ordinal: int, content: str) -> str:
+    """确定性段落 id：书名 + 章节序号与标题 + 章节内序号 + 内容哈希。"""
+    digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+    key = f"{file_name}\x1f{section}\x1f{chapter_title or ''}\x1f{ordinal}\x1f{digest}"
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, key))
 
 def detect_structured_headings(text: str) -> List[re.Match]:
     return list(STRUCTURED_TITLE_REGEX.finditer(text))
@@ -26,19 +40,167 @@ def split_by_structure(text: str) -> List[Dict]:
         })
     return chunks
 
-def semantic_fallback_split(text: str, max_len=400) -> List[str]:
-    sentences = re.split(r"(?<=[。！？])", text)
-    buffer = ""
-    results = []
+SENTENCE_END_REGEX = re.compile(r"(?<=[。！？])")
+
+def pack_sentences(sentences: Iterable[str], max_len=400) -> Iterator[str]:
+    """把句子按顺序合并为不超过 max_len 的段落；用列表暂存，避免字符串反复拼接。"""
+    buffer, size = [], 0
     for s in sentences:
-        if len(buffer) + len(s) > max_len:
-            results.append(buffer.strip())
-            buffer = s
+        if size + len(s) > max_len and buffer:
+            chunk = "".join(buffer).strip()
+            if chunk:
+                yield chunk
+            buffer, size = [s], len(s)
         else:
-            buffer += s
-    if buffer:
-        results.append(buffer.strip())
-    return results
+            buffer.append(s)
+            size += len(s)
+    chunk = "".join(buffer).strip()
+    if chunk:
+        yield chunk
+
+def semantic_fallback_split(text: str, max_len=400) -> List[str]:
+    return list(pack_sentences(SENTENCE_END_REGEX.split(text), max_len))
+
+def iter_sentences(pieces: Iterable[str], max_len=400) -> Iterator[str]:
+    """把逐行读入的文本片段重新切成以句末标点结尾的句子，跨行的句子会被接上。"""
+    carry, size = [], 0
+    for piece in pieces:
+        parts = SENTENCE_END_REGEX.split(piece)
+        for part in parts[:-1]:  # 除最后一段外都以句末标点结尾
+            carry.append(part)
+            yield "".join(carry)
+            carry, size = [], 0
+        if parts[-1]:
+            carry.append(parts[-1])
+            size += len(parts[-1])
+            if size >= max_len:  # 无标点的长段（目录、图表）强制断开，保证内存有界
+                yield "".join(carry)
+                carry, size = [], 0
+    if carry:
+        yield "".join(carry)
+
+def iter_section_pieces(lines: Iterable[str]) -> Iterator[tuple]:
+    """逐行扫描章节标题，yield (章节序号, 章节标题, 文本片段)。
+
+    标题可能出现在行中间，此时从标题处切开，标题归入新章节正文。
+    第一个标题之前的内容（序言等）章节标题为 None。
+    """
+    section, chapter_title = 0, None
+    for line in lines:
+        pos = 0
+        matches = STRUCTURED_TITLE_REGEX.finditer(line) if "第" in line else ()
+        for m in matches:
+            if m.start() > pos:
+                yield section, chapter_title, line[pos:m.start()]
+            section, chapter_title, pos = section + 1, m.group(), m.start()
+        if pos < len(line):
+            yield section, chapter_title, line[pos:]
+
+def iter_chunks(md_path: str, max_len=400) -> Iterator[Dict]:
+    """流式读取 Markdown 并逐个产出段落 dict，内存占用与书的大小无关。"""
+    file_name = os.path.basename(md_path)
+    with open(md_path, "r", encoding="utf-8") as f:
+        sections = groupby(iter_section_pieces(f), key=lambda item: item[:2])
+        for (section, chapter_title), items in sections:
+            pieces = (piece for _, _, piece in items)
+            for ordinal, sub in enumerate(pack_sentences(iter_sentences(pieces, max_len), max_len)):
+                yield {
+                    "id": chunk_id(file_name, section, chapter_title, ordinal, sub),
+                    "title": file_name,
+                    "chapter_title": chapter_title,
+                    "content": sub,
+                    "language": "zh",
+                    "source_file": file_name,
+                    "source_type": "markdown"
+                }
+
+def write_jsonl(chunks: Iterable[Dict], output_path: str) -> List[int]:
+    """每行一个段落的 JSON Lines，边产出边写入；返回每行起始的字节偏移。"""
+    offsets, pos = [], 0
+    tmp_path = output_path + ".part"
+    with open(tmp_path, "wb") as f:
+        for chunk in chunks:
+            data = (json.dumps(chunk, ensure_ascii=False) + "\n").encode("utf-8")
+            f.write(data)
+            offsets.append(pos)
+            pos += len(data)
+    os.replace(tmp_path, output_path)
+    return offsets
+
+def process_md_to_jsonl(md_path: str, output_path: str) -> str:
+    offsets = write_jsonl(iter_chunks(md_path), output_path)
+    print(f"✅ 成功生成 JSONL 文件: {output_path}（{len(offsets)} 段）")
+    return output_path
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def chunk_book(md_path: str, output_path: str, max_len=400) -> tuple:
+    """在工作进程中切分一本书，返回 (corpus manifest 条目, 用时秒数)。"""
+    start = time.perf_counter()
+    offsets = write_jsonl(iter_chunks(md_path, max_len), output_path)
+    entry = {
+        "source_sha256": file_sha256(md_path),
+        "output": os.path.basename(output_path),
+        "chunks": len(offsets),
+        "bytes": os.path.getsize(output_path),
+        "offsets": offsets,
+    }
+    return entry, time.perf_counter() - start
+
+def chunk_corpus(input_dir: str, output_dir: str, workers=None, max_len=400, force=False) -> Dict:
+    """多进程并行切分整个 book_markdown 目录，输出 JSONL 与 corpus_manifest.json。
+
+    源文件与 max_len 未变的书直接沿用上次结果；manifest 不含时间戳，
+    相同输入重跑得到逐字节相同的输出，可直接 diff 与缓存。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, CORPUS_MANIFEST_NAME)
+    old_books = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            old_manifest = json.load(f)
+        if old_manifest.get("max_len") == max_len:
+            old_books = old_manifest.get("books", {})
+
+    books, jobs = {}, {}
+    for file_name in sorted(os.listdir(input_dir)):
+        if not file_name.lower().endswith(".md"):
+            continue
+        md_path = os.path.join(input_dir, file_name)
+        output_path = os.path.join(output_dir, os.path.splitext(file_name)[0] + ".jsonl")
+        old = old_books.get(file_name)
+        if (not force and old and os.path.exists(output_path)
+                and old["source_sha256"] == file_sha256(md_path)):
+            books[file_name] = old
+            continue
+        jobs[file_name] = (md_path, output_path)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {name: pool.submit(chunk_book, md_path, output_path, max_len)
+                   for name, (md_path, output_path) in jobs.items()}
+        for name, future in futures.items():
+            try:
+                books[name], seconds = future.result()
+                print(f"✅ {name}：{books[name]['chunks']} 段，{seconds:.3f}s")
+            except Exception as e:
+                print(f"⚠️ 处理失败：{name}, 错误：{e}")
+
+    manifest = {
+        "max_len": max_len,
+        "total_chunks": sum(b["chunks"] for b in books.values()),
+        "books": {name: books[name] for name in sorted(books)},
+    }
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    print(f"📚 共 {len(books)} 本（重新切分 {len(jobs)} 本），{manifest['total_chunks']} 段，"
+          f"用时 {time.perf_counter() - start:.2f}s")
+    return manifest
 
 def process_md_to_json(md_path: str, output_json_path: str) -> str:
     with open(md_path, "r", encoding="utf-8") as f:
@@ -47,12 +209,13 @@ def process_md_to_json(md_path: str, output_json_path: str) -> str:
     structured_chunks = split_by_structure(full_text)
     output_chunks = []
 
+    file_name = os.path.basename(md_path)
     if structured_chunks:
-        for chunk in structured_chunks:
+        for section, chunk in enumerate(structured_chunks, start=1):
             sub_chunks = semantic_fallback_split(chunk["content"])
-            for sub in sub_chunks:
+            for ordinal, sub in enumerate(sub_chunks):
                 output_chunks.append({
-                    "id": str(uuid.uuid4()),
+                    "id": chunk_id(file_name, section, chunk["chapter_title"], ordinal, sub),
                     "title": os.path.basename(md_path),
                     "chapter_title": chunk["chapter_title"],
                     "content": sub,
@@ -62,9 +225,9 @@ def process_md_to_json(md_path: str, output_json_path: str) -> str:
                 })
     else:
         fallback_chunks = semantic_fallback_split(full_text)
-        for sub in fallback_chunks:
+        for ordinal, sub in enumerate(fallback_chunks):
             output_chunks.append({
-                "id": str(uuid.uuid4()),
+                "id": chunk_id(file_name, 0, None, ordinal, sub),
                 "title": os.path.basename(md_path),
                 "chapter_title": None,
                 "content": sub,
@@ -81,17 +244,11 @@ def process_md_to_json(md_path: str, output_json_path: str) -> str:
 
 ## 主程序
 if __name__ == "__main__":
-    input_dir = "/Users/liqingyun/Documents/Dao_AI/Dao_AI/book_markdown"
-    output_dir = "/Users/liqingyun/Documents/Dao_AI/Dao_AI/book_split"
-
-    os.makedirs(output_dir, exist_ok=True)
-
-    for file_name in os.listdir(input_dir):
-        if file_name.lower().endswith(".md"):
-            input_path = os.path.join(input_dir, file_name)
-            output_path = os.path.join(output_dir, os.path.splitext(file_name)[0] + ".json")
-            print(f"📖 处理中：{file_name}")
-            try:
-                process_md_to_json(input_path, output_path)
-            except Exception as e:
-                print(f"⚠️ 处理失败：{file_name}, 错误：{e}")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="并行切分 Markdown 书籍为 JSONL 段落")
+    parser.add_argument("--input-dir", default="book_markdown")
+    parser.add_argument("--output-dir", default="book_split")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--max-len", type=int, default=400, help="每段最大字数")
+    parser.add_argument("--force", action="store_true", help="忽略 manifest，全部重新切分")
+    args = parser.parse_args()
+    chunk_corpus(args.input_dir, args.output_dir, args.workers, args.max_len, args.force)
@@ -0,0 +1,6 @@
+# tests/conftest.py
+# 模块都在仓库根目录下平铺，测试从任意目录运行时都能直接 import
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
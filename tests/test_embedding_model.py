@@ -0,0 +1,71 @@
+# tests/test_embedding_model.py
+# 进程内只加载一份嵌入模型：多个 RAGAgent、多线程并发首次访问都拿到同一实例，加载只发生一次
+import time
+import threading
+import numpy as np
+import pytest
+import embedding_cache
+import embedding_model
+import rag_agent
+from rag_agent import RAGAgent
+
+class StubModel:
+    model_name = "stub"
+    model_id = "stub"
+    dim = 4
+
+    def embed_batch(self, texts, batch_size=32):
+        return np.ones((len(texts), self.dim), dtype="float32")
+
+@pytest.fixture
+def loads(monkeypatch):
+    """替换模型加载并清空各级进程注册表，返回加载调用记录。"""
+    calls = []
+
+    def create(model_name="BAAI/bge-small-zh", backend="torch", num_threads=None):
+        calls.append((model_name, backend))
+        time.sleep(0.05)  # 模拟加载耗时，放大并发首次访问的竞争窗口
+        return StubModel()
+
+    monkeypatch.setattr(embedding_model, "create_embedding_model", create)
+    monkeypatch.setattr(embedding_model, "_model_registry", {})
+    monkeypatch.setattr(embedding_cache, "_cached_models", {})
+    monkeypatch.setattr(rag_agent, "_runtime_pool", {})
+    monkeypatch.delenv("EMBEDDING_BACKEND", raising=False)
+    return calls
+
+def test_agents_share_one_embedder(loads):
+    agents = [RAGAgent(persona) for persona in ["孔子", "老子", "庄子"] * 3]
+    embedders = {id(agent.embedder) for agent in agents}
+    assert len(embedders) == 1
+    assert agents[0].embedder.model is embedding_model.get_embedding_model()
+    assert len(loads) == 1
+
+def test_concurrent_first_access_loads_once(loads):
+    n = 16
+    barrier = threading.Barrier(n)
+    embedders = [None] * n
+
+    def worker(i):
+        agent = RAGAgent(["孔子", "老子"][i % 2])
+        barrier.wait()  # 所有线程同时触发首次加载
+        embedders[i] = agent.embedder
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert all(e is embedders[0] for e in embedders)
+    assert embedders[0].model is embedding_model.get_embedding_model()
+    assert len(loads) == 1
+
+def test_query_embedder_keyed_by_backend(loads, monkeypatch):
+    torch_embedder = embedding_cache.get_query_embedder()
+    monkeypatch.setenv("EMBEDDING_BACKEND", "onnx-int8")
+    onnx_embedder = embedding_cache.get_query_embedder()
+    assert onnx_embedder is not torch_embedder
+    assert onnx_embedder.model is embedding_model.get_embedding_model(backend="onnx-int8")
+    assert torch_embedder.model is embedding_model.get_embedding_model(backend="torch")
+    assert loads == [("BAAI/bge-small-zh", "torch"), ("BAAI/bge-small-zh", "onnx-int8")]
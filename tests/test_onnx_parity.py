@@ -0,0 +1,57 @@
+# tests/test_onnx_parity.py
+# ONNX（fp32 / int8 量化）与 PyTorch 后端的嵌入一致性：逐句余弦相似度不低于 0.99，
+# 否则换后端后已建索引的检索结果会漂移。缺 onnxruntime / onnx 或本地没有模型权重时跳过。
+# PARITY_MODEL 指定模型名或本地目录，默认与线上一致的 BAAI/bge-small-zh
+import os
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("onnx")
+
+from embedding_model import LocalEmbeddingModel, OnnxEmbeddingModel
+
+MODEL = os.getenv("PARITY_MODEL", "BAAI/bge-small-zh")
+MIN_COSINE = 0.99
+SENTENCES = [
+    "什么是仁？",
+    "己所不欲，勿施于人",
+    "道可道，非常道；名可名，非常名。",
+    "上善若水。水善利万物而不争，处众人之所恶，故几于道。",
+    "学而时习之，不亦说乎？有朋自远方来，不亦乐乎？人不知而不愠，不亦君子乎？",
+    "如何面对失败与挫折",
+    "What is the Dao?",
+    "天下皆知美之为美，斯恶已；皆知善之为善，斯不善已。故有无相生，难易相成，长短相形，高下相倾。",
+]
+
+def _weights_available(model_name):
+    if os.path.isdir(model_name):
+        return True
+    try:
+        from huggingface_hub import snapshot_download
+        snapshot_download(model_name, local_files_only=True)
+        return True
+    except Exception:
+        return False
+
+@pytest.fixture(scope="module")
+def reference():
+    if not _weights_available(MODEL):
+        pytest.skip(f"本地没有模型权重：{MODEL}")
+    return LocalEmbeddingModel(MODEL).embed_batch(SENTENCES)
+
+@pytest.fixture(scope="module")
+def onnx_dir(tmp_path_factory):
+    # 导出到临时目录，不写仓库下的 onnx_model/
+    return str(tmp_path_factory.mktemp("onnx_model"))
+
+@pytest.mark.parametrize("quantize", [False, True], ids=["onnx", "onnx-int8"])
+def test_onnx_matches_torch(reference, onnx_dir, quantize):
+    vectors = OnnxEmbeddingModel(MODEL, onnx_dir=onnx_dir, quantize=quantize).embed_batch(SENTENCES)
+    assert vectors.shape == reference.shape
+    cosine = (vectors * reference).sum(axis=1) / (
+        np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1))
+    worst = int(cosine.argmin())
+    assert cosine.min() >= MIN_COSINE, f"{SENTENCES[worst]!r} 余弦 {cosine[worst]:.5f} < {MIN_COSINE}"
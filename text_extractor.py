@@ -1,34 +1,108 @@
-import pdfplumber
+# text_extractor.py
+# PDF → Markdown：多本书并行、大书按页段并行，逐页按顺序流式写出
 import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 # 设置输入文件夹和输出文件夹路径
 input_folder = "/Users/liqingyun/Documents/Dao_AI/传统书籍"
 output_folder = "/Users/liqingyun/Documents/Dao_AI/Dao_AI/book_markdown"
 
-# 确保输出目录存在
-os.makedirs(output_folder, exist_ok=True)
+MANIFEST_NAME = ".extract_manifest.json"
 
-# 遍历输入文件夹中的所有 PDF 文件
-for filename in os.listdir(input_folder):
-    if filename.lower().endswith(".pdf"):
-        input_path = os.path.join(input_folder, filename)
-        book_title = os.path.splitext(filename)[0]
-        output_path = os.path.join(output_folder, f"{book_title}.md")
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
 
-        print(f"📖 正在处理：{filename}")
-        all_text = ""
+def count_pages(pdf_path):
+    import pdfplumber
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
 
-        try:
-            with pdfplumber.open(input_path) as pdf:
-                for i, page in enumerate(pdf.pages):
-                    text = page.extract_text()
-                    if text:
-                        all_text += f"\n\n## 第{i+1}页\n\n{text.strip()}"
+def extract_page_range(pdf_path, start, end):
+    """在工作进程中提取 [start, end) 页，返回 [(页码, 文本)]。"""
+    import pdfplumber
+    pages = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for i in range(start, end):
+            page = pdf.pages[i]
+            pages.append((i, page.extract_text()))
+            page.flush_cache()  # 释放已解析页面的对象缓存
+    return pages
+
+def extract_book(pool, pdf_path, output_path, pages_per_task=20):
+    """把一本书按页段分发到进程池，按页序流式写入 Markdown；返回 (页数, 用时)。"""
+    start_time = time.perf_counter()
+    book_title = os.path.splitext(os.path.basename(pdf_path))[0]
+    total_pages = count_pages(pdf_path)
+    futures = [
+        pool.submit(extract_page_range, pdf_path, start, min(start + pages_per_task, total_pages))
+        for start in range(0, total_pages, pages_per_task)
+    ]
+
+    tmp_path = output_path + ".part"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(f"# {book_title}\n")
+        for future in futures:  # 按提交顺序等待，保证页序；已完成的页段立即写出
+            for i, text in future.result():
+                if text:
+                    f.write(f"\n\n## 第{i+1}页\n\n{text.strip()}")
+    os.replace(tmp_path, output_path)
+    return total_pages, time.perf_counter() - start_time
+
+def extract_folder(input_dir, output_dir, workers=None, pages_per_task=20, force=False):
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    manifest_lock = threading.Lock()
 
-            # 写入 Markdown 文件
-            with open(output_path, "w", encoding="utf-8") as f:
-                f.write(f"# {book_title}\n{all_text}")
+    jobs = []
+    for filename in sorted(os.listdir(input_dir)):
+        if not filename.lower().endswith(".pdf"):
+            continue
+        input_path = os.path.join(input_dir, filename)
+        output_path = os.path.join(output_dir, f"{os.path.splitext(filename)[0]}.md")
+        digest = file_sha256(input_path)
+        if not force and manifest.get(filename, {}).get("sha256") == digest and os.path.exists(output_path):
+            print(f"⏭️ 未变化，跳过：{filename}")
+            continue
+        jobs.append((filename, input_path, output_path, digest))
 
-            print(f"✅ 已保存为 Markdown 文件：{output_path}")
+    def run_job(pool, job):
+        filename, input_path, output_path, digest = job
+        print(f"📖 正在处理：{filename}")
+        try:
+            pages, elapsed = extract_book(pool, input_path, output_path, pages_per_task)
         except Exception as e:
             print(f"❌ 处理 {filename} 时出错：{e}")
+            return
+        print(f"✅ 已保存为 Markdown 文件：{output_path}（{pages} 页，{pages / max(elapsed, 1e-9):.1f} 页/秒）")
+        with manifest_lock:
+            manifest[filename] = {"sha256": digest, "pages": pages, "output": os.path.basename(output_path)}
+            with open(manifest_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    # 进程池负责解析页面；每本在处理的书占一个线程按序写文件，线程数即同时在处理的书数
+    with ProcessPoolExecutor(max_workers=workers) as pool, \
+            ThreadPoolExecutor(max_workers=max(1, min(len(jobs), workers or os.cpu_count()))) as writers:
+        list(writers.map(lambda job: run_job(pool, job), jobs))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="并行提取 PDF 文本为 Markdown")
+    parser.add_argument("--input-dir", default=input_folder)
+    parser.add_argument("--output-dir", default=output_folder)
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--pages-per-task", type=int, default=20, help="大书按多少页切分为一个任务")
+    parser.add_argument("--force", action="store_true", help="忽略校验和，全部重新提取")
+    args = parser.parse_args()
+    extract_folder(args.input_dir, args.output_dir, args.workers, args.pages_per_task, args.force)
@@ -0,0 +1,247 @@
+# tracing.py
+# 请求级耗时追踪：一次回答是一个 trace，检索、向量编码、prompt 组装、LLM 调用等阶段是其中的 span。
+#   - TRACE_EXPORTERS 未设置时关闭：trace() / span() 直接返回空操作对象，只多一次 contextvar 读取
+#   - 导出器可插拔：jsonl（每个 trace 一行写入 TRACE_FILE）、prometheus（TRACE_PROM_PORT 上的文本指标）
+#   - 当前 trace 存在 contextvar 中，asyncio.to_thread 等复制上下文的调用里 span 仍归属同一 trace
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+
+_current = contextvars.ContextVar("trace", default=None)
+
+class _NoopSpan:
+    """关闭追踪或不在任何 trace 内时返回的共享空对象。"""
+    trace = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+NOOP = _NoopSpan()
+
+class Span:
+    __slots__ = ("trace", "name", "attrs", "depth", "start", "end")
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.depth = 0
+        self.start = self.end = None
+
+    def __enter__(self):
+        self.depth = self.trace._depth
+        self.trace._depth += 1
+        self.trace.spans.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        self.trace._depth -= 1
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter()) - self.start
+
+class Trace(Span):
+    """根 span；退出时把整个 trace 交给导出器。"""
+    __slots__ = ("trace_id", "spans", "started_at", "tracer", "_depth", "_previous")
+
+    def __init__(self, tracer, name, attrs):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.spans = []
+        self.started_at = time.time()
+        self.tracer = tracer
+        self._depth = 0
+        super().__init__(self, name, attrs)
+
+    def __enter__(self):
+        # 记下进入前的值并在退出时恢复（而不是 reset token）：生成器被关闭时可能已不在原上下文中
+        self._previous = _current.get()
+        _current.set(self)
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        super().__exit__(exc_type, exc, tb)
+        _current.set(self._previous)
+        self.tracer.export(self)
+        return False
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "attrs": self.attrs,
+            "spans": [
+                {"name": s.name, "depth": s.depth, "offset": s.start - self.start, "duration": s.duration,
+                 "attrs": s.attrs}
+                for s in self.spans[1:]
+            ],
+        }
+
+# ===== 导出器 =====
+class JsonlExporter:
+    """每个 trace 追加一行 JSON，可用 jq / pandas 离线分析。"""
+
+    def __init__(self, path="traces.jsonl"):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        line = json.dumps(trace.to_dict(), ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+class PrometheusExporter:
+    """按 span 名累计耗时直方图与 token 计数，以 Prometheus 文本格式输出；port 非空时启动 /metrics 服务。"""
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, port=None, prefix="sage"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms = {}  # span 名 -> [各桶计数..., sum, count]
+        self._tokens = {}      # (span 名, 种类) -> 累计 token
+        self.server = None
+        if port:
+            self._serve(int(port))
+
+    def export(self, trace):
+        with self._lock:
+            for s in trace.spans:
+                hist = self._histograms.setdefault(s.name, [0] * len(self.BUCKETS) + [0.0, 0])
+                d = s.duration
+                for i, le in enumerate(self.BUCKETS):
+                    if d <= le:
+                        hist[i] += 1
+                hist[-2] += d
+                hist[-1] += 1
+                for kind in ("prompt_tokens", "completion_tokens"):
+                    if kind in s.attrs:
+                        key = (s.name, kind.replace("_tokens", ""))
+                        self._tokens[key] = self._tokens.get(key, 0) + s.attrs[kind]
+
+    def render(self):
+        p = self.prefix
+        lines = [f"# HELP {p}_span_seconds 各阶段耗时", f"# TYPE {p}_span_seconds histogram"]
+        with self._lock:
+            for name, hist in sorted(self._histograms.items()):
+                for le, n in zip(self.BUCKETS, hist):
+                    lines.append(f'{p}_span_seconds_bucket{{span="{name}",le="{le}"}} {n}')
+                lines.append(f'{p}_span_seconds_bucket{{span="{name}",le="+Inf"}} {hist[-1]}')
+                lines.append(f'{p}_span_seconds_sum{{span="{name}"}} {hist[-2]:.6f}')
+                lines.append(f'{p}_span_seconds_count{{span="{name}"}} {hist[-1]}')
+            lines += [f"# HELP {p}_tokens_total prompt / completion token 累计", f"# TYPE {p}_tokens_total counter"]
+            for (name, kind), n in sorted(self._tokens.items()):
+                lines.append(f'{p}_tokens_total{{span="{name}",kind="{kind}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+    def _serve(self, port):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self.server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+        except OSError as e:
+            print(f"⚠️ Prometheus 指标端口 {port} 不可用：{e}")
+            return
+        threading.Thread(target=self.server.serve_forever, name="trace-metrics", daemon=True).start()
+        print(f"📈 Prometheus 指标：http://localhost:{port}/metrics")
+
+class Tracer:
+    def __init__(self, exporters=(), enabled=None):
+        self.exporters = list(exporters)
+        self.enabled = bool(self.exporters) if enabled is None else enabled
+
+    def export(self, trace):
+        for exporter in self.exporters:
+            try:
+                exporter.export(trace)
+            except Exception as e:  # 导出失败不影响回答
+                print(f"❌ trace 导出失败：{e!r}")
+
+# ===== 进程级 tracer =====
+TRACE_EXPORTERS = {
+    "jsonl": lambda: JsonlExporter(os.getenv("TRACE_FILE", "traces.jsonl")),
+    "prometheus": lambda: PrometheusExporter(os.getenv("TRACE_PROM_PORT", "9464")),
+}
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def get_tracer():
+    """TRACE_EXPORTERS 为逗号分隔的导出器（jsonl / prometheus），缺省为空即关闭追踪。"""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                names = [n.strip() for n in os.getenv("TRACE_EXPORTERS", "").split(",") if n.strip()]
+                _tracer = Tracer([TRACE_EXPORTERS[n]() for n in names])
+    return _tracer
+
+def enable_tracing():
+    """没有导出器时也收集 trace（如页面调试面板只看最近一次回答）。"""
+    get_tracer().enabled = True
+
+def trace(name, force=False, **attrs):
+    """开始一个 trace；已在 trace 内时退化为其中的 span，嵌套调用不会拆成两条记录。
+
+    force=True 时即使全局关闭也收集这一次（如单个会话打开的调试面板），不改变进程级 tracer 的状态。
+    """
+    tracer = _tracer or get_tracer()
+    if not (tracer.enabled or force):
+        return NOOP
+    current = _current.get()
+    if current is not None:
+        return Span(current, name, attrs)
+    return Trace(tracer, name, attrs)
+
+def span(name, **attrs):
+    current = _current.get()
+    if current is None:
+        return NOOP
+    return Span(current, name, attrs)
+
+def record(name, start, end=None, **attrs):
+    """补记一段已经结束的耗时（perf_counter 时间），在 trace 外时作为单独的 trace 导出。"""
+    end = time.perf_counter() if end is None else end
+    current = _current.get()
+    tracer = _tracer or get_tracer()
+    if current is None and not tracer.enabled:
+        return
+    s = Span(current, name, attrs) if current is not None else Trace(tracer, name, attrs)
+    s.start, s.end = start, end
+    if current is not None:
+        s.depth = current._depth
+        current.spans.append(s)
+    else:
+        s.started_at = time.time() - (time.perf_counter() - start)
+        s.spans.append(s)
+        tracer.export(s)
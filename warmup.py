@@ -0,0 +1,109 @@
+# warmup.py
+# 冷启动预热：服务进程起来后在后台线程里加载嵌入模型、检索索引、回答缓存与 LLM 客户端，
+# 首个页面无需等待模型加载即可渲染；各组件本身都是进程级单例，预热只是提前触发它们
+import time
+import threading
+
+def _warm_embedder():
+    from embedding_cache import get_query_embedder
+    embedder = get_query_embedder()
+    # 直接调用底层模型跑一次前向，预热算子又不往查询缓存里写入占位文本
+    embedder.model.embed_text("预热")
+
+def _warm_retriever():
+    from retriever import get_retriever
+    get_retriever()
+
+def _warm_lexical_index():
+    from retriever import get_lexical_index
+    get_lexical_index()
+
+def _warm_reranker():
+    from reranker import get_reranker
+    get_reranker()  # 未设置 RERANKER 时不加载
+
+def _warm_answer_cache():
+    from answer_cache import get_answer_cache
+    get_answer_cache()
+
+def _warm_llm_client():
+    from llm_client import get_llm_client
+    get_llm_client()
+
+def _warm_personas():
+    # 为每个人物建好共享状态，切换人物时直接取池中实例
+    from rag_agent import get_persona_runtime, load_personas
+    for persona in load_personas():
+        get_persona_runtime(persona).resolve()
+
+# 按顺序执行；单步失败记录错误后继续，其余组件照常预热
+WARMUP_STEPS = (
+    ("embedding", _warm_embedder),
+    ("retriever", _warm_retriever),
+    ("bm25", _warm_lexical_index),
+    ("reranker", _warm_reranker),
+    ("answer_cache", _warm_answer_cache),
+    ("llm_client", _warm_llm_client),
+    ("personas", _warm_personas),
+)
+
+# ===== 进程级预热状态 =====
+# status：idle → loading → ready / failed
+_state = {"status": "idle", "step": None, "steps": {}, "errors": {}, "started_at": None, "elapsed": None}
+_thread = None
+_done = threading.Event()
+_lock = threading.Lock()
+
+def _run(steps):
+    start = time.perf_counter()
+    for name, func in steps:
+        with _lock:
+            _state["step"] = name
+        t0 = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            print(f"❌ 预热 {name} 失败：{e!r}")
+            with _lock:
+                _state["errors"][name] = repr(e)
+        with _lock:
+            _state["steps"][name] = time.perf_counter() - t0
+    with _lock:
+        _state["step"] = None
+        _state["elapsed"] = time.perf_counter() - start
+        _state["status"] = "failed" if _state["errors"] else "ready"
+    print(f"✅ 预热完成：{_state['elapsed']:.2f}s，" + "，".join(f"{k} {v:.2f}s" for k, v in _state["steps"].items()))
+    _done.set()
+
+def start_warmup(steps=WARMUP_STEPS):
+    """启动后台预热线程；进程内只启动一次，重复调用直接返回同一线程。"""
+    global _thread
+    if _thread is None:
+        with _lock:
+            if _thread is None:
+                _state["status"] = "loading"
+                _state["started_at"] = time.time()
+                _thread = threading.Thread(target=_run, args=(steps,), name="warmup", daemon=True)
+                _thread.start()
+    return _thread
+
+def warmup_status():
+    """当前预热状态的快照，供 UI 显示。"""
+    with _lock:
+        return {**_state, "steps": dict(_state["steps"]), "errors": dict(_state["errors"])}
+
+def is_ready():
+    return _done.is_set() and not _state["errors"]
+
+def wait_until_ready(timeout=None):
+    """阻塞直到预热结束（成功或失败）；超时返回 False。未启动预热时立即返回 True。"""
+    if _thread is None:
+        return True
+    return _done.wait(timeout)
+
+if __name__ == "__main__":
+    start_warmup()
+    wait_until_ready()
+    status = warmup_status()
+    if status["errors"]:
+        raise SystemExit(f"预热失败：{status['errors']}")